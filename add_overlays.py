@@ -1,64 +1,158 @@
 import os
-import subprocess
+import time
+import metrics
+from ffmpeg_progress import run_ffmpeg
+from media_probe import probe
+from overlay_assets import overlay_input_args
+from parallel_runner import run_jobs, resolve_workers, threads_per_job
+from batch_journal import BatchJournal, render_and_commit, run_journaled
+from proxy_preview import (PREVIEW_SECONDS, PREVIEW_AUDIO_ARGS, PREVIEW_VIDEO_ARGS, PREVIEW_FPS,
+                           preview_duration, proxy_size, trim_args)
+
+PETAL_GIF_PATH = "overlays/petals.gif"
+SPARKLE_GIF_PATH = "overlays/sparkles.gif"
 
 # DND-Working 
+@metrics.in_pipeline("add_overlays")
 def add_gif_overlays_to_videos(
     input_folder="edit_vid_input",
     output_folder="edit_vid_output",
     add_petal_overlay=True,
     add_sparkle_overlay=True,
-    overlay_position=(0, 0)
+    overlay_position=(0, 0),
+    max_workers=1,
+    ffmpeg_threads=None,
+    preview=False,
+    preview_seconds=PREVIEW_SECONDS,
+    consume_inputs=False
 ):
+    """
+    preview=True renders fast 360p proxies of the first preview_seconds and keeps the inputs.
+    Outputs are verified before they replace anything; consume_inputs=True then deletes the
+    input. An interrupted batch rerun with the same settings resumes (see batch_journal).
+    """
     print("✅ Received Arguments:", locals())
+    settings = {k: v for k, v in locals().items() if k not in ("max_workers", "ffmpeg_threads", "consume_inputs")}
+    journal = None if preview else BatchJournal(output_folder, "add_gif_overlays_to_videos", settings)
 
-    petal_gif_path = "overlays/petals.gif"
-    sparkle_gif_path = "overlays/sparkles.gif"
+    with metrics.stage("cleanup"):
+        if journal:
+            journal.start(clear_folder)
+        else:
+            clear_folder(output_folder)
 
-    clear_folder(output_folder)
+    max_workers = resolve_workers(max_workers)
+    threads = threads_per_job(max_workers, ffmpeg_threads)
 
-    for filename in os.listdir(input_folder):
+    jobs = []
+    for filename in sorted(os.listdir(input_folder)):
         if filename.lower().endswith(".mp4"):
-            input_path = os.path.join(input_folder, filename)
-            output_path = os.path.join(output_folder, filename)
-
-            # Prepare input list: always start with base video
-            inputs = ['-i', input_path]
-            stream_args = []
-
-            filter_complex = ""
-            label = "[base]"
-            overlay_idx = 1  # starts from 1 because main video is [0:v]
-
-            filter_complex += "[0:v]null[base];"
-
-            if add_petal_overlay and os.path.exists(petal_gif_path):
-                stream_args += ['-stream_loop', '-1', '-i', petal_gif_path]
-                filter_complex += f"{label}[{overlay_idx}:v]overlay={overlay_position[0]}:{overlay_position[1]}[tmp{overlay_idx}];"
-                label = f"[tmp{overlay_idx}]"
-                overlay_idx += 1
-
-            if add_sparkle_overlay and os.path.exists(sparkle_gif_path):
-                stream_args += ['-stream_loop', '-1', '-i', sparkle_gif_path]
-                filter_complex += f"{label}[{overlay_idx}:v]overlay={overlay_position[0]}:{overlay_position[1]}[outv];"
+            jobs.append({"name": filename, "kwargs": dict(
+                input_path=os.path.join(input_folder, filename),
+                output_path=os.path.join(output_folder, filename),
+                add_petal_overlay=add_petal_overlay,
+                add_sparkle_overlay=add_sparkle_overlay,
+                overlay_position=overlay_position,
+                threads=threads
+            )})
+            if preview:
+                jobs[-1]["kwargs"].update(preview=True, preview_seconds=preview_seconds)
             else:
-                filter_complex += f"{label}copy[outv];"
-
-            ffmpeg_cmd = ['ffmpeg', '-y'] + inputs + stream_args + [
-                '-filter_complex', filter_complex,
-                '-map', '[outv]',
-                '-map', '0:a?',  # Audio from main video
-                '-c:v', 'libx264',
-                '-c:a', 'aac',
-                '-shortest',
-                '-preset', 'ultrafast',
-                '-crf', '23',
-                output_path
-            ]
-
-            print(f"🎬 Processing: {filename}")
-            subprocess.run(ffmpeg_cmd, check=True)
-            print(f"✅ Done: {filename}")
-            os.remove(input_path)
+                jobs[-1]["kwargs"].update(consume_input=consume_inputs)
+
+    if preview:
+        return run_jobs(jobs, add_gif_overlays_to_video, max_workers=max_workers)
+    return run_journaled(jobs, _overlay_and_consume, journal, max_workers=max_workers)
+
+def _overlay_and_consume(input_path, output_path, consume_input=False, **kwargs):
+    """Render to a temp name, verify, rename into place; remove the input only with consume_input."""
+    return render_and_commit(
+        lambda tmp_path: add_gif_overlays_to_video(input_path, tmp_path, **kwargs),
+        input_path, output_path, expected_duration=probe(input_path).get("duration"),
+        consume_input=consume_input
+    )
+
+@metrics.in_pipeline("add_overlays")
+def add_gif_overlays_to_video(
+    input_path,
+    output_path,
+    add_petal_overlay=True,
+    add_sparkle_overlay=True,
+    overlay_position=(0, 0),
+    threads=None,
+    preview=False,
+    preview_seconds=None
+):
+    petal_gif_path = PETAL_GIF_PATH
+    sparkle_gif_path = SPARKLE_GIF_PATH
+    filename = os.path.basename(input_path)
+
+    # Overlays are pre-rendered once per base video size (see overlay_assets)
+    with metrics.stage("probe"):
+        info = probe(input_path)
+    width, height = info.get("width"), info.get("height")
+    base_filter = "null"
+    if preview and width and height:
+        # Scale the base first: overlays then get built and blended at proxy size
+        width, height = proxy_size(width, height)
+        base_filter = f"scale={width}:{height}:flags=fast_bilinear,fps={PREVIEW_FPS}"
+
+    def overlay_input(path):
+        if width and height:
+            return overlay_input_args(path, width, height)
+        return ['-stream_loop', '-1', '-i', path]
+
+    build_started = time.perf_counter()
+
+    # Prepare input list: always start with base video
+    inputs = ['-i', input_path]
+    if preview:
+        inputs = trim_args(preview_seconds) + inputs
+    stream_args = []
+
+    filter_complex = ""
+    label = "[base]"
+    overlay_idx = 1  # starts from 1 because main video is [0:v]
+
+    filter_complex += f"[0:v]{base_filter}[base];"
+
+    if add_petal_overlay and os.path.exists(petal_gif_path):
+        stream_args += overlay_input(petal_gif_path)
+        filter_complex += f"{label}[{overlay_idx}:v]overlay={overlay_position[0]}:{overlay_position[1]}[tmp{overlay_idx}];"
+        label = f"[tmp{overlay_idx}]"
+        overlay_idx += 1
+
+    if add_sparkle_overlay and os.path.exists(sparkle_gif_path):
+        stream_args += overlay_input(sparkle_gif_path)
+        filter_complex += f"{label}[{overlay_idx}:v]overlay={overlay_position[0]}:{overlay_position[1]}[outv];"
+    else:
+        filter_complex += f"{label}copy[outv];"
+
+    ffmpeg_cmd = ['ffmpeg', '-y'] + inputs + stream_args + [
+        '-filter_complex', filter_complex,
+        '-map', '[outv]',
+        '-map', '0:a?',  # Audio from main video
+    ]
+    if preview:
+        ffmpeg_cmd += PREVIEW_VIDEO_ARGS + PREVIEW_AUDIO_ARGS + ['-shortest']
+    else:
+        ffmpeg_cmd += [
+            '-c:v', 'libx264',
+            '-c:a', 'aac',
+            '-shortest',
+            '-preset', 'ultrafast',
+            '-crf', '23',
+        ]
+    if threads:
+        ffmpeg_cmd += ['-threads', str(threads)]
+    ffmpeg_cmd += [output_path]
+    metrics.record_stage("filter_build", time.perf_counter() - build_started)
+
+    print(f"🎬 Processing: {filename}")
+    duration = preview_duration(info.get("duration"), preview_seconds) if preview else None
+    run_ffmpeg(ffmpeg_cmd, duration=duration, label=filename)
+    print(f"✅ Done: {filename}")
+    return output_path
 
 def clear_folder(folder_path, extensions=None):
     if not os.path.exists(folder_path):
@@ -1,63 +1,47 @@
 # assemble_from_videos.py
-import os, random, math, subprocess, tempfile, json
+import os, random, tempfile, time
 from glob import glob
-from typing import List, Dict, Tuple
-from moviepy.editor import AudioFileClip, VideoFileClip, concatenate_videoclips
+from typing import List, Dict, Optional, Tuple
+from moviepy.editor import AudioFileClip, VideoFileClip
+from collections import Counter
+import metrics
+from ffmpeg_progress import run_ffmpeg
+from media_probe import CACHE_DIR, file_digest, probe, has_binary
+from parallel_runner import run_jobs
+from streaming_concat import MAX_OPEN_CLIPS, StreamingConcatClip
+
+NORMALIZED_CACHE_DIR = os.path.join(CACHE_DIR, "normalized")
 
 # --------------------------
 # FFmpeg / FFprobe utilities
 # --------------------------
 def _bin_exists(name: str) -> bool:
-    try:
-        subprocess.run([name, "-version"], capture_output=True, check=True)
-        return True
-    except Exception:
-        return False
+    return has_binary(name)
 
 def _ffprobe_stream_info(path: str) -> Dict:
     """
     Return primary video stream info as a dict:
-    {codec_name, width, height, avg_frame_rate (string), pix_fmt}
+    {codec_name, width, height, avg_frame_rate (string), pix_fmt, fps}
     """
-    try:
-        out = subprocess.check_output([
-            "ffprobe", "-v", "error",
-            "-select_streams", "v:0",
-            "-show_entries", "stream=codec_name,width,height,avg_frame_rate,pix_fmt",
-            "-of", "json",
-            path
-        ], universal_newlines=True)
-        data = json.loads(out)
-        streams = data.get("streams", [])
-        if not streams:
-            return {}
-        s = streams[0]
-        return {
-            "codec_name": s.get("codec_name"),
-            "width": s.get("width"),
-            "height": s.get("height"),
-            "avg_frame_rate": s.get("avg_frame_rate"),
-            "pix_fmt": s.get("pix_fmt"),
-        }
-    except Exception:
+    info = probe(path)
+    if not info or not info.get("codec_name"):
         return {}
+    return {k: info.get(k) for k in ("codec_name", "width", "height", "avg_frame_rate", "pix_fmt", "fps")}
 
 def _ffprobe_duration(path: str) -> float:
-    """Return duration in seconds using ffprobe (format duration)."""
+    """Return duration in seconds using the cached ffprobe metadata."""
+    d = probe(path).get("duration") or 0.0
+    if d > 0:
+        return float(d)
+    # MoviePy fallback (slower but robust)
     try:
-        out = subprocess.check_output([
-            "ffprobe", "-v", "error",
-            "-show_entries", "format=duration",
-            "-of", "default=noprint_wrappers=1:nokey=1",
-            path
-        ], universal_newlines=True).strip()
-        return float(out)
-    except Exception:
-        # MoviePy fallback (slower but robust)
+        clip = VideoFileClip(path, audio=False)
         try:
-            return float(VideoFileClip(path).duration)
-        except Exception:
-            return 0.0
+            return float(clip.duration)
+        finally:
+            clip.close()
+    except Exception:
+        return 0.0
 
 def _can_safe_concat(video_paths: List[str]) -> Tuple[bool, str]:
     """
@@ -73,20 +57,8 @@ def _can_safe_concat(video_paths: List[str]) -> Tuple[bool, str]:
         if not info or not all(info.get(k) for k in ["codec_name","width","height","avg_frame_rate","pix_fmt"]):
             return False, f"Missing stream info for: {os.path.basename(p)}"
 
-        # Normalize avg_frame_rate textual forms (e.g., "30000/1001" vs "29.97")
-        afr = info["avg_frame_rate"]
-        if afr and "/" in afr:
-            n, d = afr.split("/")
-            try:
-                afr_float = float(n) / float(d) if float(d) != 0 else 0.0
-            except Exception:
-                afr_float = 0.0
-        else:
-            try:
-                afr_float = float(afr)
-            except Exception:
-                afr_float = 0.0
-        info["_afr_float"] = afr_float
+        # avg_frame_rate textual forms (e.g., "30000/1001" vs "29.97") are parsed by media_probe
+        info["_afr_float"] = info["fps"]
 
         if ref is None:
             ref = info
@@ -111,6 +83,195 @@ def _can_safe_concat(video_paths: List[str]) -> Tuple[bool, str]:
 
     return True, "All inputs match (codec/size/fps/pix_fmt)"
 
+# Encoders matching the source codec, so a re-encoded partial clip can sit in the
+# same concat list as stream-copied ones
+MATCHING_ENCODERS = {"h264": "libx264", "hevc": "libx265", "mpeg4": "mpeg4", "vp9": "libvpx-vp9"}
+X264_PROFILES = {"Constrained Baseline": "baseline", "Baseline": "baseline", "Main": "main", "High": "high"}
+
+# The concat demuxer keeps the first file's avcC/hvcC (SPS/PPS) for the whole output,
+# so clips from different encoders are joined as MPEG-TS with the parameter sets
+# repeated in-band at every keyframe; the decoder then switches at each clip.
+ANNEXB_FILTERS = {"h264": "h264_mp4toannexb", "hevc": "hevc_mp4toannexb"}
+REPEAT_HEADERS = {"libx264": ["-x264-params", "repeat-headers=1"],
+                  "libx265": ["-x265-params", "repeat-headers=1"]}
+
+def _timescale(info: Dict) -> Optional[str]:
+    """Video track timescale of the source (the time_base denominator), e.g. "15360"."""
+    tb = info.get("time_base") or ""
+    den = tb.partition("/")[2]
+    return den if den.isdigit() and int(den) > 0 else None
+
+def _encode_partial(path: str, duration: float, out_path: str) -> str:
+    """
+    Re-encode the first `duration` seconds of `path` with parameters matching the
+    source (codec, size, fps, pix_fmt, profile, GOP) so it concat-copies cleanly.
+    Written as MPEG-TS with repeated headers (see ANNEXB_FILTERS).
+    """
+    info = probe(path)
+    encoder = MATCHING_ENCODERS.get(info.get("codec_name"))
+    if not encoder or info.get("codec_name") not in ANNEXB_FILTERS:
+        raise RuntimeError(f"No matching encoder for {info.get('codec_name')}: {os.path.basename(path)}")
+
+    cmd = [
+        "ffmpeg", "-y",
+        "-ss", "0", "-t", f"{duration:.3f}",   # input-side trim, decoding stops at the cut
+        "-i", path,
+        "-map", "0:v:0", "-an",
+        "-c:v", encoder,
+        "-pix_fmt", info["pix_fmt"],
+        "-r", info["avg_frame_rate"],
+    ] + REPEAT_HEADERS.get(encoder, [])
+    if encoder == "libx264" and info.get("profile") in X264_PROFILES:
+        cmd += ["-profile:v", X264_PROFILES[info["profile"]]]
+    if info.get("keyframe_interval") and info.get("fps"):
+        cmd += ["-g", str(max(1, round(info["keyframe_interval"] * info["fps"])))]
+    cmd += ["-f", "mpegts", out_path]
+    run_ffmpeg(cmd, duration=duration, label=os.path.basename(out_path))
+    return out_path
+
+def _to_transport_stream(path: str, out_path: str) -> str:
+    """Stream-copy the video of `path` to MPEG-TS with its SPS/PPS in-band at every keyframe."""
+    info = probe(path)
+    run_ffmpeg([
+        "ffmpeg", "-y", "-i", path,
+        "-map", "0:v:0", "-an",
+        "-c:v", "copy", "-bsf:v", ANNEXB_FILTERS[info["codec_name"]],
+        "-f", "mpegts", out_path
+    ], duration=info.get("duration") or None, label=os.path.basename(path), stage="mux")
+    return out_path
+
+def _concat_copy(plan: List[Tuple[str, float, float]], out_path: str, work_dir: str, tiny: float = 0.02) -> str:
+    """
+    Join `plan` [(path, full_duration, use_duration)] into a video-only `out_path`
+    without re-encoding whole clips. With h264/hevc the trimmed clip is re-encoded
+    (smart cut) and every clip goes through MPEG-TS so each keeps its own parameter
+    sets; the output's timescale is pinned to the first clip's. Other codecs are
+    concatenated as they are and the cut is left to the audio mux (-shortest).
+    """
+    ref = probe(plan[0][0])
+    smart_cut = ref.get("codec_name") in ANNEXB_FILTERS
+    transport: Dict[str, str] = {}
+    list_txt = os.path.join(work_dir, "list.txt")
+    with open(list_txt, "w", encoding="utf-8") as f:
+        for i, (p, full_d, use_d) in enumerate(plan):
+            if smart_cut:
+                if use_d < full_d - tiny:
+                    p = _encode_partial(p, use_d, os.path.join(work_dir, f"partial_{i}.ts"))
+                else:
+                    if p not in transport:
+                        transport[p] = _to_transport_stream(p, os.path.join(work_dir, f"clip_{len(transport)}.ts"))
+                    p = transport[p]
+            safe_p = p.replace("'", r"'\''")
+            f.write(f"file '{safe_p}'\n")
+
+    cmd = [
+        "ffmpeg", "-y",
+        "-f", "concat", "-safe", "0",
+        "-i", list_txt,
+        "-c:v", "copy",
+        "-an",
+    ]
+    if _timescale(ref):
+        cmd += ["-video_track_timescale", _timescale(ref)]
+    cmd += [out_path]
+    run_ffmpeg(cmd, duration=sum(u for _, _, u in plan), label="concat", stage="mux")
+    return out_path
+
+# --------------------------
+# Normalization pre-pass
+# --------------------------
+def _signature(info: Dict) -> Tuple:
+    return (info.get("codec_name"), info.get("width"), info.get("height"),
+            round(info.get("fps") or 0.0, 3), info.get("pix_fmt"))
+
+def _mezzanine_profile(video_paths: List[str]) -> Dict:
+    """
+    Canonical profile = the most common (codec, size, fps, pix_fmt) among the clips,
+    so the fewest clips need a transcode. GOP follows that group's keyframe interval.
+    """
+    infos = [probe(p) for p in video_paths]
+    counts = Counter(_signature(i) for i in infos if i.get("codec_name"))
+    if not counts:
+        return {}
+    sig = counts.most_common(1)[0][0]
+    ref = next(i for i in infos if _signature(i) == sig)
+    fps = ref.get("fps") or 30.0
+    return {
+        "codec_name": ref["codec_name"],
+        "width": ref["width"],
+        "height": ref["height"],
+        "avg_frame_rate": ref["avg_frame_rate"],
+        "fps": fps,
+        "pix_fmt": ref["pix_fmt"],
+        "gop": max(1, round((ref.get("keyframe_interval") or 2.0) * fps)),
+        "timescale": _timescale(ref),
+    }
+
+def _normalize_clip(path: str, profile: Dict) -> str:
+    """
+    Transcode `path` to `profile` once; cached by source hash + profile.
+    Headers are repeated in-band and the timescale follows the majority clips, so the
+    result joins cleanly with them (see _concat_copy).
+    """
+    key = (f"{profile['codec_name']}_{profile['width']}x{profile['height']}_"
+           f"{profile['fps']:.3f}_{profile['pix_fmt']}_g{profile['gop']}_ts{profile.get('timescale') or 0}_rh")
+    out_path = os.path.join(NORMALIZED_CACHE_DIR, f"{file_digest(path)[:16]}_{key}.mp4")
+    if os.path.exists(out_path):
+        return out_path
+
+    os.makedirs(NORMALIZED_CACHE_DIR, exist_ok=True)
+    W, H = profile["width"], profile["height"]
+    encoder = MATCHING_ENCODERS[profile["codec_name"]]
+    # Unique per writer: pools, concurrent batches and work-queue workers may normalize the same clip
+    fd, tmp = tempfile.mkstemp(dir=NORMALIZED_CACHE_DIR, prefix=".normalize_", suffix=".mp4")
+    os.close(fd)
+    cmd = [
+        "ffmpeg", "-y", "-i", path,
+        "-map", "0:v:0", "-an",
+        "-vf", (f"scale={W}:{H}:force_original_aspect_ratio=decrease,"
+                f"pad={W}:{H}:(ow-iw)/2:(oh-ih)/2,setsar=1"),
+        "-r", profile["avg_frame_rate"],
+        "-c:v", encoder,
+        "-pix_fmt", profile["pix_fmt"],
+        "-g", str(profile["gop"]),
+        "-threads", "1",   # clips are transcoded in parallel, one core each
+    ] + REPEAT_HEADERS.get(encoder, [])
+    if profile.get("timescale"):
+        cmd += ["-video_track_timescale", profile["timescale"]]
+    try:
+        run_ffmpeg(cmd + [tmp], label=os.path.basename(path), stage="normalize")
+        os.replace(tmp, out_path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return out_path
+
+def _normalize_clips(video_paths: List[str], max_workers: int = 0) -> Dict[str, str]:
+    """
+    Map each non-conforming clip to a normalized copy so every clip shares one
+    profile and assembly can always take the concat-copy path.
+    Clips that already conform map to themselves.
+    """
+    profile = _mezzanine_profile(video_paths)
+    if not profile or profile["codec_name"] not in MATCHING_ENCODERS:
+        return {p: p for p in video_paths}
+
+    mapping = {}
+    jobs = []
+    for p in video_paths:
+        if _signature(probe(p)) == _signature(profile):
+            mapping[p] = p
+        else:
+            jobs.append({"name": os.path.basename(p), "kwargs": {"path": p, "profile": profile}})
+    if jobs:
+        print(f"[Info] Normalizing {len(jobs)} clip(s) to {profile['width']}x{profile['height']} "
+              f"{profile['codec_name']} @ {profile['fps']:.3f}fps")
+    for job, r in zip(jobs, run_jobs(jobs, _normalize_clip, max_workers=max_workers)):
+        if not r["ok"]:
+            raise RuntimeError(f"Normalization failed for {job['name']}: {r['error']}")
+        mapping[job["kwargs"]["path"]] = r["result"]
+    return mapping
+
 # --------------------------
 # Discovery helpers
 # --------------------------
@@ -135,6 +296,7 @@ def _find_videos(video_folder: str) -> List[str]:
 # --------------------------
 # Main assembly
 # --------------------------
+@metrics.in_pipeline("assemble_videos")
 def assemble_videos(
     video_folder: str,
     audio_folder: str,
@@ -142,16 +304,24 @@ def assemble_videos(
     fps: int = 30,
     shuffle: bool = True,
     prefer_ffmpeg_concat: bool = True,  # will auto-fallback if not safe
+    normalize: bool = True,             # transcode odd clips so concat-copy is always possible
+    max_workers: int = 0,               # parallel normalization jobs (0 = one per core)
+    max_open_clips: int = MAX_OPEN_CLIPS,  # MoviePy path: clip readers open at the same time
 ):
     """
     Auto-selects FFmpeg concat (stream-copy) if safe; otherwise falls back to MoviePy.
 
     - Reads the *real* duration of each clip.
     - Repeats clips (loop through list) until sum >= audio duration.
-    - If using MoviePy: trims the last clip exactly to fit.
-    - If using FFmpeg concat: concatenates whole clips, then muxes audio with -shortest.
+    - normalize=True: clips that differ in codec/size/fps/pix_fmt from the majority are
+      transcoded (in parallel, cached in .cache/normalized) so the concat path applies.
+    - If using MoviePy: streams the plan through StreamingConcatClip, which opens each
+      clip only while it plays (at most max_open_clips readers) and trims the last clip.
+    - If using FFmpeg concat (smart cut): stream-copies whole clips, re-encodes only the
+      trimmed last clip with matching encoder settings, then muxes audio.
     """
-    clear_folder("edit_vid_output")
+    with metrics.stage("cleanup"):
+        clear_folder("edit_vid_output")
     
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
@@ -169,16 +339,27 @@ def assemble_videos(
     durations = []
     valid_paths = []
     tiny = 0.02
-    for p in video_paths:
-        d = _ffprobe_duration(p)
-        if d > tiny:
-            valid_paths.append(p)
-            durations.append(d)
+    with metrics.stage("probe"):
+        for p in video_paths:
+            d = _ffprobe_duration(p)
+            if d > tiny:
+                valid_paths.append(p)
+                durations.append(d)
     if not valid_paths:
         audio.close()
         raise RuntimeError("All candidate videos are zero-length or unreadable.")
 
+    # 3b) Normalize non-conforming clips so all of them can be concat-copied
+    if prefer_ffmpeg_concat and normalize and _bin_exists("ffmpeg"):
+        try:
+            mapping = _normalize_clips(valid_paths, max_workers=max_workers)
+            valid_paths = [mapping[p] for p in valid_paths]
+            durations = [_ffprobe_duration(p) for p in valid_paths]
+        except Exception as e:
+            print(f"[Info] Normalization skipped: {e}")
+
     # 4) Build a plan (path, full_duration, use_duration) to cover >= audio length
+    plan_started = time.perf_counter()
     remaining = audio_duration
     plan: List[Tuple[str, float, float]] = []
     idx = 0
@@ -193,29 +374,15 @@ def assemble_videos(
     # 5) Decide path: FFmpeg concat if safe and preferred, else MoviePy
     if prefer_ffmpeg_concat:
         can_concat, reason = _can_safe_concat(valid_paths)
+    metrics.record_stage("plan", time.perf_counter() - plan_started)
+    if prefer_ffmpeg_concat:
         if can_concat:
             # ---- FFmpeg concat (no re-encode) ----
             audio.close()  # we'll remux with ffmpeg
             with tempfile.TemporaryDirectory() as td:
-                list_txt = os.path.join(td, "list.txt")
-                # Write whole files (concat demuxer can't trim mid-file)
-                with open(list_txt, "w", encoding="utf-8") as f:
-                    for (p, full_d, use_d) in plan:
-                        # Always list the *entire* file
-                        safe_p = p.replace("'", r"'\''")
-                        f.write(f"file '{safe_p}'\n")
-
-                # 1) Concat (video only), stream copy
-                temp_concat = os.path.join(td, "concat.mp4")
-                cmd_concat = [
-                    "ffmpeg", "-y",
-                    "-f", "concat", "-safe", "0",
-                    "-i", list_txt,
-                    "-c:v", "copy",
-                    "-an",
-                    temp_concat
-                ]
-                subprocess.run(cmd_concat, check=True)
+                # 1) Concat (video only), stream copy. Smart cut: whole clips are
+                # stream-copied, only a trimmed partial clip (normally just the last one) is re-encoded
+                temp_concat = _concat_copy(plan, os.path.join(td, "concat.mp4"), td, tiny)
 
                 # 2) Mux audio, end at audio length
                 cmd_mux = [
@@ -228,42 +395,39 @@ def assemble_videos(
                     "-shortest",
                     output_path
                 ]
-                subprocess.run(cmd_mux, check=True)
+                run_ffmpeg(cmd_mux, duration=audio_duration, label=os.path.basename(output_path), stage="mux")
 
-            return
+            return output_path
         else:
             print(f"[Info] Falling back to MoviePy (concat not safe): {reason}")
 
     # ---- MoviePy re-encode path (robust, trims last clip) ----
-    clips = []
+    video = None
     try:
-        for (p, full_d, use_d) in plan:
-            c = VideoFileClip(p).without_audio()
-            if use_d < (c.duration - tiny):
-                c = c.subclip(0, use_d)
-            clips.append(c)
-
-        video = concatenate_videoclips(clips, method="compose")
+        video = StreamingConcatClip([(p, use_d) for p, _, use_d in plan], max_open=max_open_clips)
+        print(f"[Info] MoviePy: {len(plan)} clip(s), at most {video.max_open} open, "
+              f"{'chain' if video.chain else 'compose'} {video.size[0]}x{video.size[1]}")
         video = video.set_audio(audio).set_duration(audio_duration)
 
-        video.write_videofile(
-            output_path,
-            fps=fps,
-            codec="libx264",
-            audio_codec="aac",
-            threads=4,
-            temp_audiofile="__temp_audio.m4a",
-            remove_temp=True
-        )
+        with metrics.stage("encode"):
+            video.write_videofile(
+                output_path,
+                fps=fps,
+                codec="libx264",
+                audio_codec="aac",
+                threads=4,
+                temp_audiofile="__temp_audio.m4a",
+                remove_temp=True
+            )
+        return output_path
     finally:
-        for c in clips:
-            try: c.close()
+        if video is not None:
+            try: video.close()
             except: pass
         try: audio.close()
         except: pass
 
 
-
 def clear_folder(folder_path, extensions=None):
     if not os.path.exists(folder_path):
         os.makedirs(folder_path)
@@ -283,7 +447,8 @@ if __name__ == "__main__":
         output_path="edit_vid_output/final_video.mp4",
         fps=30,
         shuffle=True,                                   # different order each run
-        prefer_ffmpeg_concat=True                       # auto-uses concat if safe; else MoviePy
+        prefer_ffmpeg_concat=True,                      # auto-uses concat if safe; else MoviePy
+        max_open_clips=2                                # MoviePy fallback: readers open at once
     )
 
 
@@ -0,0 +1,194 @@
+# batch_journal.py
+import hashlib, json, os, threading, time
+from functools import partial
+from typing import Callable, Dict, List, Optional
+
+import metrics
+from media_probe import probe
+from parallel_runner import run_jobs
+
+JOURNAL_NAME = ".batch_journal.json"
+PARTIAL_MARKER = ".partial"
+VIDEO_EXTS = (".mp4", ".mov", ".mkv", ".webm")
+# A render shorter than this share of its expected length counts as truncated
+MIN_DURATION_RATIO = 0.95
+
+# --------------------------
+# Atomic outputs
+# --------------------------
+def partial_path(output_path: str) -> str:
+    """Temp name next to the output (same folder, same extension so ffmpeg picks the muxer)."""
+    folder, name = os.path.split(output_path)
+    stem, ext = os.path.splitext(name)
+    return os.path.join(folder, f".{stem}{PARTIAL_MARKER}{ext}")
+
+def verify_output(path: str, min_duration: float = 0.0) -> Optional[str]:
+    """None if `path` is a readable video with a positive duration, else why it isn't."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return "output missing or empty"
+    info = probe(path)
+    if not info.get("codec_name") or not info.get("width"):
+        return "no readable video stream"
+    duration = info.get("duration") or 0.0
+    if duration <= max(0.0, min_duration):
+        return f"duration {duration:.2f}s"
+    return None
+
+def commit_output(tmp_path: str, output_path: str, min_duration: float = 0.0) -> str:
+    """Verify the render in `tmp_path` and rename it onto `output_path`; remove it and raise if it's bad."""
+    problem = verify_output(tmp_path, min_duration)
+    if problem:
+        try: os.remove(tmp_path)
+        except OSError: pass
+        raise RuntimeError(f"Render of {os.path.basename(output_path)} failed verification: {problem}")
+    os.replace(tmp_path, output_path)
+    return output_path
+
+def render_and_commit(render: Callable[[str], object], input_path: str, output_path: str,
+                      expected_duration: Optional[float] = None, consume_input: bool = False) -> str:
+    """
+    Run render(tmp_path) into partial_path(output_path), verify it is at least
+    MIN_DURATION_RATIO of expected_duration long and rename it into place.
+    The input is removed afterwards only with consume_input.
+    """
+    tmp_path = partial_path(output_path)
+    render(tmp_path)
+    commit_output(tmp_path, output_path, (expected_duration or 0.0) * MIN_DURATION_RATIO)
+    if consume_input:
+        with metrics.stage("cleanup"):
+            os.remove(input_path)
+    return output_path
+
+# --------------------------
+# Per-batch journal
+# --------------------------
+class BatchJournal:
+    """
+    Record of the files a batch already finished, kept as JOURNAL_NAME in the
+    output folder. The batch id is a hash of the pipeline name and its settings:
+    a rerun with the same settings resumes (the output folder is kept and
+    finished files are skipped); anything else starts a fresh batch. The journal
+    is removed once every file of a batch succeeded.
+    """
+
+    def __init__(self, output_folder: str, pipeline: str, params: Dict):
+        self.output_folder = output_folder
+        self.path = os.path.join(output_folder, JOURNAL_NAME)
+        blob = json.dumps({"pipeline": pipeline, "params": params}, sort_keys=True, default=str)
+        self.batch_id = hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+        self._lock = threading.Lock()
+        state = self._load()
+        self.resumed = state.get("batch_id") == self.batch_id
+        self.done: Dict[str, Dict] = state.get("done", {}) if self.resumed else {}
+
+    def start(self, clear: Callable[[str], None]):
+        """Resume, or clear the output folder with `clear` and begin a new journal."""
+        if self.resumed:
+            print(f"🔁 Resuming batch {self.batch_id}: {len(self.done)} file(s) already done")
+            for name in os.listdir(self.output_folder):
+                if name.startswith(".") and PARTIAL_MARKER in name:
+                    os.remove(os.path.join(self.output_folder, name))
+            self._verify_outputs()
+        else:
+            clear(self.output_folder)
+            self._save()
+
+    def _verify_outputs(self):
+        """
+        Check every video already in the output folder, journaled or not: a run
+        can die between renaming an output into place and journaling it (with its
+        input already consumed), so an unjournaled file isn't known to be good.
+        Bad files are removed and their journal entries dropped so they're redone.
+        """
+        by_output = {e.get("output"): name for name, e in self.done.items()}
+        dropped = False
+        for name in sorted(os.listdir(self.output_folder)):
+            path = os.path.join(self.output_folder, name)
+            if name.startswith(".") or not name.lower().endswith(VIDEO_EXTS) or not os.path.isfile(path):
+                continue
+            problem = verify_output(path)
+            if problem:
+                print(f"[Warn] Removing {name} from the interrupted run: {problem}")
+                os.remove(path)
+                if name in by_output:
+                    del self.done[by_output[name]]
+                    dropped = True
+            elif name not in by_output:
+                print(f"[Info] Kept unjournaled {name} from the interrupted run (verified)")
+        if dropped:
+            self._save()
+
+    def is_done(self, input_path: str, output_path: str) -> bool:
+        entry = self.done.get(os.path.basename(input_path))
+        if not entry or not os.path.exists(output_path):
+            return False
+        # A kept input that changed since it was processed is done again
+        return not os.path.exists(input_path) or entry.get("input") == _input_id(input_path)
+
+    def mark_done(self, input_path: str, output_path: str):
+        with self._lock:
+            self.done[os.path.basename(input_path)] = {
+                "input": _input_id(input_path),
+                "output": os.path.basename(output_path),
+                "finished_at": time.time(),
+            }
+            self._save()
+
+    def close(self, results: List[Dict]):
+        """Drop the journal when nothing failed; keep it so a rerun retries the failures."""
+        failed = [r for r in results if not r["ok"]]
+        if failed:
+            print(f"[Info] {len(failed)} file(s) failed, rerun the batch to retry them (journal kept)")
+            return
+        try: os.remove(self.path)
+        except OSError: pass
+
+    def _load(self) -> Dict:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        os.makedirs(self.output_folder, exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"batch_id": self.batch_id, "done": self.done}, f, indent=1)
+        os.replace(tmp, self.path)
+
+def run_journaled(jobs: List[Dict], worker: Callable, journal: BatchJournal, max_workers: int = 1) -> List[Dict]:
+    """
+    run_jobs() that skips jobs the journal has as done and journals each job
+    that succeeds. Jobs need input_path/output_path kwargs (and may set
+    consume_input). Results keep job order.
+    """
+    results: Dict[str, Dict] = {}
+    pending = []
+    for job in jobs:
+        kw = job["kwargs"]
+        if journal.is_done(kw["input_path"], kw["output_path"]):
+            results[job["name"]] = {"name": job["name"], "ok": True, "result": kw["output_path"], "error": None}
+            if kw.get("consume_input") and os.path.exists(kw["input_path"]):
+                os.remove(kw["input_path"])   # verified by the earlier run
+        else:
+            pending.append(job)
+    if results:
+        print(f"⏭️ Skipping {len(results)} file(s) finished by an earlier run")
+    for r in run_jobs(pending, partial(_journaled, worker, journal), max_workers=max_workers):
+        results[r["name"]] = r
+    ordered = [results[job["name"]] for job in jobs]
+    journal.close(ordered)
+    return ordered
+
+def _journaled(worker: Callable, journal: BatchJournal, input_path: str, output_path: str, **kwargs):
+    result = worker(input_path=input_path, output_path=output_path, **kwargs)
+    journal.mark_done(input_path, output_path)
+    return result
+
+def _input_id(path: str) -> Optional[List]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
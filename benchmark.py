@@ -0,0 +1,242 @@
+# benchmark.py
+"""
+Offline benchmarks for every pipeline, on synthetic media generated locally.
+
+    python benchmark.py                                # run all cases, write bench_report.json
+    python benchmark.py --save-baseline                # ... and store it as bench_baseline.json
+    python benchmark.py --baseline bench_baseline.json --threshold 0.15
+
+Each case runs in its own Python subprocess so wall time, peak RSS of the Python
+process and of its ffmpeg children (getrusage) are measured per case.
+Exit code is 1 when a case regressed past the threshold against the baseline.
+"""
+import argparse, json, os, platform, resource, shutil, subprocess, sys, time
+from glob import glob
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SIZES = {"portrait": (1080, 1920), "landscape": (1920, 1080)}
+VIDEO_EXTS = (".mp4", ".mov", ".mkv", ".webm")
+
+# --------------------------
+# Synthetic media
+# --------------------------
+def _ffmpeg(*args):
+    subprocess.run(["ffmpeg", "-y", "-v", "error", *args], check=True)
+
+def generate_media(media_dir, durations):
+    """Deterministic inputs: testsrc2 + sine clips per orientation/duration, images, one song."""
+    os.makedirs(media_dir, exist_ok=True)
+    for orientation, (w, h) in SIZES.items():
+        for d in durations:
+            out = os.path.join(media_dir, "clips", f"{orientation}_{d}s.mp4")
+            if os.path.exists(out):
+                continue
+            os.makedirs(os.path.dirname(out), exist_ok=True)
+            _ffmpeg("-f", "lavfi", "-i", f"testsrc2=size={w}x{h}:rate=30:duration={d}",
+                    "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=44100:duration={d}",
+                    "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+                    "-c:a", "aac", "-shortest", out)
+        for i in range(3):
+            out = os.path.join(media_dir, "images", f"{orientation}_{i}.jpg")
+            if os.path.exists(out):
+                continue
+            os.makedirs(os.path.dirname(out), exist_ok=True)
+            # larger than the output canvas, like real photos
+            _ffmpeg("-f", "lavfi", "-i", f"testsrc2=size={w * 2}x{h * 2}:rate=1",
+                    "-vf", f"hue=h={i * 120}", "-frames:v", "1", out)
+    song = os.path.join(media_dir, "audio", "song.m4a")
+    if not os.path.exists(song):
+        os.makedirs(os.path.dirname(song), exist_ok=True)
+        _ffmpeg("-f", "lavfi", "-i", f"sine=frequency=330:sample_rate=44100:duration={max(durations) * 2}",
+                "-c:a", "aac", song)
+
+# --------------------------
+# Cases (run inside the child process, cwd = case dir)
+# --------------------------
+def _stage(src_glob, dest):
+    os.makedirs(dest, exist_ok=True)
+    for p in sorted(glob(src_glob)):
+        shutil.copy(p, dest)
+
+def case_process_video(media):
+    from video_editor import batch_process
+    _stage(os.path.join(media, "clips", "*.mp4"), "edit_vid_input")
+    batch_process(input_folder="edit_vid_input", output_folder="edit_vid_output",
+                  add_music=False, slow_down=True, slow_down_factor=2.0,
+                  add_watermark=True, watermark_path="logo.png",
+                  watermark_position="bottom-left", watermark_scale=0.15)
+
+def case_add_overlays(media):
+    from add_overlays import add_gif_overlays_to_videos
+    _stage(os.path.join(media, "clips", "*.mp4"), "edit_vid_input")
+    add_gif_overlays_to_videos(input_folder="edit_vid_input", output_folder="edit_vid_output")
+
+def case_multiply_videos(media):
+    from multiply_video import multiply_videos
+    _stage(os.path.join(media, "clips", "*.mp4"), "edit_vid_input")
+    multiply_videos(input_folder="edit_vid_input", output_folder="edit_vid_output", repeat_factor=3)
+
+def case_export_kb_videos(media):
+    from make_kb_videos import export_kb_videos
+    _stage(os.path.join(media, "images", "landscape_*.jpg"), "edit_vid_input")
+    export_kb_videos(input_folder="edit_vid_input", out_folder="edit_vid_output",
+                     per_image=5, output_size=(1920, 1080), zoom_start=1.0, zoom_end=1.05)
+
+def case_export_kb_videos_ffmpeg(media):
+    from make_kb_videos import export_kb_videos
+    _stage(os.path.join(media, "images", "landscape_*.jpg"), "edit_vid_input")
+    export_kb_videos(input_folder="edit_vid_input", out_folder="edit_vid_output",
+                     per_image=5, output_size=(1920, 1080), zoom_start=1.0, zoom_end=1.05,
+                     backend="ffmpeg")
+
+def case_create_slideshow(media):
+    from images_to_video import create_slideshow
+    _stage(os.path.join(media, "images", "landscape_*.jpg"), "edit_vid_input")
+    _stage(os.path.join(media, "audio", "*"), "edit_vid_audio")
+    os.makedirs("edit_vid_output", exist_ok=True)
+    create_slideshow(input_folder="edit_vid_input", audio_folder="edit_vid_audio",
+                     output_path="edit_vid_output/final_video.mp4",
+                     output_size=(1920, 1080), per_image=5)
+
+def case_assemble_videos(media):
+    from assemble_from_videos import assemble_videos
+    _stage(os.path.join(media, "clips", "landscape_*.mp4"), "edit_vid_input")
+    _stage(os.path.join(media, "audio", "*"), "edit_vid_audio")
+    assemble_videos(video_folder="edit_vid_input", audio_folder="edit_vid_audio",
+                    output_path="edit_vid_output/final_video.mp4", shuffle=False)
+
+CASES = {
+    "process_video": case_process_video,
+    "add_overlays": case_add_overlays,
+    "multiply_videos": case_multiply_videos,
+    "export_kb_videos": case_export_kb_videos,
+    "export_kb_videos_ffmpeg": case_export_kb_videos_ffmpeg,
+    "create_slideshow": case_create_slideshow,
+    "assemble_videos": case_assemble_videos,
+}
+
+def run_case(name, media_dir, case_dir):
+    """Child side: run one case and print its measurements as JSON."""
+    sys.path.insert(0, REPO_DIR)
+    shutil.rmtree(case_dir, ignore_errors=True)
+    os.makedirs(case_dir)
+    # pipelines use relative asset paths (logo.png, overlays/) and folders
+    for asset in ("logo.png", "overlays"):
+        os.symlink(os.path.join(REPO_DIR, asset), os.path.join(case_dir, asset))
+    os.chdir(case_dir)
+
+    start = time.perf_counter()
+    error = None
+    try:
+        CASES[name](os.path.abspath(media_dir))
+    except Exception as e:
+        error = str(e)
+    wall = time.perf_counter() - start
+
+    from media_probe import probe
+    outputs = [p for p in glob(os.path.join("edit_vid_output", "*")) if p.lower().endswith(VIDEO_EXTS)]
+    frames = 0
+    for p in outputs:
+        info = probe(p)
+        frames += (info.get("duration") or 0.0) * (info.get("fps") or 0.0)
+
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    print(json.dumps({
+        "ok": error is None and bool(outputs),
+        "error": error,
+        "wall_seconds": round(wall, 3),
+        "encode_fps": round(frames / wall, 2) if wall > 0 else 0.0,
+        "output_frames": int(frames),
+        "output_files": len(outputs),
+        "output_bytes": sum(os.path.getsize(p) for p in outputs),
+        "peak_rss_mb": round(own.ru_maxrss / 1024, 1),            # ru_maxrss is KiB on Linux
+        "peak_child_rss_mb": round(children.ru_maxrss / 1024, 1),  # largest ffmpeg child
+        "cpu_seconds": round(own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime, 3),
+    }))
+
+# --------------------------
+# Report / baseline
+# --------------------------
+def compare(report, baseline, threshold):
+    """Cases whose wall time or peak RSS grew by more than `threshold` (fraction)."""
+    regressions = []
+    for name, cur in report["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or not cur.get("ok") or not base.get("ok"):
+            continue
+        for metric in ("wall_seconds", "peak_rss_mb", "peak_child_rss_mb"):
+            b, c = base.get(metric) or 0, cur.get(metric) or 0
+            if b > 0 and c > b * (1 + threshold):
+                regressions.append({"case": name, "metric": metric, "baseline": b,
+                                    "current": c, "change": round(c / b - 1, 3)})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the video pipelines on synthetic media.")
+    parser.add_argument("--cases", default=",".join(CASES), help="Comma separated case names.")
+    parser.add_argument("--durations", default="5,15", help="Clip durations in seconds.")
+    parser.add_argument("--work_dir", default=os.path.join(REPO_DIR, ".bench"), help="Scratch folder.")
+    parser.add_argument("--report", default="bench_report.json", help="Where to write the JSON report.")
+    parser.add_argument("--baseline", default=None, help="Baseline report to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed regression (0.10 = 10%%).")
+    parser.add_argument("--save-baseline", action="store_true", help="Also save the report as bench_baseline.json.")
+    parser.add_argument("--run-case", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    media_dir = os.path.join(args.work_dir, "media")
+    if args.run_case:
+        run_case(args.run_case, media_dir, os.path.join(args.work_dir, "cases", args.run_case))
+        return 0
+
+    durations = [int(d) for d in args.durations.split(",") if d]
+    generate_media(media_dir, durations)
+
+    results = {}
+    for name in [c for c in args.cases.split(",") if c]:
+        if name not in CASES:
+            raise SystemExit(f"Unknown case: {name}")
+        print(f"⏱️ {name} ...", flush=True)
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--run-case", name,
+             "--work_dir", args.work_dir],
+            capture_output=True, text=True
+        )
+        try:
+            results[name] = json.loads(proc.stdout.strip().splitlines()[-1])
+        except Exception:
+            results[name] = {"ok": False, "error": proc.stderr[-2000:]}
+        r = results[name]
+        print(f"   {'✅' if r.get('ok') else '❌'} {r.get('wall_seconds')}s, "
+              f"{r.get('encode_fps')} fps, rss {r.get('peak_rss_mb')}/{r.get('peak_child_rss_mb')} MB")
+
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "host": platform.node(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "durations": durations,
+        },
+        "results": results,
+    }
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["regressions"] = compare(report, baseline, args.threshold)
+        for r in report["regressions"]:
+            print(f"⚠️ Regression: {r['case']} {r['metric']} {r['baseline']} -> {r['current']} (+{r['change']:.0%})")
+        status = 1 if report["regressions"] else 0
+
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    if args.save_baseline:
+        shutil.copy(args.report, "bench_baseline.json")
+    print(f"Report written to {args.report}")
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+# ffmpeg_progress.py
+import contextvars, subprocess, time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+import metrics
+from media_probe import probe
+
+# Callback receiving progress snapshots of every ffmpeg run in the current context.
+# Set by the job queue per job; parallel_runner copies the context into its threads
+# and forwards records from its pool processes through a queue.
+_listener: contextvars.ContextVar = contextvars.ContextVar("ffmpeg_progress_listener", default=None)
+
+@contextmanager
+def progress_listener(callback: Callable[[Dict], None]):
+    token = _listener.set(callback)
+    try:
+        yield
+    finally:
+        _listener.reset(token)
+
+def current_listener() -> Optional[Callable[[Dict], None]]:
+    """Listener of the current context, for forwarding progress out of worker processes."""
+    return _listener.get()
+
+# --------------------------
+# Running ffmpeg with -progress
+# --------------------------
+def run_ffmpeg(cmd: List[str], duration: Optional[float] = None, label: Optional[str] = None,
+               check: bool = True, stage: str = "encode") -> subprocess.CompletedProcess:
+    """
+    subprocess.run() replacement for ffmpeg commands.
+
+    Adds `-progress pipe:1 -nostats`, parses the key=value blocks as they arrive and
+    reports {label, frame, fps, speed, out_time, duration, percent, eta, state} to the
+    current progress listener. `duration` is the expected output length in seconds;
+    when omitted the first input is probed. stderr is left alone (logs still print).
+    Wall time, CPU, peak RSS and I/O of the child are recorded as `stage` in metrics.
+    """
+    if duration is None:
+        duration = _first_input_duration(cmd)
+    label = label or (cmd[-1] if cmd else "ffmpeg")
+    full_cmd = [cmd[0], "-progress", "pipe:1", "-nostats"] + list(cmd[1:])
+
+    started = time.time()
+    stats: Dict[str, str] = {}
+    proc = subprocess.Popen(full_cmd, stdout=subprocess.PIPE, text=True, bufsize=1)
+    sampler = metrics.ProcSampler(proc.pid)
+    try:
+        for line in proc.stdout:
+            key, _, value = line.strip().partition("=")
+            if not key:
+                continue
+            stats[key] = value
+            if key == "progress":
+                _emit(snapshot(stats, duration, started, label))
+        sample = sampler.stop()
+        proc.wait()
+    except BaseException:
+        sampler.stop()
+        proc.kill()
+        proc.wait()
+        raise
+    metrics.record_ffmpeg(stage, time.time() - started, proc.returncode, sample)
+
+    final = snapshot(stats, duration, started, label)
+    final["state"] = "done" if proc.returncode == 0 else "failed"
+    if proc.returncode == 0:
+        final["percent"], final["eta"] = 100.0, 0.0
+    _emit(final)
+    if check and proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, full_cmd)
+    return subprocess.CompletedProcess(full_cmd, proc.returncode)
+
+def snapshot(stats: Dict[str, str], duration: Optional[float], started: float, label: str) -> Dict:
+    """Turn ffmpeg's raw -progress fields into a progress record."""
+    out_time = _out_time_seconds(stats)
+    elapsed = time.time() - started
+    percent = eta = None
+    if duration and duration > 0:
+        percent = max(0.0, min(100.0, 100.0 * out_time / duration))
+        if 0 < percent < 100:
+            eta = round(elapsed * (100.0 - percent) / percent, 1)
+        elif percent >= 100:
+            eta = 0.0
+    return {
+        "label": label,
+        "frame": _to_int(stats.get("frame")),
+        "fps": _to_float(stats.get("fps")),
+        "speed": _to_float((stats.get("speed") or "").rstrip("x")),
+        "out_time": round(out_time, 2),
+        "duration": round(duration, 2) if duration else None,
+        "percent": round(percent, 1) if percent is not None else None,
+        "eta": eta,
+        "elapsed": round(elapsed, 1),
+        "state": "end" if stats.get("progress") == "end" else "running",
+    }
+
+def _emit(record: Dict):
+    callback = _listener.get()
+    if callback:
+        try:
+            callback(record)
+        except Exception:
+            pass
+
+def _first_input_duration(cmd: List[str]) -> Optional[float]:
+    for i, arg in enumerate(cmd[:-1]):
+        if arg == "-i":
+            return probe(cmd[i + 1]).get("duration") or None
+    return None
+
+def _out_time_seconds(stats: Dict[str, str]) -> float:
+    # out_time_us is the reliable field (out_time_ms is also in microseconds)
+    for key in ("out_time_us", "out_time_ms"):
+        v = _to_int(stats.get(key))
+        if v:
+            return v / 1_000_000
+    return 0.0
+
+def _to_int(v) -> int:
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return 0
+
+def _to_float(v) -> float:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return 0.0
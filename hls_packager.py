@@ -0,0 +1,130 @@
+# hls_packager.py
+import os, shutil, tempfile, threading
+from typing import Optional
+
+from media_probe import CACHE_DIR, file_digest, probe
+from ffmpeg_progress import run_ffmpeg
+
+HLS_DIR = os.path.join(CACHE_DIR, "hls")
+HLS_CACHE_MAX_BYTES = int(os.environ.get("VIDEO_HLS_CACHE_MB", 5 * 1024)) * 1024 * 1024
+HLS_SEGMENT_SECONDS = 4
+PLAYLIST_NAME = "index.m3u8"
+
+# Codecs an HLS player takes in MPEG-TS segments as they are (no re-encode needed)
+HLS_COPY_VIDEO_CODECS = {"h264", "hevc"}
+HLS_COPY_AUDIO_CODECS = {"aac", "mp3"}
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+# --------------------------
+# Packaging
+# --------------------------
+def hls_key(video_path: str) -> str:
+    """Folder name under HLS_DIR: file name plus content hash, so a new render gets new segments."""
+    name = os.path.splitext(os.path.basename(video_path))[0]
+    return f"{name}_{file_digest(video_path)[:16]}"
+
+def package_hls(video_path: str, segment_seconds: int = HLS_SEGMENT_SECONDS) -> str:
+    """
+    Cut a finished render into MPEG-TS segments plus a VOD playlist and return the
+    playlist path. Streams are copied when the codecs allow it, so this is about as
+    fast as reading the file once. Packaged once per file content.
+    """
+    key = hls_key(video_path)
+    out_dir = os.path.join(HLS_DIR, key)
+    playlist = os.path.join(out_dir, PLAYLIST_NAME)
+    if os.path.exists(playlist):
+        _touch(out_dir)
+        return playlist
+
+    with _lock_for(key):
+        if os.path.exists(playlist):
+            return playlist
+        # _lock_for only covers this process: other packagers of the same key get their own
+        # folder (evict() skips *.tmp), and the first one renamed into place wins
+        os.makedirs(HLS_DIR, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=HLS_DIR, prefix=f"{key}.", suffix=".tmp")
+        cmd = ['ffmpeg', '-y', '-i', video_path, '-map', '0:v:0', '-map', '0:a:0?']
+        cmd += _codec_args(video_path)
+        cmd += [
+            '-f', 'hls',
+            '-hls_time', str(segment_seconds),
+            '-hls_playlist_type', 'vod',
+            '-hls_segment_filename', os.path.join(tmp_dir, 'seg_%04d.ts'),
+            os.path.join(tmp_dir, PLAYLIST_NAME)
+        ]
+        try:
+            run_ffmpeg(cmd, label=f"{key}/{PLAYLIST_NAME}", stage="mux")
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        # the playlist references segments by relative name, so the folder can be renamed as a whole
+        try:
+            os.replace(tmp_dir, out_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.exists(playlist):
+                raise
+    print(f"📺 HLS ready: {playlist}")
+    evict(keep=key)
+    return playlist
+
+def hls_playlist(video_path: str) -> Optional[str]:
+    """Playlist path if this exact file was packaged already, else None."""
+    out_dir = os.path.join(HLS_DIR, hls_key(video_path))
+    playlist = os.path.join(out_dir, PLAYLIST_NAME)
+    if not os.path.exists(playlist):
+        return None
+    _touch(out_dir)
+    return playlist
+
+def evict(max_bytes: int = HLS_CACHE_MAX_BYTES, keep: Optional[str] = None):
+    """Remove least recently used packages (whole folders) until HLS_DIR fits in max_bytes."""
+    packages = []
+    try:
+        names = os.listdir(HLS_DIR)
+    except OSError:
+        return
+    for name in names:
+        d = os.path.join(HLS_DIR, name)
+        if name.endswith(".tmp") or name == keep or not os.path.isdir(d):
+            continue
+        try:
+            size = sum(os.path.getsize(os.path.join(d, f)) for f in os.listdir(d))
+            packages.append((os.stat(d).st_mtime, size, d))
+        except OSError:
+            continue
+    total = sum(size for _, size, _ in packages)
+    if keep and os.path.isdir(os.path.join(HLS_DIR, keep)):
+        d = os.path.join(HLS_DIR, keep)
+        total += sum(os.path.getsize(os.path.join(d, f)) for f in os.listdir(d))
+    for _, size, d in sorted(packages):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(d, ignore_errors=True)
+        total -= size
+
+def _touch(path: str):
+    """Mark a package as recently used for evict()."""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+def _codec_args(video_path: str):
+    info = probe(video_path)
+    if info.get("codec_name") in HLS_COPY_VIDEO_CODECS:
+        args = ['-c:v', 'copy']
+    else:
+        args = ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '23', '-pix_fmt', 'yuv420p']
+    audio = info.get("audio_streams") or []
+    if audio and audio[0].get("codec_name") in HLS_COPY_AUDIO_CODECS:
+        args += ['-c:a', 'copy']
+    else:
+        args += ['-c:a', 'aac', '-b:a', '160k']
+    return args
+
+def _lock_for(key: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
@@ -0,0 +1,121 @@
+# image_cache.py
+import hashlib, math, os, threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from media_probe import CACHE_DIR
+
+IMAGE_CACHE_DIR = os.path.join(CACHE_DIR, "images")
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("VIDEO_IMAGE_CACHE_MB", 512)) * 1024 * 1024
+# Write evicted images to IMAGE_CACHE_DIR (.npy) instead of dropping them
+IMAGE_CACHE_SPILL = os.environ.get("VIDEO_IMAGE_CACHE_SPILL", "0") == "1"
+
+# --------------------------
+# Sizing
+# --------------------------
+def prepared_size(iw: int, ih: int, size: Tuple[int, int], max_scale: float) -> Tuple[int, int]:
+    """
+    Largest size a Ken Burns render ever samples from: the cover size of the
+    canvas (see cover_resize) times the biggest zoom and overscan. Never upscales.
+    """
+    W, H = size
+    if iw / ih >= W / H:
+        bw, bh = iw * H / ih, H
+    else:
+        bw, bh = W, ih * W / iw
+    tw, th = math.ceil(bw * max_scale), math.ceil(bh * max_scale)
+    if tw >= iw or th >= ih:
+        return iw, ih
+    return tw, th
+
+# --------------------------
+# LRU of decoded, downscaled images
+# --------------------------
+class ImageCache:
+    """
+    Decoded RGB images, downscaled to prepared_size(), kept in a memory-bounded
+    LRU keyed by (path, mtime, file size, target size). With `spill_dir`, images
+    pushed out of memory are saved there as .npy and loaded back on the next miss.
+    """
+
+    def __init__(self, max_bytes: int = IMAGE_CACHE_MAX_BYTES, spill_dir: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self._items: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, path: str, size: Tuple[int, int], max_scale: float = 1.0) -> np.ndarray:
+        st = os.stat(path)
+        with Image.open(path) as im:
+            iw, ih = im.size
+        target = prepared_size(iw, ih, size, max_scale)
+        key = (os.path.abspath(path), st.st_mtime_ns, st.st_size) + target
+
+        with self._lock:
+            arr = self._items.get(key)
+            if arr is not None:
+                self._items.move_to_end(key)
+                return arr
+
+        arr = self._load_spilled(key)
+        if arr is None:
+            arr = decode_image(path, target)
+        with self._lock:
+            if key not in self._items:
+                self._items[key] = arr
+                self._bytes += arr.nbytes
+                self._evict()
+        return arr
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and len(self._items) > 1:
+            key, arr = self._items.popitem(last=False)
+            self._bytes -= arr.nbytes
+            self._spill(key, arr)
+
+    def _spill_path(self, key: tuple) -> str:
+        return os.path.join(self.spill_dir, hashlib.sha1(repr(key).encode()).hexdigest() + ".npy")
+
+    def _spill(self, key: tuple, arr: np.ndarray):
+        if not self.spill_dir:
+            return
+        path = self._spill_path(key)
+        if not os.path.exists(path):
+            os.makedirs(self.spill_dir, exist_ok=True)
+            tmp = f"{path[:-4]}.{os.getpid()}.tmp.npy"
+            np.save(tmp, arr)
+            os.replace(tmp, path)
+
+    def _load_spilled(self, key: tuple) -> Optional[np.ndarray]:
+        if not self.spill_dir:
+            return None
+        try:
+            return np.load(self._spill_path(key))
+        except (OSError, ValueError):
+            return None
+
+def decode_image(path: str, target: Tuple[int, int]) -> np.ndarray:
+    """Decode to RGB at `target` size; JPEGs are decoded at a reduced DCT scale when possible."""
+    with Image.open(path) as im:
+        if im.size != target:
+            im.draft("RGB", target)   # no-op for non-JPEG
+        im = im.convert("RGB")
+        if im.size != target:
+            im = im.resize(target, Image.LANCZOS)
+        return np.asarray(im)
+
+_cache = ImageCache(spill_dir=IMAGE_CACHE_DIR if IMAGE_CACHE_SPILL else None)
+
+def prepared_image(path: str, size: Tuple[int, int], zoom_start: float = 1.0,
+                   zoom_end: float = 1.0, overscan: float = 1.0) -> np.ndarray:
+    """Image for ImageClip(): decoded once and no larger than size * zoom * overscan needs."""
+    return _cache.get(path, size, max(zoom_start, zoom_end, 1.0) * overscan)
@@ -1,6 +1,18 @@
-import argparse, os, random, math
+import argparse, os, random, math, shutil, tempfile
 from glob import glob
-from moviepy.editor import ImageClip, AudioFileClip, CompositeVideoClip, concatenate_videoclips
+from moviepy.editor import ImageClip, AudioFileClip, CompositeVideoClip
+import metrics
+import render_cache
+from image_cache import prepared_image
+from ffmpeg_progress import run_ffmpeg
+from media_probe import probe
+from music_library import is_copyable_aac
+from parallel_runner import run_jobs, resolve_workers, threads_per_job
+
+# Every segment is encoded with the same settings so the concat demuxer can
+# join them with -c copy (same codec, size, fps, pix_fmt, timebase).
+SEGMENT_PRESET = "medium"
+SEGMENT_PIX_FMT = "yuv420p"
 
 def cover_resize(clip, target_w, target_h):
     """Resize image to fully cover the target canvas (like CSS object-fit: cover)."""
@@ -20,7 +32,8 @@ def ken_burns_clip(img_path, duration, size=(1920,1080), zoom_start=1.05, zoom_e
     pan: "in", "out", "left", "right", "up", "down", or "auto"
     """
     W, H = size
-    base = ImageClip(img_path).convert("RGB")
+    # decoded once per image and pre-downscaled to what the zoom needs (repeated picks hit the cache)
+    base = ImageClip(prepared_image(img_path, size, zoom_start, zoom_end))
     base = cover_resize(base, W, H)  # start by covering the canvas at scale=1.0
 
     # choose a pan direction if auto
@@ -79,11 +92,11 @@ def ken_burns_clip(img_path, duration, size=(1920,1080), zoom_start=1.05, zoom_e
     # Composite into fixed canvas to guarantee exact 1920x1080 with cropping if needed
     return CompositeVideoClip([kb], size=size).set_duration(duration)
 
+@metrics.in_pipeline("build_video")
 def build_video(images, audio_path, out_path, per_image=10, size=(1920,1080),
-                zoom_start=1.05, zoom_end=1.15, fps=30):
+                zoom_start=1.05, zoom_end=1.15, fps=30, max_workers=0, use_cache=True):
     # Load audio to determine target duration
-    audio = AudioFileClip(audio_path)
-    audio_duration = audio.duration
+    audio_duration = audio_length(audio_path)
 
     # How many images are needed?
     needed = math.ceil(audio_duration / per_image)
@@ -95,30 +108,124 @@ def build_video(images, audio_path, out_path, per_image=10, size=(1920,1080),
     random.shuffle(imgs)
     picks = (imgs * ((needed // len(imgs)) + 1))[:needed]
 
-    # Create clips
-    clips = []
+    render_timeline(picks, audio_path, audio_duration, out_path, per_image=per_image, size=size,
+                    zoom_start=zoom_start, zoom_end=zoom_end, fps=fps, max_workers=max_workers,
+                    use_cache=use_cache)
+
+def audio_length(audio_path):
+    duration = probe(audio_path).get("duration")
+    if duration:
+        return duration
+    audio = AudioFileClip(audio_path)
+    try:
+        return audio.duration
+    finally:
+        audio.close()
+
+# --------------------------
+# Segment-parallel rendering
+# --------------------------
+def render_timeline(picks, audio_path, audio_duration, out_path, per_image=10, size=(1920,1080),
+                    zoom_start=1.05, zoom_end=1.15, fps=30, max_workers=0, use_cache=True):
+    """
+    Render every pick as its own segment in a process pool, then join the segments
+    with the concat demuxer (stream copy) and mux the audio in one last ffmpeg run.
+    The last segment is only rendered as long as the audio still needs.
+
+    Segments are content-addressed (image digest, duration, size, zoom, pan, fps):
+    picks repeated to fill a long song render once and appear several times in the
+    concat list, and with use_cache segments from earlier runs come from the render cache.
+    """
+    max_workers = resolve_workers(max_workers)
+    threads = threads_per_job(max_workers) or 4
     pan_cycle = ["left", "right", "up", "down", "in", "out"]
-    for idx, img in enumerate(picks):
-        pan = pan_cycle[idx % len(pan_cycle)]
-        clip = ken_burns_clip(img, duration=per_image, size=size,
-                              zoom_start=zoom_start, zoom_end=zoom_end, pan=pan)
-        clips.append(clip)
-
-    video = concatenate_videoclips(clips, method="compose")
-
-    # Set audio and trim video to match audio duration exactly
-    video = video.set_audio(audio).set_duration(audio_duration)
-
-    # Render
-    video.write_videofile(
-        out_path,
-        fps=fps,
-        codec="libx264",
-        audio_codec="aac",
-        threads=4,
-        temp_audiofile="__temp_audio.m4a",
-        remove_temp=True
-    )
+
+    out_dir = os.path.dirname(os.path.abspath(out_path))
+    os.makedirs(out_dir, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix=".segments_", dir=out_dir)
+    try:
+        jobs, timeline, segments = [], [], {}   # segments: key -> file in work_dir
+        reused = 0
+        with metrics.stage("plan"):
+            for idx, img in enumerate(picks):
+                # the last segment keeps the full per_image motion but is cut where the audio ends
+                length = min(per_image, audio_duration - idx * per_image)
+                if length < 1.0 / fps:
+                    break
+                kwargs = dict(duration=per_image, length=round(length, 3), size=tuple(size),
+                              zoom_start=zoom_start, zoom_end=zoom_end,
+                              pan=pan_cycle[idx % len(pan_cycle)], fps=fps)
+                key = render_cache.cache_key("slideshow_segment", img, dict(
+                    kwargs, size=list(size), preset=SEGMENT_PRESET, pix_fmt=SEGMENT_PIX_FMT
+                ))
+                seg = segments.get(key)
+                if seg is None:
+                    seg = os.path.join(work_dir, f"seg_{len(segments):04d}.mp4")
+                    segments[key] = seg
+                    if use_cache and render_cache.fetch(key, seg):
+                        reused += 1
+                    else:
+                        jobs.append({"name": f"{idx:04d} {os.path.basename(img)}", "key": key, "kwargs": dict(
+                            kwargs, img_path=img, out_path=seg, threads=threads
+                        )})
+                timeline.append(seg)
+
+        print(f"🎞️ {len(timeline)} timeline entries, {len(segments)} distinct segments "
+              f"({reused} from cache, {len(jobs)} to render)")
+        with metrics.stage("encode"):
+            results = run_jobs(jobs, render_segment, max_workers=max_workers, use_processes=True)
+        failed = [r for r in results if not r["ok"]]
+        if failed:
+            raise RuntimeError(f"{len(failed)} segment(s) failed, first: {failed[0]['name']}: {failed[0]['error']}")
+        if use_cache:
+            for job in jobs:
+                render_cache.store(job["key"], job["kwargs"]["out_path"])
+
+        list_path = os.path.join(work_dir, "segments.txt")
+        with open(list_path, "w", encoding="utf-8") as f:
+            for seg in timeline:
+                safe_p = os.path.abspath(seg).replace("'", r"'\''")
+                f.write(f"file '{safe_p}'\n")
+
+        audio_args = ['-c:a', 'copy'] if is_copyable_aac(audio_path) else ['-c:a', 'aac', '-b:a', '192k']
+        cmd = [
+            'ffmpeg', '-y',
+            '-f', 'concat', '-safe', '0', '-i', list_path,
+            '-i', audio_path,
+            '-map', '0:v:0', '-map', '1:a:0',
+            '-c:v', 'copy',
+        ] + audio_args + [
+            '-t', f"{audio_duration:.3f}",
+            '-movflags', '+faststart',
+            out_path
+        ]
+        run_ffmpeg(cmd, duration=audio_duration, label=os.path.basename(out_path), stage="mux")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print(f"✅ Slideshow written: {out_path} ({len(timeline)} segments)")
+    return out_path
+
+@metrics.in_pipeline("create_slideshow")
+def render_segment(img_path, out_path, duration, size, zoom_start, zoom_end, pan, fps,
+                   length=None, threads=None):
+    """One Ken Burns segment in the shared segment profile (runs in a worker process)."""
+    clip = ken_burns_clip(img_path, duration, size=size, zoom_start=zoom_start, zoom_end=zoom_end, pan=pan)
+    if length and length < duration:
+        clip = clip.set_duration(length)
+    try:
+        clip.write_videofile(
+            out_path,
+            fps=fps,
+            codec="libx264",
+            audio=False,
+            preset=SEGMENT_PRESET,
+            threads=threads,
+            ffmpeg_params=['-pix_fmt', SEGMENT_PIX_FMT, '-video_track_timescale', str(fps * 1000)],
+            logger=None
+        )
+    finally:
+        clip.close()
+    return out_path
 
 # Example usage with parameters instead of argparse
 # if __name__ == "__main__":
@@ -166,9 +273,14 @@ def build_video(images, audio_path, out_path, per_image=10, size=(1920,1080),
 # if __name__ == "__main__":
 #     main()
 
+@metrics.in_pipeline("create_slideshow")
 def create_slideshow(input_folder, audio_folder, output_path,
                      output_size=(1920,1080), per_image=10,
-                     zoom_start=1.05, zoom_end=1.15, fps=30):
+                     zoom_start=1.05, zoom_end=1.15, fps=30, max_workers=0, use_cache=True):
+    """
+    max_workers: segments rendered at the same time in separate processes (0/None = one per core).
+    use_cache: reuse Ken Burns segments rendered by earlier runs (see render_timeline).
+    """
 
     # collect images
     exts = ("*.jpg","*.jpeg","*.png","*.webp")
@@ -188,34 +300,16 @@ def create_slideshow(input_folder, audio_folder, output_path,
     audio_path = audio_files[0]   # pick first audio file
 
     # load audio
-    audio = AudioFileClip(audio_path)
-    audio_duration = audio.duration
+    audio_duration = audio_length(audio_path)
 
     # determine how many images needed
     needed = math.ceil(audio_duration / per_image)
     random.shuffle(images)
     picks = (images * ((needed // len(images)) + 1))[:needed]
 
-    # build clips
-    clips = []
-    pan_cycle = ["left","right","up","down","in","out"]
-    for idx, img in enumerate(picks):
-        pan = pan_cycle[idx % len(pan_cycle)]
-        clips.append(
-            ken_burns_clip(img, per_image, size=output_size,
-                           zoom_start=zoom_start, zoom_end=zoom_end, pan=pan)
-        )
-
-    video = concatenate_videoclips(clips, method="compose")
-    video = video.set_audio(audio).set_duration(audio_duration)
-
-    video.write_videofile(
-        output_path,
-        fps=fps,
-        codec="libx264",
-        audio_codec="aac",
-        threads=4
-    )
+    render_timeline(picks, audio_path, audio_duration, output_path, per_image=per_image,
+                    size=output_size, zoom_start=zoom_start, zoom_end=zoom_end, fps=fps,
+                    max_workers=max_workers, use_cache=use_cache)
 
 if __name__ == "__main__":
     create_slideshow(
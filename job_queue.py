@@ -0,0 +1,171 @@
+# job_queue.py
+import queue, threading, time, traceback, uuid
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import metrics
+from ffmpeg_progress import progress_listener
+
+JOBS_SUBMITTED = metrics.Counter("video_jobs_submitted_total", "Jobs accepted by the queue.", ("kind",))
+JOBS_REJECTED = metrics.Counter("video_jobs_rejected_total", "Jobs refused because the queue was full.", ("kind",))
+JOBS_FINISHED = metrics.Counter("video_jobs_finished_total", "Jobs finished, by final state.", ("kind", "state"))
+JOB_WAIT_SECONDS = metrics.Histogram("video_job_wait_seconds", "Time jobs spent queued.",
+                                     metrics.SECONDS_BUCKETS, ("kind",))
+JOB_RUN_SECONDS = metrics.Histogram("video_job_run_seconds", "Time jobs spent running.",
+                                    metrics.SECONDS_BUCKETS, ("kind",))
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit when max_depth jobs are already waiting."""
+
+# --------------------------
+# In-process job queue
+# --------------------------
+class JobQueue:
+    """
+    Small submit-and-poll queue for the Flask endpoints.
+
+    submit() returns a job id straight away; `workers` background threads run
+    the jobs in FIFO order and record state, timings and output paths that
+    get() hands back to /jobs/<id>. At most `max_depth` jobs may be waiting.
+    """
+
+    def __init__(self, workers: int = 1, max_depth: int = 16, keep_finished: int = 200):
+        self.max_depth = max_depth
+        self.keep_finished = keep_finished
+        self._queue = queue.Queue(maxsize=max_depth)
+        self._jobs: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._threads = []
+        for i in range(max(1, workers)):
+            t = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, kind: str, func: Callable, kwargs: Optional[Dict] = None) -> str:
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            "id": job_id,
+            "kind": kind,
+            "state": "queued",
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "outputs": [],
+            "errors": [],
+            "error": None,
+            "progress": {},     # ffmpeg progress per output, see ffmpeg_progress.snapshot
+            "version": 0,       # bumped on every change, for /jobs/<id>/events
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._trim()
+        try:
+            self._queue.put_nowait((job_id, func, kwargs or {}))
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job_id, None)
+            JOBS_REJECTED.inc(kind=kind)
+            raise QueueFull(f"{self.max_depth} jobs already waiting")
+        JOBS_SUBMITTED.inc(kind=kind)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return _snapshot(job) if job else None
+
+    def wait_for_change(self, job_id: str, version: int, timeout: float = 15.0) -> Optional[Dict]:
+        """Block until the job's version differs from `version` (or timeout); return a snapshot."""
+        with self._changed:
+            self._changed.wait_for(
+                lambda: self._jobs.get(job_id, {}).get("version", version) != version,
+                timeout=timeout
+            )
+            job = self._jobs.get(job_id)
+            return _snapshot(job) if job else None
+
+    def list(self) -> List[Dict]:
+        with self._lock:
+            return [_snapshot(j) for j in self._jobs.values()]
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                job.update(fields)
+                job["version"] += 1
+                self._changed.notify_all()
+
+    def _progress(self, job_id: str, record: Dict):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                job["progress"][record["label"]] = record
+                job["version"] += 1
+                self._changed.notify_all()
+
+    def _trim(self):
+        """Forget the oldest finished jobs once more than keep_finished are stored."""
+        finished = [k for k, j in self._jobs.items() if j["state"] in ("done", "failed")]
+        for k in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[k]
+
+    def _worker(self):
+        while True:
+            job_id, func, kwargs = self._queue.get()
+            self._update(job_id, state="running", started_at=time.time())
+            fields = {}
+            try:
+                with progress_listener(lambda record: self._progress(job_id, record)):
+                    result = func(**kwargs)
+                outputs, errors = collect_outputs(result)
+                fields = dict(state="failed" if errors and not outputs else "done",
+                              outputs=outputs, errors=errors)
+            except Exception as e:
+                traceback.print_exc()
+                fields = dict(state="failed", error=str(e))
+            finally:
+                self._update(job_id, finished_at=time.time(), **fields)
+                self._queue.task_done()
+                job = self.get(job_id)
+                if job:
+                    JOBS_FINISHED.inc(kind=job["kind"], state=job["state"])
+                    JOB_WAIT_SECONDS.observe(job["wait_seconds"], kind=job["kind"])
+                    JOB_RUN_SECONDS.observe(job["run_seconds"] or 0.0, kind=job["kind"])
+
+# --------------------------
+# Helpers
+# --------------------------
+def collect_outputs(result):
+    """
+    Normalize what the pipeline functions return into (outputs, errors):
+    a path, a list of paths, or the per-file result dicts from parallel_runner.run_jobs.
+    Also used by work_queue for jobs run from the SQLite queue.
+    """
+    outputs, errors = [], []
+    if result is None:
+        return outputs, errors
+    if isinstance(result, str):
+        return [result], errors
+    for r in result:
+        if isinstance(r, dict):
+            if r.get("ok"):
+                outputs.append(r.get("result"))
+            else:
+                errors.append({"name": r.get("name"), "error": r.get("error")})
+        else:
+            outputs.append(r)
+    return outputs, errors
+
+def _snapshot(job: Dict) -> Dict:
+    j = dict(job)
+    j["progress"] = dict(job["progress"])
+    now = time.time()
+    started, finished = j["started_at"], j["finished_at"]
+    j["wait_seconds"] = round((started or now) - j["submitted_at"], 3)
+    j["run_seconds"] = round((finished or now) - started, 3) if started else None
+    return j
@@ -1,7 +1,14 @@
 # make_kb_videos.py
-import os, random
+import os, random, math
 from glob import glob
 from moviepy.editor import ImageClip, CompositeVideoClip
+from media_probe import probe
+import metrics
+import render_cache
+from image_cache import prepared_image
+from ffmpeg_progress import run_ffmpeg
+from parallel_runner import run_jobs, resolve_workers, threads_per_job
+from proxy_preview import PREVIEW_FPS, PREVIEW_SECONDS, preview_duration, proxy_size
 
 def cover_resize(clip, target_w, target_h):
     """Resize image to fully cover the target canvas (like CSS object-fit: cover)."""
@@ -24,7 +31,7 @@ def ken_burns_clip(img_path, duration, size=(1920,1080),
     from moviepy.editor import ImageClip, CompositeVideoClip
 
     W, H = size
-    base = ImageClip(img_path)
+    base = ImageClip(prepared_image(img_path, size, zoom_start, zoom_end, overscan))
     # Resize once to COVER the canvas; at scale=1 we already fill the frame
     def cover_resize(clip, target_w, target_h):
         iw, ih = clip.size
@@ -137,12 +144,98 @@ def ken_burns_clip_DND(img_path, duration, size=(1920,1080),
 
     return CompositeVideoClip([kb], size=size).set_duration(duration)
 
+def ken_burns_ffmpeg(img_path, out_path, duration, size=(1920,1080),
+                     zoom_start=1.05, zoom_end=1.15, pan="auto",
+                     overscan=1.01, fps=30, supersample=2,
+                     preset="veryfast", threads=None):
+    """
+    Same motion as ken_burns_clip (incl. overscan and the per-frame overflow that
+    never reveals borders), rendered by one ffmpeg process with scale/pad/zoompan
+    instead of resampling the image in Python for every frame.
+
+    The image is cover-resized like cover_resize(), padded to the output aspect
+    (the pad is never inside the visible window) and zoompan picks the window.
+    `supersample` renders zoompan on a k-times larger image so its integer
+    x/y steps become sub-pixel and the motion doesn't jitter.
+    """
+    W, H = size
+    with metrics.stage("probe"):
+        info = probe(img_path)
+    iw, ih = info.get("width"), info.get("height")
+    if not iw or not ih:
+        raise RuntimeError(f"Could not read image size: {img_path}")
+
+    # cover_resize(): match height if the image is wider than the canvas, else width
+    if iw / ih >= W / H:
+        bw, bh = int(iw * H / ih), H
+    else:
+        bw, bh = W, int(ih * W / iw)
+    # pad to the canvas aspect so zoompan's window (iw/zoom x ih/zoom) is W:H
+    if bw / bh >= W / H:
+        pw, ph = bw, math.ceil(bw * H / W)
+    else:
+        pw, ph = math.ceil(bh * W / H), bh
+
+    if pan == "auto":
+        pan = random.choice(["left", "right", "up", "down", "in", "out"])
+    z0, z1 = (zoom_start, zoom_end)
+    if pan == "out":
+        z0, z1 = zoom_end, zoom_start
+
+    frames = int(round(duration * fps))
+    k = max(1, int(supersample))
+    p = f"(on/{fps}/{duration})"                          # t / duration
+    s = f"(({z0})+({z1}-({z0}))*{p})*{overscan}"          # scale_at(t)
+    # fraction of the current overflow used at t, per pan (see pos_at in ken_burns_clip)
+    fx, fy = {
+        "left":  (p, "0"),
+        "right": (f"(1-{p})", "0"),
+        "up":    ("0", p),
+        "down":  ("0", f"(1-{p})"),
+        "in":    (f"0.6*{p}", f"0.6*{p}"),
+        "out":   (f"0.6*(1-{p})", f"0.6*(1-{p})"),
+    }.get(pan, ("0", "0"))
+    # MoviePy places the scaled image at -overflow*f; in base-image pixels that's overflow*f/s
+    x = f"{k}*max(0,{bw}*{s}-{W})*{fx}/({s})"
+    y = f"{k}*max(0,{bh}*{s}-{H})*{fy}/({s})"
+    z = f"{pw}*{s}/{W}"
+
+    vf = (
+        f"scale={bw * k}:{bh * k}:flags=lanczos,"
+        f"pad={pw * k}:{ph * k}:0:0,"
+        f"zoompan=z='{z}':x='{x}':y='{y}':d={frames}:s={W}x{H}:fps={fps},"
+        f"setsar=1,format=yuv420p"
+    )
+    cmd = [
+        'ffmpeg', '-y', '-i', img_path,
+        '-vf', vf,
+        '-frames:v', str(frames),
+        '-c:v', 'libx264', '-preset', preset,
+        '-an',
+    ]
+    if threads:
+        cmd += ['-threads', str(threads)]
+    cmd += [out_path]
+    run_ffmpeg(cmd, duration=duration, label=os.path.basename(out_path))
+    return out_path
+
+@metrics.in_pipeline("export_kb_videos")
 def export_kb_videos(input_folder, out_folder,
                      per_image=10, output_size=(1920,1080),
-                     zoom_start=1.05, zoom_end=1.15, fps=30):
+                     zoom_start=1.05, zoom_end=1.15, fps=30,
+                     backend="moviepy", max_workers=1, use_cache=True,
+                     preview=False, preview_seconds=PREVIEW_SECONDS, overscan=1.01):
+    """
+    backend: "moviepy" (ken_burns_clip) or "ffmpeg" (ken_burns_ffmpeg, much faster).
+    overscan: extra scale on top of the zoom so rounding never shows a 1px border.
+    max_workers: images rendered at the same time in separate processes (0/None = one per core).
+    use_cache: reuse clips already rendered from the same image with the same settings.
+    preview: fast 360p/15 fps proxies of the first preview_seconds; images are kept.
+    """
     os.makedirs(out_folder, exist_ok=True)
 
-    clear_folder(out_folder)
+    with metrics.stage("cleanup"):
+        clear_folder(out_folder)
 
     exts = ("*.jpg","*.jpeg","*.png","*.webp")
     images = []
@@ -155,7 +248,20 @@ def export_kb_videos(input_folder, out_folder,
     #pan_cycle = ["left", "right", "up", "down", "in", "out"]
 
     pan_cycle = [ "left", "right", "up", "down" ]  # removed in/out for subtlety
+
+    max_workers = resolve_workers(max_workers)
+    threads = threads_per_job(max_workers) or 4
+
+    preset, consume = "veryfast", True
+    if preview:
+        per_image = preview_duration(per_image, preview_seconds)
+        output_size = proxy_size(*output_size)
+        fps = min(fps, PREVIEW_FPS)
+        preset, consume, use_cache = "ultrafast", False, False
+
+    jobs = []
     for idx, img in enumerate(sorted(images)):
+        # pan is fixed by the sorted index, so the result doesn't depend on scheduling
         pan = pan_cycle[idx % len(pan_cycle)]
         base = os.path.splitext(os.path.basename(img))[0]
         #DND
@@ -165,18 +271,56 @@ def export_kb_videos(input_folder, out_folder,
             print(f"Skipping (exists): {out_path}")
             continue
 
+        jobs.append({"name": os.path.basename(img), "kwargs": dict(
+            img=img, out_path=out_path, pan=pan, backend=backend,
+            per_image=per_image, output_size=output_size,
+            zoom_start=zoom_start, zoom_end=zoom_end, fps=fps, threads=threads,
+            use_cache=use_cache, preset=preset, consume=consume, overscan=overscan
+        )})
+
+    return run_jobs(jobs, _render_kb_image, max_workers=max_workers, use_processes=True)
+
+@metrics.in_pipeline("export_kb_videos")
+def _render_kb_image(img, out_path, pan, backend, per_image, output_size,
+                     zoom_start, zoom_end, fps, threads, use_cache=True,
+                     preset="veryfast", consume=True, overscan=1.01):
+    """Render one image's clip; with `consume` the source image is removed once its clip was written."""
+    key = None
+    if use_cache:
+        # everything that changes the pixels: motion, overscan and the encoder preset
+        key = render_cache.cache_key("ken_burns", img, dict(
+            backend=backend, duration=per_image, size=list(output_size),
+            zoom_start=zoom_start, zoom_end=zoom_end, pan=pan, fps=fps,
+            overscan=overscan, preset=preset
+        ))
+    hit = bool(key) and render_cache.fetch(key, out_path)
+    if hit:
+        print(f"♻️ Reused cached clip: {os.path.basename(out_path)}")
+    elif backend == "ffmpeg":
+        ken_burns_ffmpeg(img, out_path, duration=per_image, size=output_size,
+                         zoom_start=zoom_start, zoom_end=zoom_end, pan=pan, fps=fps,
+                         overscan=overscan, preset=preset, threads=threads)
+    else:
         clip = ken_burns_clip(img, duration=per_image, size=output_size,
-                              zoom_start=zoom_start, zoom_end=zoom_end, pan=pan)
-        clip.write_videofile(
-            out_path,
-            fps=fps,
-            codec="libx264",
-            audio=False,
-            threads=4,
-            preset="veryfast"
-        )
-        clip.close()
-        os.remove(img)
+                              zoom_start=zoom_start, zoom_end=zoom_end, pan=pan, overscan=overscan)
+        try:
+            with metrics.stage("encode"):
+                clip.write_videofile(
+                    out_path,
+                    fps=fps,
+                    codec="libx264",
+                    audio=False,
+                    threads=threads,
+                    preset=preset
+                )
+        finally:
+            clip.close()
+    if key and not hit:
+        render_cache.store(key, out_path)
+    if consume:
+        with metrics.stage("cleanup"):
+            os.remove(img)
+    return out_path
 
 def clear_folder(folder_path, extensions=None):
     if not os.path.exists(folder_path):
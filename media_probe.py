@@ -0,0 +1,235 @@
+# media_probe.py
+import os, json, hashlib, shutil, subprocess, tempfile, threading
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:   # Windows: only the in-process lock applies
+    fcntl = None
+
+CACHE_DIR = os.environ.get("VIDEO_EDITOR_CACHE", ".cache")
+PROBE_CACHE_PATH = os.path.join(CACHE_DIR, "probe_cache.json")
+
+# Packets read to estimate the keyframe interval (seconds from the start of the file)
+KEYFRAME_SCAN_SECONDS = 10
+
+_lock = threading.RLock()
+_cache: Optional[Dict] = None
+
+# --------------------------
+# Binary discovery (memoized)
+# --------------------------
+@lru_cache(maxsize=None)
+def find_binary(name: str) -> Optional[str]:
+    """Resolve and sanity-check a binary once per process; None if unusable."""
+    path = shutil.which(name)
+    if not path:
+        return None
+    try:
+        subprocess.run([path, "-version"], capture_output=True, check=True)
+        return path
+    except Exception:
+        return None
+
+def has_binary(name: str) -> bool:
+    return find_binary(name) is not None
+
+# --------------------------
+# Probe
+# --------------------------
+def probe(path: str) -> Dict:
+    """
+    Return everything the pipelines need about a media file from a single ffprobe run:
+    {duration, format_name, size_bytes, codec_name, width, height, avg_frame_rate, fps,
+     pix_fmt, profile, time_base, audio_streams: [{codec_name, sample_rate, channels}], keyframe_interval}
+
+    Results are cached on disk keyed by (path, size, mtime), so a file is probed once
+    until it changes; temp files aren't cached and deleted files are pruned.
+    Returns {} when the file can't be probed.
+    """
+    path = os.path.abspath(path)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return {}
+
+    entry = _fresh_entry(path, st)
+    if entry.get("info"):
+        return dict(entry["info"])
+
+    info = _run_ffprobe(path)
+    if info:
+        with _lock:
+            _store(path, dict(_fresh_entry(path, st), info=info))
+    return dict(info)
+
+def file_digest(path: str) -> str:
+    """sha256 of the file contents, cached next to the probe data (same size/mtime key)."""
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    entry = _fresh_entry(path, st)
+    if entry.get("sha256"):
+        return entry["sha256"]
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    with _lock:
+        _store(path, dict(_fresh_entry(path, st), sha256=digest))
+    return digest
+
+def _fresh_entry(path: str, st) -> Dict:
+    """Cached entry for `path` if it still matches size/mtime, else a new empty one."""
+    with _lock:
+        entry = _load_cache().get(path)
+    if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+        return entry
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+def parse_rate(rate: Optional[str]) -> float:
+    """'30000/1001' / '29.97' -> float; 0.0 when unknown."""
+    if not rate:
+        return 0.0
+    try:
+        if "/" in rate:
+            n, d = rate.split("/")
+            return float(n) / float(d) if float(d) != 0 else 0.0
+        return float(rate)
+    except Exception:
+        return 0.0
+
+def _run_ffprobe(path: str) -> Dict:
+    if not has_binary("ffprobe"):
+        return {}
+    try:
+        out = subprocess.check_output([
+            find_binary("ffprobe"), "-v", "error",
+            "-show_format", "-show_streams",
+            "-show_entries", "packet=stream_index,pts_time,flags",
+            "-read_intervals", f"%+{KEYFRAME_SCAN_SECONDS}",
+            "-of", "json",
+            path
+        ], universal_newlines=True)
+        data = json.loads(out)
+    except Exception:
+        return {}
+
+    fmt = data.get("format", {})
+    streams = data.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), {})
+    audio = [s for s in streams if s.get("codec_type") == "audio"]
+
+    duration = _to_float(fmt.get("duration")) or _to_float(video.get("duration"))
+    return {
+        "duration": duration,
+        "format_name": fmt.get("format_name"),
+        "size_bytes": int(fmt.get("size", 0) or 0),
+        "start_time": _to_float(fmt.get("start_time")),
+        "codec_name": video.get("codec_name"),
+        "width": video.get("width"),
+        "height": video.get("height"),
+        "avg_frame_rate": video.get("avg_frame_rate"),
+        "fps": parse_rate(video.get("avg_frame_rate")),
+        "pix_fmt": video.get("pix_fmt"),
+        "profile": video.get("profile"),
+        "time_base": video.get("time_base"),
+        "audio_streams": [
+            {
+                "codec_name": a.get("codec_name"),
+                "sample_rate": int(a.get("sample_rate", 0) or 0),
+                "channels": a.get("channels"),
+            }
+            for a in audio
+        ],
+        "keyframe_interval": _keyframe_interval(data.get("packets", []), video.get("index")),
+    }
+
+def _keyframe_interval(packets: List[Dict], video_index) -> Optional[float]:
+    """Mean distance in seconds between keyframes seen in the scanned packets."""
+    if video_index is None:
+        return None
+    times = sorted(
+        _to_float(p.get("pts_time"))
+        for p in packets
+        if p.get("stream_index") == video_index and "K" in (p.get("flags") or "")
+        and p.get("pts_time") not in (None, "N/A")
+    )
+    if len(times) < 2:
+        return None
+    return round((times[-1] - times[0]) / (len(times) - 1), 3)
+
+def _to_float(v) -> float:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return 0.0
+
+# --------------------------
+# On-disk cache
+# --------------------------
+def _load_cache() -> Dict:
+    global _cache
+    if _cache is None:
+        _cache = _read_cache_file()
+    return _cache
+
+def _read_cache_file() -> Dict:
+    try:
+        with open(PROBE_CACHE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def _store(path: str, entry: Dict):
+    """
+    Merge with whatever other processes wrote meanwhile, then replace the file
+    atomically. The read-merge-write runs under an exclusive lock on a side
+    file, so two processes storing at once can't drop each other's entries.
+    """
+    if _is_transient(path):
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with file_lock(PROBE_CACHE_PATH + ".lock"):
+        cache = _load_cache()
+        cache.update(_read_cache_file())
+        old = cache.get(path)
+        if old and old["size"] == entry["size"] and old["mtime_ns"] == entry["mtime_ns"]:
+            entry = dict(old, **entry)   # keep the info/sha256 another process added
+        cache[path] = entry
+        # inputs are consumed and outputs cleared all the time: drop what is gone
+        for gone in [p for p in cache if not os.path.exists(p)]:
+            del cache[gone]
+        fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, prefix=".probe_cache_", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(cache, f)
+            os.replace(tmp, PROBE_CACHE_PATH)
+        except BaseException:
+            try: os.remove(tmp)
+            except OSError: pass
+            raise
+
+def _is_transient(path: str) -> bool:
+    """
+    Temp files that are renamed or deleted right after being probed: partial
+    renders and mkstemp names (hidden), and anything inside a *.tmp folder.
+    """
+    folder, name = os.path.split(path)
+    return name.startswith(".") or any(part.endswith(".tmp") for part in folder.split(os.sep))
+
+@contextmanager
+def file_lock(lock_path: str):
+    """Exclusive flock on `lock_path`, for caches shared between processes (no-op without fcntl)."""
+    if fcntl is None:
+        yield
+        return
+    with open(lock_path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,248 @@
+# metrics.py
+import contextvars, functools, os, threading, time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+# --------------------------
+# Minimal Prometheus-style registry (text exposition format 0.0.4)
+# --------------------------
+_registry = []
+_lock = threading.Lock()
+
+def _fmt_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values: Dict[Tuple, float] = {}
+        _registry.append(self)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for key, v in sorted(self._values.items()):
+            yield f"{self.name}{_fmt_labels(self.labels, key)} {v}"
+
+class Gauge:
+    """Gauge read from a callback at scrape time."""
+    def __init__(self, name: str, help: str, read: Callable[[], float]):
+        self.name, self.help, self.read = name, help, read
+        _registry.append(self)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        try:
+            yield f"{self.name} {float(self.read())}"
+        except Exception:
+            pass
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...], labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple, list] = {}   # key -> [bucket counts..., sum, count]
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with _lock:
+            v = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    v[i] += 1
+            v[-2] += value
+            v[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for key, v in sorted(self._values.items()):
+            for i, b in enumerate(self.buckets):
+                le = 'le="%s"' % b
+                yield f"{self.name}_bucket{_fmt_labels(self.labels, key, le)} {v[i]}"
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_fmt_labels(self.labels, key, le)} {v[-1]}"
+            yield f"{self.name}_sum{_fmt_labels(self.labels, key)} {v[-2]}"
+            yield f"{self.name}_count{_fmt_labels(self.labels, key)} {v[-1]}"
+
+def render() -> str:
+    lines = []
+    for m in _registry:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+# --------------------------
+# Shipping values out of worker processes
+# --------------------------
+# Process-pool workers record into their own copy of the registry. They send
+# diff(before, collect()) back with each result and the parent merge()s it.
+
+def collect() -> Dict[str, Dict]:
+    """Raw values of every Counter/Histogram: {name: {label key: value or [buckets..., sum, count]}}."""
+    with _lock:
+        return {
+            m.name: {k: (list(v) if isinstance(v, list) else v) for k, v in m._values.items()}
+            for m in _registry if hasattr(m, "_values")
+        }
+
+def diff(before: Dict[str, Dict], after: Dict[str, Dict]) -> Dict[str, Dict]:
+    delta = {}
+    for name, values in after.items():
+        old = before.get(name, {})
+        for key, v in values.items():
+            if isinstance(v, list):
+                prev = old.get(key) or [0] * len(v)
+                d = [a - b for a, b in zip(v, prev)]
+                changed = d[-1] != 0
+            else:
+                d = v - old.get(key, 0.0)
+                changed = d != 0
+            if changed:
+                delta.setdefault(name, {})[key] = d
+    return delta
+
+def merge(delta: Dict[str, Dict]):
+    """Add a worker's diff() to this process's metrics."""
+    by_name = {m.name: m for m in _registry if hasattr(m, "_values")}
+    with _lock:
+        for name, values in delta.items():
+            m = by_name.get(name)
+            if m is None:
+                continue
+            for key, v in values.items():
+                if isinstance(v, list):
+                    cur = m._values.setdefault(key, [0] * len(v))
+                    for i, x in enumerate(v):
+                        cur[i] += x
+                else:
+                    m._values[key] = m._values.get(key, 0.0) + v
+
+# --------------------------
+# Pipeline metrics
+# --------------------------
+SECONDS_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+BYTES_BUCKETS = tuple(2 ** p for p in range(24, 34))   # 16 MiB .. 8 GiB
+
+STAGE_SECONDS = Histogram("video_stage_seconds", "Wall time per pipeline stage.",
+                          SECONDS_BUCKETS, ("pipeline", "stage"))
+STAGE_ERRORS = Counter("video_stage_errors_total", "Pipeline stages that raised.", ("pipeline", "stage"))
+FFMPEG_RUNS = Counter("ffmpeg_runs_total", "ffmpeg processes run.", ("pipeline", "stage", "status"))
+FFMPEG_CPU = Counter("ffmpeg_cpu_seconds_total", "User+system CPU time of ffmpeg children.",
+                     ("pipeline", "stage"))
+FFMPEG_IO = Counter("ffmpeg_io_bytes_total", "Bytes read/written by ffmpeg children.",
+                    ("pipeline", "direction"))
+FFMPEG_PEAK_RSS = Histogram("ffmpeg_peak_rss_bytes", "Peak RSS (VmHWM) per ffmpeg child.",
+                            BYTES_BUCKETS, ("pipeline", "stage"))
+
+_pipeline: contextvars.ContextVar = contextvars.ContextVar("metrics_pipeline", default="other")
+
+@contextmanager
+def pipeline(name: str):
+    """Attribute stages and ffmpeg runs inside the block to pipeline `name`."""
+    token = _pipeline.set(name)
+    try:
+        yield
+    finally:
+        _pipeline.reset(token)
+
+def in_pipeline(name: str):
+    """Decorator form of pipeline()."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with pipeline(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@contextmanager
+def stage(name: str):
+    """Time a stage (probe, plan, filter_build, encode, mux, cleanup) of the current pipeline."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(pipeline=_pipeline.get(), stage=name)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, pipeline=_pipeline.get(), stage=name)
+
+def record_stage(name: str, seconds: float):
+    """For stages that aren't a single block, e.g. filter building spread over a function."""
+    STAGE_SECONDS.observe(seconds, pipeline=_pipeline.get(), stage=name)
+
+def current_pipeline() -> str:
+    return _pipeline.get()
+
+# --------------------------
+# ffmpeg child sampling from /proc
+# --------------------------
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+class ProcSampler:
+    """
+    Polls /proc/<pid> of a running child every `interval` seconds and keeps the
+    last CPU time, peak RSS and I/O byte counts seen before it exits.
+    No-op where /proc isn't available.
+    """
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        self.pid, self.interval = pid, interval
+        self.sample = {"cpu_seconds": 0.0, "peak_rss_bytes": 0, "read_bytes": 0, "write_bytes": 0}
+        self._stop = threading.Event()
+        self._thread = None
+        if os.path.isdir(f"/proc/{pid}"):
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._read()
+            self._stop.wait(self.interval)
+
+    def _read(self):
+        base = f"/proc/{self.pid}"
+        try:
+            with open(f"{base}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            # utime/stime are fields 14/15 of stat, i.e. 11/12 after "(comm) state"
+            self.sample["cpu_seconds"] = (int(fields[11]) + int(fields[12])) / _CLK_TCK
+            with open(f"{base}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        self.sample["peak_rss_bytes"] = int(line.split()[1]) * 1024
+            with open(f"{base}/io") as f:
+                io = dict(line.split(":") for line in f if ":" in line)
+            self.sample["read_bytes"] = int(io.get("rchar", 0))
+            self.sample["write_bytes"] = int(io.get("wchar", 0))
+        except (OSError, ValueError, IndexError):
+            pass
+
+    def stop(self) -> Dict:
+        """Take a last sample (call before wait() reaps the child) and stop polling."""
+        if self._thread:
+            self._read()
+            self._stop.set()
+            self._thread.join()
+        return dict(self.sample)
+
+def record_ffmpeg(stage_name: str, seconds: float, returncode: int, sample: Optional[Dict]):
+    name = _pipeline.get()
+    STAGE_SECONDS.observe(seconds, pipeline=name, stage=stage_name)
+    FFMPEG_RUNS.inc(pipeline=name, stage=stage_name, status="ok" if returncode == 0 else "failed")
+    if sample:
+        FFMPEG_CPU.inc(sample["cpu_seconds"], pipeline=name, stage=stage_name)
+        FFMPEG_IO.inc(sample["read_bytes"], pipeline=name, direction="read")
+        FFMPEG_IO.inc(sample["write_bytes"], pipeline=name, direction="write")
+        if sample["peak_rss_bytes"]:
+            FFMPEG_PEAK_RSS.observe(sample["peak_rss_bytes"], pipeline=name, stage=stage_name)
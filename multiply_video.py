@@ -1,39 +1,150 @@
 import os
 import subprocess
+import tempfile
+import metrics
+from ffmpeg_progress import run_ffmpeg
+from media_probe import probe
+from parallel_runner import resolve_workers, threads_per_job
+from batch_journal import BatchJournal, render_and_commit, run_journaled
+
+# Containers/codecs the concat demuxer can loop with -c copy into an .mp4
+COPY_SAFE_FORMATS = ("mp4", "mov")
+COPY_SAFE_VIDEO_CODECS = ("h264", "hevc", "mpeg4")
+COPY_SAFE_AUDIO_CODECS = ("aac", "mp3")
 
 # DND-Working 
+@metrics.in_pipeline("multiply_videos")
 def multiply_videos(
     input_folder="edit_vid_input",
     output_folder="edit_vid_output",
-    repeat_factor=1
+    repeat_factor=1,
+    max_workers=1,
+    ffmpeg_threads=None,
+    mode="auto",
+    consume_inputs=False
 ):
+    """
+    Outputs are verified before they replace anything; consume_inputs=True then deletes the
+    input. An interrupted batch rerun with the same settings resumes (see batch_journal).
+    """
     print("✅ Received Arguments:", locals())
+    settings = {k: v for k, v in locals().items() if k not in ("max_workers", "ffmpeg_threads", "consume_inputs")}
+    journal = BatchJournal(output_folder, "multiply_videos", settings)
+
+    with metrics.stage("cleanup"):
+        journal.start(clear_folder)
 
-    clear_folder(output_folder)
+    max_workers = resolve_workers(max_workers)
+    threads = threads_per_job(max_workers, ffmpeg_threads)
 
-    for filename in os.listdir(input_folder):
+    jobs = []
+    for filename in sorted(os.listdir(input_folder)):
         if filename.lower().endswith(".mp4"):
-            input_path = os.path.join(input_folder, filename)
-            output_path = os.path.join(output_folder, filename)
-
-            ffmpeg_cmd = [
-                'ffmpeg', '-y',
-                '-i', input_path,
-                '-filter_complex', f"[0:v]null[base];[base]split={repeat_factor}[a][b];[a]setpts=N/FRAME_RATE/TB[a];[b]setpts=N/FRAME_RATE/TB[b];[a][b]concat=n=2:v=1:a=0[outv]",
-                '-map', '[outv]',
-                '-map', '0:a?',  # Audio from main video
-                '-c:v', 'libx264',
-                '-c:a', 'aac',
-                '-shortest',
-                '-preset', 'ultrafast',
-                '-crf', '23',
-                output_path
-            ]
-
-            print(f"🎬 Processing: {filename}")
-            subprocess.run(ffmpeg_cmd, check=True)
-            print(f"✅ Done: {filename}")
-            os.remove(input_path)
+            jobs.append({"name": filename, "kwargs": dict(
+                input_path=os.path.join(input_folder, filename),
+                output_path=os.path.join(output_folder, filename),
+                repeat_factor=repeat_factor,
+                threads=threads,
+                mode=mode,
+                consume_input=consume_inputs
+            )})
+
+    return run_journaled(jobs, _multiply_and_consume, journal, max_workers=max_workers)
+
+def _multiply_and_consume(input_path, output_path, consume_input=False, **kwargs):
+    """Render to a temp name, verify, rename into place; remove the input only with consume_input."""
+    expected = (probe(input_path).get("duration") or 0.0) * max(1, int(kwargs.get("repeat_factor", 1)))
+    return render_and_commit(
+        lambda tmp_path: multiply_video(input_path, tmp_path, **kwargs),
+        input_path, output_path, expected_duration=expected, consume_input=consume_input
+    )
+
+@metrics.in_pipeline("multiply_videos")
+def multiply_video(input_path, output_path, repeat_factor=1, threads=None, mode="auto"):
+    """
+    Repeat a clip `repeat_factor` times.
+
+    mode="auto": stream-copy when the input is safe to loop without re-encoding
+    (see can_copy_loop), falling back to a re-encode if the copy fails.
+    mode="copy" / "encode" force one path.
+    """
+    filename = os.path.basename(input_path)
+    repeat_factor = max(1, int(repeat_factor))
+
+    if mode in ("auto", "copy"):
+        with metrics.stage("probe"):
+            ok, reason = can_copy_loop(input_path) if mode == "auto" else (True, "forced")
+        if ok:
+            try:
+                print(f"🎬 Processing (copy x{repeat_factor}): {filename}")
+                _loop_copy(input_path, output_path, repeat_factor)
+                print(f"✅ Done: {filename}")
+                return output_path
+            except subprocess.CalledProcessError as e:
+                if mode == "copy":
+                    raise
+                print(f"[Info] Stream copy failed for {filename} ({e}), re-encoding")
+        else:
+            print(f"[Info] Re-encoding {filename}: {reason}")
+
+    # Loop the input itself so audio repeats along with the video
+    ffmpeg_cmd = [
+        'ffmpeg', '-y',
+        '-stream_loop', str(repeat_factor - 1),
+        '-i', input_path,
+        '-map', '0:v:0',
+        '-map', '0:a?',  # Audio from main video
+        '-c:v', 'libx264',
+        '-c:a', 'aac',
+        '-preset', 'ultrafast',
+        '-crf', '23',
+    ]
+    if threads:
+        ffmpeg_cmd += ['-threads', str(threads)]
+    ffmpeg_cmd += [output_path]
+
+    duration = (probe(input_path).get("duration") or 0.0) * repeat_factor
+    print(f"🎬 Processing: {filename}")
+    run_ffmpeg(ffmpeg_cmd, duration=duration or None, label=filename)
+    print(f"✅ Done: {filename}")
+    return output_path
+
+def can_copy_loop(input_path):
+    """(ok, reason): True when the clip can be repeated with the concat demuxer and -c copy."""
+    info = probe(input_path)
+    if not info:
+        return False, "could not probe input"
+    formats = (info.get("format_name") or "").split(",")
+    if not any(f in COPY_SAFE_FORMATS for f in formats):
+        return False, f"container {info.get('format_name')}"
+    if info.get("codec_name") not in COPY_SAFE_VIDEO_CODECS:
+        return False, f"video codec {info.get('codec_name')}"
+    for a in info.get("audio_streams", []):
+        if a.get("codec_name") not in COPY_SAFE_AUDIO_CODECS:
+            return False, f"audio codec {a.get('codec_name')}"
+    if not info.get("duration"):
+        return False, "unknown duration"
+    # Edit lists / non-zero start times shift every repeat's timestamps
+    if abs(info.get("start_time") or 0.0) > 0.05:
+        return False, f"start_time {info.get('start_time')}"
+    return True, "ok"
+
+def _loop_copy(input_path, output_path, repeat_factor):
+    with tempfile.TemporaryDirectory() as td:
+        list_txt = os.path.join(td, "list.txt")
+        safe_p = os.path.abspath(input_path).replace("'", r"'\''")
+        with open(list_txt, "w", encoding="utf-8") as f:
+            for _ in range(repeat_factor):
+                f.write(f"file '{safe_p}'\n")
+        run_ffmpeg([
+            'ffmpeg', '-y',
+            '-f', 'concat', '-safe', '0',
+            '-i', list_txt,
+            '-map', '0:v:0', '-map', '0:a?',
+            '-c', 'copy',
+            output_path
+        ], duration=(probe(input_path).get("duration") or 0.0) * repeat_factor or None,
+           label=os.path.basename(input_path), stage="mux")
 
 def clear_folder(folder_path, extensions=None):
     if not os.path.exists(folder_path):
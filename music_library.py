@@ -0,0 +1,190 @@
+# music_library.py
+import os, json, math, random, subprocess, tempfile, threading
+from typing import Callable, Dict, List, Optional
+
+from media_probe import CACHE_DIR, file_digest, file_lock, find_binary, probe
+from ffmpeg_progress import run_ffmpeg
+
+MUSIC_CACHE_DIR = os.path.join(CACHE_DIR, "music")
+MUSIC_INDEX_PATH = os.path.join(MUSIC_CACHE_DIR, "index.json")
+MUSIC_EXTENSIONS = ('.mp3', '.wav', '.aac', '.m4a')
+
+# EBU R128 targets for the two-pass loudnorm
+LOUDNORM_TARGET = {"I": -16.0, "TP": -1.5, "LRA": 11.0}
+MEZZANINE_ARGS = ['-c:a', 'aac', '-b:a', '192k', '-ar', '48000', '-ac', '2']
+
+_lock = threading.RLock()
+_track_locks: Dict[str, threading.Lock] = {}
+
+# --------------------------
+# Index
+# --------------------------
+def build_index(folder: str) -> List[Dict]:
+    """
+    Index entries for every track in `folder`:
+    {path, digest, duration, codec_name, sample_rate, channels, loudnorm, mezzanine}
+
+    Entries are stored in .cache/music/index.json keyed by content hash, so each
+    track is measured once (first loudnorm pass) no matter how often it is picked
+    or renamed. `mezzanine` is filled in once the track was pre-encoded.
+    """
+    if not folder or not os.path.isdir(folder):
+        return []
+    tracks = sorted(
+        os.path.join(folder, f) for f in os.listdir(folder)
+        if f.lower().endswith(MUSIC_EXTENSIONS)
+    )
+    with _lock:
+        index = _load()
+        entries, new = [], {}
+        for path in tracks:
+            digest = file_digest(path)
+            entry = index.get(digest) or new.get(digest)
+            if entry is None:
+                entry = new[digest] = _describe(path, digest)
+            entry["path"] = path
+            entries.append(dict(entry))
+        if new:
+            def add_new(index):
+                # other processes may have indexed tracks meanwhile: only add what's still missing
+                for d, e in new.items():
+                    index.setdefault(d, e)
+            _update_index(add_new)
+    return entries
+
+def pick_track(folder: str, min_duration: Optional[float] = None) -> Optional[Dict]:
+    """
+    Random index entry from `folder`, preferring tracks at least `min_duration`
+    seconds long so the video isn't cut short by -shortest. Falls back to the
+    longest tracks when none is long enough.
+    """
+    entries = [e for e in build_index(folder) if e.get("duration")]
+    if not entries:
+        return None
+    if min_duration:
+        long_enough = [e for e in entries if e["duration"] >= min_duration]
+        if long_enough:
+            entries = long_enough
+        else:
+            longest = max(e["duration"] for e in entries)
+            entries = [e for e in entries if e["duration"] == longest]
+    return random.choice(entries)
+
+def pick_music(folder: str, min_duration: Optional[float] = None) -> Optional[str]:
+    """Path to use as background music: the track's loudness-normalized AAC mezzanine."""
+    entry = pick_track(folder, min_duration)
+    if entry is None:
+        return None
+    return mezzanine_for(entry)
+
+# --------------------------
+# Mezzanine (second loudnorm pass + AAC encode, once per track)
+# --------------------------
+def mezzanine_for(entry: Dict) -> str:
+    """
+    Encode the track once to AAC in .cache/music so outputs can -c:a copy it.
+    Returns the original path if encoding fails.
+    """
+    out_path = os.path.join(MUSIC_CACHE_DIR, f"{entry['digest'][:16]}.m4a")
+    if os.path.exists(out_path):
+        return out_path
+    with _lock:
+        lock = _track_locks.setdefault(out_path, threading.Lock())
+    with lock:
+        if os.path.exists(out_path):
+            return out_path
+        os.makedirs(MUSIC_CACHE_DIR, exist_ok=True)
+        # own temp file per writer: pool and work-queue processes may encode the same track
+        fd, tmp = tempfile.mkstemp(dir=MUSIC_CACHE_DIR, prefix=f".{entry['digest'][:16]}_", suffix=".m4a")
+        os.close(fd)
+        cmd = ['ffmpeg', '-y', '-i', entry["path"], '-vn', '-af', _loudnorm_filter(entry.get("loudnorm"))]
+        cmd += MEZZANINE_ARGS + [tmp]
+        print(f"🎵 Pre-encoding music: {os.path.basename(entry['path'])}")
+        try:
+            run_ffmpeg(cmd, duration=entry.get("duration"), label=os.path.basename(out_path),
+                       stage="music_mezzanine")
+            os.replace(tmp, out_path)
+        except Exception as e:
+            print(f"[Info] Using {entry['path']} as-is, music pre-encode failed: {e}")
+            return entry["path"]
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def set_mezzanine(index):
+        if entry["digest"] in index:
+            index[entry["digest"]]["mezzanine"] = out_path
+    _update_index(set_mezzanine)
+    return out_path
+
+def is_copyable_aac(path: str) -> bool:
+    """True if `path` holds AAC audio an mp4 output can take with -c:a copy."""
+    audio = probe(path).get("audio_streams") or []
+    return bool(audio) and audio[0].get("codec_name") == "aac"
+
+def _loudnorm_filter(measured: Optional[Dict]) -> str:
+    t = LOUDNORM_TARGET
+    f = f"loudnorm=I={t['I']}:TP={t['TP']}:LRA={t['LRA']}"
+    if measured:
+        f += (f":measured_I={measured['input_i']}:measured_TP={measured['input_tp']}"
+              f":measured_LRA={measured['input_lra']}:measured_thresh={measured['input_thresh']}"
+              f":offset={measured['target_offset']}:linear=true")
+    return f
+
+# --------------------------
+# Analysis (first loudnorm pass)
+# --------------------------
+def _describe(path: str, digest: str) -> Dict:
+    info = probe(path)
+    audio = (info.get("audio_streams") or [{}])[0]
+    return {
+        "path": path,
+        "digest": digest,
+        "duration": info.get("duration") or None,
+        "codec_name": audio.get("codec_name"),
+        "sample_rate": audio.get("sample_rate"),
+        "channels": audio.get("channels"),
+        "loudnorm": measure_loudness(path),
+        "mezzanine": None,
+    }
+
+def measure_loudness(path: str) -> Optional[Dict]:
+    """loudnorm's first-pass measurements (input_i, input_tp, input_lra, input_thresh, target_offset)."""
+    ffmpeg = find_binary("ffmpeg")
+    if not ffmpeg:
+        return None
+    t = LOUDNORM_TARGET
+    cmd = [ffmpeg, '-hide_banner', '-nostats', '-i', path, '-vn',
+           '-af', f"loudnorm=I={t['I']}:TP={t['TP']}:LRA={t['LRA']}:print_format=json",
+           '-f', 'null', '-']
+    try:
+        err = subprocess.run(cmd, capture_output=True, text=True).stderr
+        data = json.loads(err[err.rindex("{"):err.rindex("}") + 1])
+        measured = {k: data[k] for k in ("input_i", "input_tp", "input_lra", "input_thresh", "target_offset")}
+        if not all(math.isfinite(float(v)) for v in measured.values()):
+            return None   # silent track: nothing to normalize against
+        return measured
+    except Exception:
+        return None
+
+def _load() -> Dict:
+    try:
+        with open(MUSIC_INDEX_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _update_index(change: Callable[[Dict], None]):
+    """Load, change and save the index under a lock shared by every process using the cache."""
+    os.makedirs(MUSIC_CACHE_DIR, exist_ok=True)
+    with _lock, file_lock(MUSIC_INDEX_PATH + ".lock"):
+        index = _load()
+        change(index)
+        _save(index)
+
+def _save(index: Dict):
+    os.makedirs(MUSIC_CACHE_DIR, exist_ok=True)
+    tmp = f"{MUSIC_INDEX_PATH}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp, MUSIC_INDEX_PATH)
@@ -0,0 +1,91 @@
+# overlay_assets.py
+import os, tempfile, threading
+from typing import List, Tuple
+
+from media_probe import CACHE_DIR, file_digest
+from ffmpeg_progress import run_ffmpeg
+
+OVERLAY_CACHE_DIR = os.path.join(CACHE_DIR, "overlays")
+
+# Alpha-capable, loopable targets. "webm" (VP9 + alpha) is small on disk; "mov"
+# (QuickTime RLE) is bigger but nearly free to decode. The libvpx decoder must be
+# forced on input, ffmpeg's native vp9 decoder drops the alpha plane.
+OVERLAY_FORMATS = {
+    "webm": {
+        "ext": ".webm",
+        "encode": ["-c:v", "libvpx-vp9", "-pix_fmt", "yuva420p", "-b:v", "0", "-crf", "32",
+                   "-auto-alt-ref", "0", "-row-mt", "1", "-deadline", "good", "-cpu-used", "4"],
+        "input_args": ["-c:v", "libvpx-vp9"],
+    },
+    "mov": {
+        "ext": ".mov",
+        "encode": ["-c:v", "qtrle", "-pix_fmt", "argb"],
+        "input_args": [],
+    },
+}
+DEFAULT_OVERLAY_FORMAT = "webm"
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+# --------------------------
+# Overlay variants
+# --------------------------
+def overlay_variant(src: str, width: int, height: int,
+                    fmt: str = DEFAULT_OVERLAY_FORMAT) -> Tuple[str, List[str]]:
+    """
+    Return (path, input_args) of `src` transcoded once to cover width x height.
+
+    Variants are cached under .cache/overlays keyed by the source hash and the
+    target size, so a batch of same-sized videos decodes the GIF palette once
+    instead of on every loop of every video. `input_args` go right before `-i path`.
+    """
+    spec = OVERLAY_FORMATS[fmt]
+    name = os.path.splitext(os.path.basename(src))[0]
+    orientation = "portrait" if height > width else "landscape"
+    out_path = os.path.join(
+        OVERLAY_CACHE_DIR,
+        f"{name}_{orientation}_{width}x{height}_{file_digest(src)[:16]}{spec['ext']}"
+    )
+    if os.path.exists(out_path):
+        return out_path, list(spec["input_args"])
+
+    with _lock_for(out_path):
+        if not os.path.exists(out_path):
+            _transcode(src, out_path, width, height, spec)
+    return out_path, list(spec["input_args"])
+
+def overlay_input_args(src: str, width: int, height: int) -> List[str]:
+    """
+    Looping input args for an overlay: the cached variant when it can be built,
+    otherwise the raw source (e.g. no VP9 encoder in this ffmpeg build).
+    """
+    try:
+        path, input_args = overlay_variant(src, width, height)
+    except Exception as e:
+        print(f"[Info] Using {src} as-is, overlay variant failed: {e}")
+        path, input_args = src, []
+    return ['-stream_loop', '-1'] + input_args + ['-i', path]
+
+def _transcode(src: str, out_path: str, width: int, height: int, spec: dict):
+    os.makedirs(OVERLAY_CACHE_DIR, exist_ok=True)
+    # _lock_for only covers threads: pool processes and work-queue workers may build the
+    # same variant at once, so each writes its own temp file and only os.replace is shared
+    fd, tmp = tempfile.mkstemp(dir=OVERLAY_CACHE_DIR, prefix=".variant_", suffix=spec['ext'])
+    os.close(fd)
+    cmd = [
+        'ffmpeg', '-y', '-i', src,
+        '-vf', f"scale={width}:{height}:force_original_aspect_ratio=increase,crop={width}:{height}",
+        '-an',
+    ] + spec["encode"] + [tmp]
+    print(f"🎞️ Building overlay variant: {os.path.basename(out_path)}")
+    try:
+        run_ffmpeg(cmd, label=os.path.basename(out_path), stage="overlay_variant")
+        os.replace(tmp, out_path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def _lock_for(key: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
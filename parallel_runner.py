@@ -0,0 +1,123 @@
+# parallel_runner.py
+import contextvars, multiprocessing, os, threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+
+import metrics
+from ffmpeg_progress import current_listener, progress_listener
+
+# --------------------------
+# Worker pool helpers
+# --------------------------
+def resolve_workers(max_workers: Optional[int]) -> int:
+    """None/0 -> one worker per core; otherwise clamp to >= 1."""
+    if not max_workers:
+        return os.cpu_count() or 1
+    return max(1, int(max_workers))
+
+def threads_per_job(max_workers: int, ffmpeg_threads: Optional[int] = None) -> Optional[int]:
+    """
+    Split the cores between concurrent ffmpeg jobs so N encodes don't each
+    spin up a full set of x264 threads. Returns None (let ffmpeg decide)
+    when running one job at a time and no explicit value was given.
+    """
+    if ffmpeg_threads:
+        return int(ffmpeg_threads)
+    if max_workers <= 1:
+        return None
+    return max(1, (os.cpu_count() or 1) // max_workers)
+
+def run_jobs(jobs: List[Dict], worker: Callable, max_workers: int = 1,
+             use_processes: bool = False) -> List[Dict]:
+    """
+    Run `worker(**job["kwargs"])` for every job and collect one result dict per job:
+    {name, ok, result, error}. Errors are captured per job so one bad file
+    doesn't abort the rest of the batch. Results keep the order of `jobs`.
+
+    use_processes=True runs the jobs in a process pool, for work that holds the GIL
+    (MoviePy/numpy frame rendering); `worker` must then be a module-level function.
+    Stage timings and ffmpeg metrics recorded in the pool processes are sent back
+    with each result and merged into this process's /metrics, and their ffmpeg
+    progress records are forwarded to the caller's progress listener.
+    """
+    max_workers = resolve_workers(max_workers)
+    results: List[Dict] = [None] * len(jobs)
+
+    def _record(i, fn):
+        name = jobs[i]["name"]
+        try:
+            results[i] = {"name": name, "ok": True, "result": fn(), "error": None}
+        except Exception as e:
+            results[i] = {"name": name, "ok": False, "result": None, "error": str(e)}
+            print(f"❌ Failed: {name} ({e})")
+
+    if max_workers == 1 or len(jobs) <= 1:
+        for i, job in enumerate(jobs):
+            _record(i, lambda: worker(**job["kwargs"]))
+        return results
+
+    n = min(max_workers, len(jobs))
+    if use_processes:
+        pipeline = metrics.current_pipeline()
+        listener = current_listener()
+        progress = multiprocessing.Queue() if listener else None
+        pool = ProcessPoolExecutor(max_workers=n, initializer=_init_child, initargs=(progress,))
+        submit_args, unwrap = (lambda job: (_child_job, worker, pipeline)), _merge_child_result
+    else:
+        # threads inherit the caller's context (e.g. the job's ffmpeg progress listener)
+        listener = progress = None
+        pool = ThreadPoolExecutor(max_workers=n)
+        submit_args, unwrap = (lambda job: (contextvars.copy_context().run, worker)), (lambda f: f.result())
+
+    forwarder = None
+    if progress is not None:
+        forwarder = threading.Thread(target=_forward_progress, args=(progress, listener),
+                                     name="progress-forwarder", daemon=True)
+        forwarder.start()
+    try:
+        with pool:
+            futures = {pool.submit(*submit_args(job), **job["kwargs"]): i for i, job in enumerate(jobs)}
+            for f in as_completed(futures):
+                _record(futures[f], lambda: unwrap(f))
+    finally:
+        if forwarder:
+            progress.put(None)
+            forwarder.join()
+    return results
+
+# --------------------------
+# Process-pool plumbing
+# --------------------------
+_child_progress = None   # queue to the parent's progress forwarder, set per pool process
+
+def _init_child(progress):
+    global _child_progress
+    _child_progress = progress
+
+def _forward_progress(progress, listener: Callable[[Dict], None]):
+    """Parent side: hand records from the pool processes to the job's listener until None arrives."""
+    while True:
+        record = progress.get()
+        if record is None:
+            return
+        try:
+            listener(record)
+        except Exception:
+            pass
+
+def _child_job(worker: Callable, pipeline: str, **kwargs):
+    """Runs in a pool process: (ok, result or error message, metrics recorded meanwhile)."""
+    before = metrics.collect()
+    try:
+        with metrics.pipeline(pipeline), progress_listener(_child_progress.put if _child_progress else None):
+            outcome = (True, worker(**kwargs))
+    except Exception as e:
+        outcome = (False, str(e))
+    return outcome + (metrics.diff(before, metrics.collect()),)
+
+def _merge_child_result(future):
+    ok, value, delta = future.result()
+    metrics.merge(delta)
+    if not ok:
+        raise RuntimeError(value)
+    return value
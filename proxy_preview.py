@@ -0,0 +1,40 @@
+# proxy_preview.py
+from typing import List, Optional, Tuple
+
+# --------------------------
+# Low-resolution proxy renders for tuning parameters
+# --------------------------
+# Preview renders go through the same filter graphs as the final render but are
+# scaled down (short side PREVIEW_HEIGHT, so portrait clips stay legible), dropped
+# to a lower frame rate, encoded with ultrafast settings and optionally cut to the
+# first PREVIEW_SECONDS. They are written to PREVIEW_FOLDER and never consume the
+# inputs.
+
+PREVIEW_FOLDER = "edit_vid_preview"
+PREVIEW_HEIGHT = 360
+PREVIEW_FPS = 15
+PREVIEW_SECONDS = 10
+
+PREVIEW_VIDEO_ARGS = ['-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '30', '-pix_fmt', 'yuv420p']
+PREVIEW_AUDIO_ARGS = ['-c:a', 'aac', '-b:a', '96k']
+
+def proxy_filter(short_side: int = PREVIEW_HEIGHT, fps: int = PREVIEW_FPS) -> str:
+    """Scale the short side down to `short_side` (keeps aspect, never upscales) and resample to `fps`."""
+    return (f"scale='if(gte(iw,ih),-2,min({short_side},iw))':'if(gte(iw,ih),min({short_side},ih),-2)'"
+            f":flags=fast_bilinear,fps={fps}")
+
+def proxy_size(width: int, height: int, short_side: int = PREVIEW_HEIGHT) -> Tuple[int, int]:
+    """Same scaling as proxy_filter for code that needs the numbers (overlays, Ken Burns canvas)."""
+    if min(width, height) <= short_side:
+        return width, height
+    ratio = short_side / min(width, height)
+    return int(round(width * ratio / 2)) * 2, int(round(height * ratio / 2)) * 2
+
+def trim_args(seconds: Optional[float]) -> List[str]:
+    """Input option limiting how much of the source is read (goes before -i)."""
+    return ['-t', str(seconds)] if seconds else []
+
+def preview_duration(duration: Optional[float], seconds: Optional[float]) -> Optional[float]:
+    if seconds and duration:
+        return min(duration, seconds)
+    return seconds or duration
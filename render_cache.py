@@ -0,0 +1,117 @@
+# render_cache.py
+import os, json, hashlib, shutil, subprocess
+from functools import lru_cache
+from typing import Dict, Iterable, Optional
+
+from media_probe import CACHE_DIR, file_digest, find_binary
+
+RENDER_CACHE_DIR = os.path.join(CACHE_DIR, "renders")
+RENDER_CACHE_MAX_BYTES = int(os.environ.get("VIDEO_RENDER_CACHE_MB", 20 * 1024)) * 1024 * 1024
+
+# Bump when a pipeline change alters the output for the same inputs/params
+TOOL_VERSION = "2"
+# Empty file next to each entry whose mtime is the entry's "last used" time. The entry
+# itself is hardlinked into output folders, so touching it would change the outputs too.
+USED_SUFFIX = ".used"
+
+# --------------------------
+# Keys
+# --------------------------
+@lru_cache(maxsize=None)
+def ffmpeg_version() -> str:
+    path = find_binary("ffmpeg")
+    if not path:
+        return "none"
+    try:
+        out = subprocess.run([path, "-version"], capture_output=True, text=True).stdout
+        return out.splitlines()[0] if out else "unknown"
+    except Exception:
+        return "unknown"
+
+def cache_key(kind: str, input_path: str, params: Dict, assets: Iterable[Optional[str]] = ()) -> str:
+    """
+    Hash of everything that determines a render: input contents, every rendering
+    parameter, the contents of the assets used (watermark, overlays, music), the
+    tool version and the ffmpeg build.
+    """
+    payload = {
+        "kind": kind,
+        "input": file_digest(input_path),
+        "params": params,
+        "assets": sorted(file_digest(a) for a in assets if a and os.path.exists(a)),
+        "tool": TOOL_VERSION,
+        "ffmpeg": ffmpeg_version(),
+    }
+    blob = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()
+
+# --------------------------
+# Lookup / store
+# --------------------------
+def _entry_path(key: str, ext: str) -> str:
+    return os.path.join(RENDER_CACHE_DIR, key[:2], key + ext)
+
+def fetch(key: str, dest: str) -> bool:
+    """Place the cached render for `key` at `dest` (hardlink, else copy). False on miss."""
+    entry = _entry_path(key, os.path.splitext(dest)[1])
+    if not os.path.exists(entry):
+        return False
+    _mark_used(entry)
+    os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+    if os.path.exists(dest):
+        os.remove(dest)
+    _link_or_copy(entry, dest)
+    return True
+
+def store(key: str, src: str):
+    """Add a finished render to the cache, then evict least recently used entries."""
+    entry = _entry_path(key, os.path.splitext(src)[1])
+    os.makedirs(os.path.dirname(entry), exist_ok=True)
+    tmp = f"{entry}.{os.getpid()}.tmp"
+    _link_or_copy(src, tmp)
+    os.replace(tmp, entry)
+    _mark_used(entry)
+    evict()
+
+def evict(max_bytes: int = RENDER_CACHE_MAX_BYTES):
+    """Remove least recently used entries (by their USED_SUFFIX marker) until the cache fits."""
+    entries = []
+    for root, _, files in os.walk(RENDER_CACHE_DIR):
+        for f in files:
+            if f.endswith((USED_SUFFIX, ".tmp")):
+                continue
+            p = os.path.join(root, f)
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            try:
+                used = os.stat(p + USED_SUFFIX).st_mtime
+            except OSError:
+                used = st.st_mtime
+            entries.append((used, st.st_size, p))
+    total = sum(size for _, size, _ in entries)
+    for _, size, p in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(p)
+            total -= size
+        except OSError:
+            continue
+        try: os.remove(p + USED_SUFFIX)
+        except OSError: pass
+
+def _mark_used(entry: str):
+    try:
+        with open(entry + USED_SUFFIX, "a"):
+            pass
+        os.utime(entry + USED_SUFFIX)
+    except OSError:
+        pass
+
+def _link_or_copy(src: str, dest: str):
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
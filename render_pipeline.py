@@ -0,0 +1,233 @@
+# render_pipeline.py
+import os, time
+from typing import Dict, List, Optional
+
+from media_probe import probe
+import metrics
+from batch_journal import BatchJournal, render_and_commit, run_journaled
+from ffmpeg_progress import run_ffmpeg
+from parallel_runner import resolve_workers, threads_per_job
+from video_editor import (clear_folder, crop_filters, cropped_size,
+                          watermark_overlay_position, watermark_scale_filter)
+from watermark_assets import watermark_variant
+from music_library import build_index, is_copyable_aac, pick_music
+from add_overlays import PETAL_GIF_PATH, SPARKLE_GIF_PATH
+from overlay_assets import overlay_input_args
+
+# --------------------------
+# Single-pass render pipeline
+# --------------------------
+# Instead of chaining /editvideos -> /addoverlays -> /multiplyvideo (one full
+# decode + libx264 encode per step), the caller declares the steps and they are
+# compiled into one filter_complex and one encode. Steps are dicts, applied in order:
+#
+#   {"op": "crop", "remove_top": 50, "remove_bottom": 0, "orientation": "auto"}
+#   {"op": "slow_down", "factor": 2.0}
+#   {"op": "watermark", "path": "logo.png", "position": "bottom-left", "scale": 0.15,
+#    "premultiplied": False}
+#   {"op": "overlays", "petals": True, "sparkles": True, "position": [0, 0]}
+#   {"op": "music", "path": "song.mp3"}  or  {"op": "music", "folder": "god_bg"}
+#   {"op": "repeat", "count": 3}
+#
+# "repeat" loops the input with -stream_loop, so it can appear anywhere in the list.
+# Audio: music if a music step is given, otherwise the source audio - dropped when
+# the video is slowed down (same as process_video).
+
+STEP_OPS = ("crop", "slow_down", "watermark", "overlays", "music", "repeat")
+
+def compile_pipeline(input_path: str, output_path: str, steps: List[Dict],
+                     threads: Optional[int] = None) -> List[str]:
+    """Build the single ffmpeg command for `steps`."""
+    for step in steps:
+        if step.get("op") not in STEP_OPS:
+            raise ValueError(f"Unknown pipeline step: {step.get('op')}")
+
+    with metrics.stage("probe"):
+        info = probe(input_path)
+    if not info.get("width") or not info.get("height"):
+        raise RuntimeError(f"Could not read video size: {input_path}")
+    width, height = info["width"], info["height"]
+    build_started = time.perf_counter()
+
+    repeat = sum(int(s.get("count", 1)) - 1 for s in steps if s["op"] == "repeat")
+    inputs = ['-stream_loop', str(repeat), '-i', input_path] if repeat > 0 else ['-i', input_path]
+    n_inputs = 1
+
+    graph = []
+    chain = []          # plain filters pending on the current label
+    label = "0:v"
+    node = 0
+    music_idx = music_path = None
+    frame_w, frame_h = width, height   # current frame size, changed by crop
+
+    def flush():
+        nonlocal chain, label, node
+        if chain:
+            graph.append(f"[{label}]{','.join(chain)}[p{node}]")
+            label = f"p{node}"
+            node += 1
+            chain = []
+
+    for step in steps:
+        op = step["op"]
+        if op == "crop":
+            orientation = step.get("orientation", "auto")
+            if orientation == "auto":
+                orientation = "portrait" if height > width else "landscape"
+            chain += crop_filters(width, height, orientation,
+                                  step.get("remove_top", 50), step.get("remove_bottom", 0))
+            frame_w, frame_h = cropped_size(width, height, orientation,
+                                            step.get("remove_top", 50), step.get("remove_bottom", 0))
+        elif op == "slow_down":
+            chain.append(f"setpts={step.get('factor', 2.0)}*PTS")
+        elif op == "watermark":
+            path = step.get("path", "logo.png")
+            if not os.path.exists(path):
+                continue
+            flush()
+            wm = watermark_variant(path, frame_w, frame_h, scale=step.get("scale", 0.2),
+                                   position=step.get("position", "bottom-right"),
+                                   premultiplied=step.get("premultiplied", False))
+            if wm:
+                inputs += ['-i', wm["path"]]
+                graph.append(f"[{label}][{n_inputs}:v]{wm['overlay']}[p{node}]")
+            else:
+                inputs += ['-i', path]
+                graph.append(f"[{n_inputs}:v]{watermark_scale_filter(step.get('scale', 0.2))}[wm{n_inputs}]")
+                pos = watermark_overlay_position(step.get("position", "bottom-right"))
+                graph.append(f"[{label}][wm{n_inputs}]overlay={pos}[p{node}]")
+            label = f"p{node}"
+            node += 1
+            n_inputs += 1
+        elif op == "overlays":
+            x, y = step.get("position", (0, 0))
+            for key, path in (("petals", PETAL_GIF_PATH), ("sparkles", SPARKLE_GIF_PATH)):
+                if not step.get(key, True) or not os.path.exists(path):
+                    continue
+                flush()
+                inputs += overlay_input_args(path, frame_w, frame_h)   # sized to the cropped frame
+                # shortest=1: the looped overlay must not keep the graph running
+                graph.append(f"[{label}][{n_inputs}:v]overlay={x}:{y}:shortest=1[p{node}]")
+                label = f"p{node}"
+                node += 1
+                n_inputs += 1
+        elif op == "music":
+            path = step.get("path")
+            if not path and step.get("folder"):
+                path = pick_music(step["folder"], min_duration=expected_duration(input_path, steps))
+            if path:
+                inputs += ['-i', path]
+                music_idx, music_path = n_inputs, path
+                n_inputs += 1
+    if not chain and not graph:
+        chain.append("null")
+    flush()
+
+    cmd = ['ffmpeg', '-y'] + inputs + ['-filter_complex', ";".join(graph), '-map', f"[{label}]"]
+    if music_idx is not None:
+        # library music is pre-encoded AAC (see music_library) and is copied as is
+        music_codec = ['-c:a', 'copy'] if is_copyable_aac(music_path) else ['-c:a', 'aac', '-b:a', '192k']
+        cmd += ['-map', f"{music_idx}:a:0"] + music_codec + ['-shortest']
+    elif any(s["op"] == "slow_down" for s in steps):
+        cmd += ['-an']
+    else:
+        cmd += ['-map', '0:a?', '-c:a', 'aac', '-b:a', '192k']
+    cmd += ['-c:v', 'libx264', '-preset', 'fast', '-crf', '23']
+    if threads:
+        cmd += ['-threads', str(threads)]
+    cmd += [output_path]
+    metrics.record_stage("filter_build", time.perf_counter() - build_started)
+    return cmd
+
+def expected_duration(input_path: str, steps: List[Dict]) -> Optional[float]:
+    """Output length implied by slow_down/repeat steps (used for progress)."""
+    d = probe(input_path).get("duration") or 0.0
+    for s in steps:
+        if s["op"] == "slow_down":
+            d *= float(s.get("factor", 2.0))
+        elif s["op"] == "repeat":
+            d *= max(1, int(s.get("count", 1)))
+    return d or None
+
+@metrics.in_pipeline("render_pipeline")
+def render_pipeline(input_path: str, output_path: str, steps: List[Dict],
+                    threads: Optional[int] = None) -> str:
+    """Render one file through all `steps` with a single encode."""
+    cmd = compile_pipeline(input_path, output_path, steps, threads=threads)
+    print(f"🎬 Rendering: {os.path.basename(input_path)} ({', '.join(s['op'] for s in steps)})")
+    run_ffmpeg(cmd, duration=expected_duration(input_path, steps), label=os.path.basename(input_path))
+    print(f"✅ Done: {os.path.basename(output_path)}")
+    return output_path
+
+@metrics.in_pipeline("render_pipeline")
+def batch_render(
+    input_folder="edit_vid_input",
+    output_folder="edit_vid_output",
+    steps=None,
+    max_workers=1,
+    ffmpeg_threads=None,
+    consume_inputs=False
+):
+    """
+    Folder version of render_pipeline with the same worker pool and journal as
+    batch_process: outputs are verified before they're renamed into place, an
+    interrupted batch resumes, and inputs are only removed with consume_inputs.
+    """
+    print("✅ Received Arguments:", locals())
+    steps = steps or []
+
+    journal = BatchJournal(output_folder, "render_pipeline",
+                           dict(input_folder=input_folder, output_folder=output_folder, steps=steps))
+    with metrics.stage("cleanup"):
+        journal.start(clear_folder)
+
+    max_workers = resolve_workers(max_workers)
+    threads = threads_per_job(max_workers, ffmpeg_threads)
+
+    jobs = []
+    for filename in sorted(os.listdir(input_folder)):
+        if filename.lower().endswith(".mp4"):
+            jobs.append({"name": filename, "kwargs": dict(
+                input_path=os.path.join(input_folder, filename),
+                output_path=os.path.join(output_folder, filename),
+                steps=steps,
+                threads=threads,
+                consume_input=consume_inputs
+            )})
+
+    return run_journaled(jobs, _render_and_consume, journal, max_workers=max_workers)
+
+def _render_and_consume(input_path, output_path, consume_input=False, steps=(), **kwargs):
+    """Render to a temp name, verify and rename it; remove the input only with consume_input."""
+    return render_and_commit(
+        lambda tmp_path: render_pipeline(input_path, tmp_path, steps, **kwargs),
+        input_path, output_path, expected_duration=_committed_duration(input_path, steps),
+        consume_input=consume_input
+    )
+
+def _committed_duration(input_path: str, steps: List[Dict]) -> Optional[float]:
+    """expected_duration(), capped by the music a music step can end with (-shortest)."""
+    d = expected_duration(input_path, steps)
+    for s in steps:
+        if s["op"] != "music" or not d:
+            continue
+        if s.get("path"):
+            d = min(d, probe(s["path"]).get("duration") or d)
+        elif s.get("folder"):
+            # pick_music falls back to the longest track when none is long enough
+            longest = max((e.get("duration") or 0.0 for e in build_index(s["folder"])), default=0.0)
+            d = min(d, longest or d)
+    return d
+
+if __name__ == '__main__':
+    batch_render(
+        input_folder="edit_vid_input",
+        output_folder="edit_vid_output",
+        steps=[
+            {"op": "crop", "remove_top": 50, "remove_bottom": 0, "orientation": "auto"},
+            {"op": "slow_down", "factor": 2.0},
+            {"op": "watermark", "path": "logo.png", "position": "bottom-left", "scale": 0.15},
+            {"op": "overlays", "petals": True, "sparkles": True, "position": [0, 0]},
+            {"op": "repeat", "count": 2},
+        ]
+    )
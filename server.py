@@ -1,17 +1,117 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, Request, Response, request, jsonify, render_template, send_from_directory, stream_with_context
 import json
 from flask_cors import CORS
+from werkzeug.utils import safe_join
 import os
 
 # from caption_generator import prepare_captions_file_for_notebooklm_audio
 # from scraper import scrape_and_process  # Ensure this exists
 # from settings import background_music_options, font_settings, tts_engine, voices, sizes
-from video_editor import batch_process
+from video_editor import batch_process, process_file
+from job_queue import JobQueue, QueueFull
+from uploads import (UploadError, OffsetMismatch, upload_status, write_chunk,
+                     open_part_file, finish_part_file, discard_part_file)
+from hls_packager import HLS_DIR, PLAYLIST_NAME, hls_key, hls_playlist, package_hls
+from proxy_preview import PREVIEW_FOLDER
+import metrics
 # from youtube_uploader import upload_videos
 
+UPLOAD_FOLDER = "edit_vid_input"
+
+class UploadRequest(Request):
+    """Files posted to /upload are streamed straight into UPLOAD_FOLDER, not spooled in memory/tmp."""
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.path == '/upload':
+            return open_part_file(UPLOAD_FOLDER)
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
 app = Flask(__name__, template_folder='templates')
+app.request_class = UploadRequest
+# Behind nginx/Apache, let the front server send file bodies (X-Sendfile) instead of Python
+app.config['USE_X_SENDFILE'] = os.environ.get('VIDEO_USE_X_SENDFILE', '0') == '1'
 CORS(app)
 
+# Background render queue. All jobs share edit_vid_input/edit_vid_output, so keep
+# VIDEO_JOB_WORKERS at 1 unless jobs use separate folders; VIDEO_FILE_WORKERS is the
+# per-job file parallelism passed down to the batch functions.
+jobs = JobQueue(
+    workers=int(os.environ.get('VIDEO_JOB_WORKERS', 1)),
+    max_depth=int(os.environ.get('VIDEO_JOB_QUEUE_DEPTH', 16))
+)
+file_workers = int(os.environ.get('VIDEO_FILE_WORKERS', 1))
+metrics.Gauge("video_job_queue_depth", "Jobs waiting in the queue.", jobs.depth)
+
+def submit_job(kind, func, **kwargs):
+    try:
+        job_id = jobs.submit(kind, func, kwargs)
+    except QueueFull as e:
+        return f"❌ Busy: {str(e)}", 503
+    return jsonify({"job_id": job_id, "status_url": f"/jobs/{job_id}"}), 202
+
+def edit_video_params(values):
+    """batch_process/process_file settings from the editor form (or upload query string)."""
+    orientation = values.get('orientation', 'auto')
+    add_music = True
+    bg_music_folder = values.get('bgmusic')
+    if bg_music_folder == 'none':
+        add_music = False
+    topcut = values.get('topcut',0)
+    if topcut == '':
+        topcut = 0
+
+    bottomcut = values.get('bottomcut',0)
+    if bottomcut == '':
+        bottomcut = 0
+
+    slowfactor = values.get('slowfactor',0)
+    if slowfactor == '':
+        slowfactor = 0
+
+    slow_down = True
+    if slowfactor == 0:
+        slow_down = False
+
+    add_watermark = True
+
+    watermarkposition = values.get('watermarkposition','bottom-left')
+    if watermarkposition == "none":
+        add_watermark = False
+
+    return dict(
+        bg_music_folder="god_bg",
+        remove_top=float(topcut),
+        remove_bottom=float(bottomcut),
+        add_music=add_music,
+        slow_down=slow_down,
+        slow_down_factor=float(slowfactor),
+        target_orientation=orientation,
+        add_watermark=add_watermark,
+        watermark_path="logo.png",
+        watermark_position=watermarkposition,
+        watermark_scale=0.15
+    )
+
+def output_folder_for(values):
+    """preview=yes renders fast proxies into PREVIEW_FOLDER and keeps the inputs."""
+    preview = values.get('preview') == 'yes'
+    return (PREVIEW_FOLDER if preview else "edit_vid_output"), preview
+
+def after_upload(path, values):
+    """Queue a finished upload right away when the client asked for processing (process=editvideos)."""
+    info = {"name": os.path.basename(path), "path": path}
+    if values.get('process') == 'editvideos':
+        output_folder, preview = output_folder_for(values)
+        try:
+            job_id = jobs.submit("editvideos", process_file, dict(
+                input_path=path, output_folder=output_folder, preview=preview,
+                consume_input=not preview,   # previews keep the upload for the final pass
+                **edit_video_params(values)
+            ))
+            info.update(job_id=job_id, status_url=f"/jobs/{job_id}")
+        except QueueFull as e:
+            info["error"] = f"❌ Busy: {str(e)}"
+    return info
+
 # ------------------------ API ROUTES ------------------------ #
 
 # @app.route('/get_full_text', methods=['GET'])
@@ -72,58 +172,163 @@ def index():
 # def prep_caption():
 #     return render_template('index_captions.html')
 
-@app.route('/video/<filename>')
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text format: stage timings, ffmpeg CPU/RSS/IO and job counters."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/jobs')
+def list_jobs():
+    return jsonify({"depth": jobs.depth(), "jobs": jobs.list()})
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "unknown job"}), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Server-Sent Events: one `data:` message with the job snapshot per change."""
+    if jobs.get(job_id) is None:
+        return jsonify({"error": "unknown job"}), 404
+
+    def stream():
+        version = -1
+        while True:
+            job = jobs.wait_for_change(job_id, version)
+            if job is None:
+                return
+            if job["version"] == version:
+                yield ": keep-alive\n\n"
+                continue
+            version = job["version"]
+            yield f"data: {json.dumps(job)}\n\n"
+            if job["state"] in ("done", "failed"):
+                return
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/upload', methods=['POST'])
+def upload_files():
+    """
+    Multipart upload of one or more files (field `files`) into edit_vid_input.
+    Each file is written to disk while it arrives; with process=editvideos every
+    file is queued for editing as soon as the request has delivered it.
+    Upload files one request at a time to overlap uploading with encoding.
+    """
+    results, parts = [], list(request.files.items(multi=True))
+    try:
+        for field, f in parts:
+            if field == 'files' and f.filename:
+                results.append(after_upload(finish_part_file(f.stream, UPLOAD_FOLDER, f.filename), request.form))
+            else:
+                discard_part_file(f.stream)
+        return jsonify({"files": results})
+    except UploadError as e:
+        return jsonify({"error": str(e)}), 400
+    finally:
+        for _, f in parts:
+            if not f.stream.closed:
+                discard_part_file(f.stream)
+
+@app.route('/uploads/<filename>', methods=['GET'])
+def upload_offset(filename):
+    """Bytes of `filename` received so far (also as Upload-Offset, so HEAD works)."""
+    try:
+        status = upload_status(UPLOAD_FOLDER, filename)
+    except UploadError as e:
+        return jsonify({"error": str(e)}), 400
+    response = jsonify(status)
+    response.headers['Upload-Offset'] = str(status["offset"])
+    return response
+
+@app.route('/uploads/<filename>', methods=['PUT'])
+def upload_chunk(filename):
+    """
+    Resumable upload: the body is appended at Upload-Offset (header or ?offset=).
+    The file is complete once Upload-Length (header or ?total=) bytes arrived;
+    it is then processed like /upload when ?process=editvideos is given.
+    """
+    try:
+        offset = int(request.headers.get('Upload-Offset', request.args.get('offset', 0)))
+        total = request.headers.get('Upload-Length', request.args.get('total'))
+        status = write_chunk(request.stream, UPLOAD_FOLDER, filename, offset,
+                             int(total) if total else None)
+    except OffsetMismatch as e:
+        return jsonify({"error": str(e), "offset": e.expected}), 409
+    except (UploadError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    if status["complete"]:
+        status.update(after_upload(status["path"], request.args))
+    response = jsonify(status)
+    response.headers['Upload-Offset'] = str(status["offset"])
+    return response
+
+@app.route('/video/<path:filename>')
 def serve_video(filename):
-    return send_from_directory(directory='.', path=filename)
+    """
+    Range requests get 206 partial content and If-None-Match/If-Modified-Since get 304,
+    so scrubbing in the player only fetches what it needs. The body goes out through
+    the WSGI server's file wrapper (sendfile where supported) or X-Sendfile.
+    """
+    return send_from_directory(directory='.', path=filename, conditional=True, etag=True)
+
+# HLS packaging jobs in flight, by package key, so repeated previews don't queue duplicates
+hls_pending = {}
+
+@app.route('/preview/<path:filename>')
+def preview_video(filename):
+    """
+    Where to play a finished render from. With ?hls=1 the render is packaged as HLS
+    by a background job: until the playlist exists the answer is 202 with the job id
+    and the playlist URL it will have, and the client plays the mp4 meanwhile.
+    """
+    path = safe_join('.', filename)
+    if not path or not os.path.isfile(path):
+        return jsonify({"error": "not found"}), 404
+    info = {"video": f"/video/{filename}", "hls": None}
+    if request.args.get('hls') != '1':
+        return jsonify(info)
+
+    key = hls_key(path)
+    info["hls"] = f"/hls/{key}/{PLAYLIST_NAME}"
+    if hls_playlist(path):
+        hls_pending.pop(key, None)
+        return jsonify(info)
+    job = jobs.get(hls_pending.get(key, ""))
+    if job and job["state"] == "failed":
+        hls_pending.pop(key, None)
+        return jsonify(dict(info, hls=None, hls_error=job["error"] or "packaging failed"))
+    if not job or job["state"] == "done":
+        try:
+            hls_pending[key] = jobs.submit("hls", package_hls, dict(video_path=path))
+        except QueueFull as e:
+            return jsonify(dict(info, hls=None, hls_error=f"Busy: {str(e)}"))
+    job_id = hls_pending[key]
+    return jsonify(dict(info, hls_ready=False, job_id=job_id, status_url=f"/jobs/{job_id}")), 202
+
+@app.route('/hls/<key>/<name>')
+def serve_hls(key, name):
+    mimetype = 'application/vnd.apple.mpegurl' if name.endswith('.m3u8') else 'video/mp2t'
+    return send_from_directory(os.path.join(HLS_DIR, key), name, mimetype=mimetype, conditional=True)
 
 # 
 @app.route('/editvideos', methods=['POST'])
 def run_video_editor():
     try:
         print("Processing request...run edit videos")
-        orientation = request.form.get('orientation', 'auto')
-        add_music = True
-        bg_music_folder = request.form.get('bgmusic')
-        if bg_music_folder == 'none':
-            add_music = False
-        topcut = request.form.get('topcut',0)
-        if topcut == '':
-            topcut = 0
-
-        bottomcut = request.form.get('bottomcut',0)
-        if bottomcut == '':
-            bottomcut = 0
-
-        slowfactor = request.form.get('slowfactor',0)
-        if slowfactor == '':
-            slowfactor = 0
-
-        slow_down = True
-        if slowfactor == 0:
-            slow_down = False
-
-        add_watermark = True
-
-        watermarkposition = request.form.get('watermarkposition','bottom-left')
-        if watermarkposition == "none":
-            add_watermark = False
-
-        batch_process(
+        output_folder, preview = output_folder_for(request.form)
+        return submit_job("editvideos", batch_process,
             input_folder="edit_vid_input",
-            output_folder="edit_vid_output",
-            bg_music_folder="god_bg",
-            remove_top=float(topcut),
-            remove_bottom=float(bottomcut),
-            add_music=add_music,
-            slow_down=slow_down,
-            slow_down_factor=float(slowfactor),
-            target_orientation=orientation, 
-            add_watermark=add_watermark,
-            watermark_path="logo.png",
-            watermark_position=watermarkposition,
-            watermark_scale=0.15
+            output_folder=output_folder,
+            max_workers=file_workers,
+            preview=preview,
+            consume_inputs=True,    # inputs are removed once their output was verified
+            **edit_video_params(request.form)
         )
-        return "✅ Videos Processed successfully!", 200
     except Exception as e:
         return f"❌ Error: {str(e)}", 500    
 # ------------------------ MAIN ------------------------ #
@@ -135,15 +340,19 @@ def add_overlays():
         add_sparkle_overlay = request.form.get('add_sparkles', 'no') == 'yes'
         overlay_position = (0, 0)  # Default position, can be modified as needed
 
+        output_folder, preview = output_folder_for(request.form)
+
         from add_overlays import add_gif_overlays_to_videos
-        add_gif_overlays_to_videos(
+        return submit_job("addoverlays", add_gif_overlays_to_videos,
             input_folder="edit_vid_input",
-            output_folder="edit_vid_output",
+            output_folder=output_folder,
             add_petal_overlay=add_petal_overlay,
             add_sparkle_overlay=add_sparkle_overlay,
-            overlay_position=overlay_position
+            overlay_position=overlay_position,
+            max_workers=file_workers,
+            preview=preview,
+            consume_inputs=True
         )
-        return "✅ Overlays added successfully!", 200
     except Exception as e:
         return f"❌ Error: {str(e)}", 500  
 
@@ -156,29 +365,55 @@ def multiply_video():
             repeat_factor = 1
 
         from multiply_video import multiply_videos
-        multiply_videos(
+        return submit_job("multiplyvideo", multiply_videos,
             input_folder="edit_vid_input",
             output_folder="edit_vid_output",
-            repeat_factor=int(repeat_factor)
+            repeat_factor=int(repeat_factor),
+            max_workers=file_workers,
+            mode=request.form.get('mode', 'auto'),  # auto = stream copy when safe
+            consume_inputs=True
         )
-        return "✅ Video multiplied successfully!", 200
     except Exception as e:
         return f"❌ Error: {str(e)}", 500  
 
+@app.route('/renderpipeline', methods=['POST'])
+def render_pipeline_route():
+    try:
+        print("Processing request...render pipeline")
+        # steps come as a JSON body {"steps": [...]} or a form field holding the JSON list
+        if request.is_json:
+            steps = request.get_json().get('steps', [])
+        else:
+            steps = json.loads(request.form.get('steps', '[]'))
+
+        from render_pipeline import batch_render
+        return submit_job("renderpipeline", batch_render,
+            input_folder="edit_vid_input",
+            output_folder="edit_vid_output",
+            steps=steps,
+            max_workers=file_workers,
+            consume_inputs=True
+        )
+    except Exception as e:
+        return f"❌ Error: {str(e)}", 500
+
 @app.route('/makekbvideofromimages', methods=['POST'])
 def make_kb_video():
     try:
         print("Processing request...makekbvideo")
+        output_folder, preview = output_folder_for(request.form)
 
         from make_kb_videos import export_kb_videos
-        export_kb_videos(
+        return submit_job("makekbvideofromimages", export_kb_videos,
             input_folder="edit_vid_input",   # folder with images
-            out_folder="edit_vid_output",    # where to save KB clips
+            out_folder=output_folder,        # where to save KB clips
+            preview=preview,
             per_image=10,
             output_size=(1920,1080),
-            zoom_start=1.0, zoom_end=1.05
+            zoom_start=1.0, zoom_end=1.05,
+            backend=request.form.get('backend', 'moviepy'),  # "ffmpeg" renders with zoompan
+            max_workers=file_workers
         )
-        return "✅ Ken Burns videos created successfully!", 200
     except Exception as e:
         return f"❌ Error: {str(e)}", 500
 
@@ -187,7 +422,7 @@ def assemble_clips_to_make_video_song():
     try:
         print("Processing request...asseleclipstomakevideosong")
         from assemble_from_videos import assemble_videos
-        assemble_videos(
+        return submit_job("assembleclipstomakevideosong", assemble_videos,
             video_folder="edit_vid_input",                  # or "edit_vid_output" if you pre-made KB clips
             audio_folder="edit_vid_audio",
             output_path="edit_vid_output/final_video.mp4",
@@ -195,7 +430,6 @@ def assemble_clips_to_make_video_song():
             shuffle=True,                                   # different order each run
             prefer_ffmpeg_concat=True                       # auto-uses concat if safe; else MoviePy
         )
-        return "✅ Video song assembled successfully!", 200
     except Exception as e:
         return f"❌ Error: {str(e)}", 500
     
@@ -0,0 +1,94 @@
+# streaming_concat.py
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from moviepy.editor import VideoClip, VideoFileClip
+
+from media_probe import probe
+
+MAX_OPEN_CLIPS = 2
+
+# --------------------------
+# Streaming concatenation for the MoviePy path
+# --------------------------
+class StreamingConcatClip(VideoClip):
+    """
+    Plays `entries` [(path, use_duration), ...] back to back, like
+    concatenate_videoclips(), but opens a VideoFileClip (one ffmpeg reader each)
+    only when its time range is reached and keeps at most `max_open` of them,
+    closing the least recently used one first.
+
+    When every clip already has the output size, frames are passed through as-is
+    (the "chain" fast path); otherwise each frame is centered on a black canvas
+    of the largest size, which is what method="compose" does.
+    """
+
+    def __init__(self, entries: Sequence[Tuple[str, float]], max_open: int = MAX_OPEN_CLIPS):
+        self.entries = [(p, float(d)) for p, d in entries if d > 0]
+        if not self.entries:
+            raise ValueError("StreamingConcatClip needs at least one non-empty entry")
+        self.starts: List[float] = []
+        total = 0.0
+        for _, d in self.entries:
+            self.starts.append(total)
+            total += d
+        self.max_open = max(1, int(max_open))
+        self._readers: "OrderedDict[str, VideoFileClip]" = OrderedDict()
+
+        sizes = {clip_size(p) for p, _ in self.entries}
+        sizes.discard(None)
+        self.chain = len(sizes) <= 1
+        if sizes:
+            size = (max(w for w, _ in sizes), max(h for _, h in sizes))
+        else:
+            size = tuple(self._reader(self.entries[0][0]).size)
+        self.size = size   # VideoClip.__init__ renders frame 0, which needs it
+        VideoClip.__init__(self, make_frame=self._make_frame, duration=total)
+        self.size = size
+
+    def _reader(self, path: str) -> VideoFileClip:
+        clip = self._readers.get(path)
+        if clip is not None:
+            self._readers.move_to_end(path)
+            return clip
+        while len(self._readers) >= self.max_open:
+            _, old = self._readers.popitem(last=False)
+            old.close()
+        clip = VideoFileClip(path, audio=False)
+        self._readers[path] = clip
+        return clip
+
+    def _make_frame(self, t: float) -> np.ndarray:
+        i = max(0, min(bisect_right(self.starts, t) - 1, len(self.entries) - 1))
+        path, use_d = self.entries[i]
+        clip = self._reader(path)
+        # stay inside the clip; its last frame sits one frame before clip.duration
+        last = max(0.0, (clip.duration or use_d) - 1.0 / (clip.fps or 30))
+        frame = clip.get_frame(min(t - self.starts[i], use_d, last))
+        if self.chain or tuple(clip.size) == tuple(self.size):
+            return frame
+        return _center_on_canvas(frame, self.size)
+
+    def close(self):
+        while self._readers:
+            _, clip = self._readers.popitem()
+            try: clip.close()
+            except Exception: pass
+
+def clip_size(path: str) -> Optional[Tuple[int, int]]:
+    """Frame size from the cached probe, None if unknown."""
+    info = probe(path)
+    w, h = info.get("width"), info.get("height")
+    if not w or not h:
+        return None
+    return int(w), int(h)
+
+def _center_on_canvas(frame: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+    W, H = size
+    h, w = frame.shape[:2]
+    canvas = np.zeros((H, W, 3), dtype=frame.dtype)
+    x, y = max(0, (W - w) // 2), max(0, (H - h) // 2)
+    canvas[y:y + min(h, H), x:x + min(w, W)] = frame[:H, :W, :3]
+    return canvas
@@ -0,0 +1,28 @@
+# tests/conftest.py
+import os, shutil, subprocess, sys, tempfile
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+# Keep probe/render caches of the test runs out of the working copy
+os.environ.setdefault("VIDEO_EDITOR_CACHE", tempfile.mkdtemp(prefix="video_editor_cache_"))
+
+requires_ffmpeg = pytest.mark.skipif(
+    not (shutil.which("ffmpeg") and shutil.which("ffprobe")), reason="needs ffmpeg and ffprobe"
+)
+
+def ffmpeg(*args):
+    subprocess.run(["ffmpeg", "-y", "-v", "error", *args], check=True)
+
+def decode_errors(path):
+    """Everything ffmpeg reports while decoding every frame of `path` (empty = clean)."""
+    r = subprocess.run(["ffmpeg", "-v", "error", "-i", path, "-f", "null", "-"],
+                       capture_output=True, text=True)
+    return r.stderr.strip() if r.returncode == 0 else f"exit {r.returncode}: {r.stderr.strip()}"
+
+def ffprobe_value(path, entry, stream="v:0"):
+    return subprocess.check_output([
+        "ffprobe", "-v", "error", "-select_streams", stream,
+        "-show_entries", entry, "-of", "default=noprint_wrappers=1:nokey=1", path
+    ], text=True).strip()
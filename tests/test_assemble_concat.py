@@ -0,0 +1,42 @@
+# tests/test_assemble_concat.py
+import pytest
+
+from conftest import decode_errors, ffmpeg, ffprobe_value, requires_ffmpeg
+
+pytest.importorskip("moviepy.editor")
+from assemble_from_videos import _concat_copy, _normalize_clips  # noqa: E402
+
+def _clip(path, seconds, *x264_args):
+    ffmpeg("-f", "lavfi", "-i", f"testsrc2=size=320x240:rate=30:duration={seconds}",
+           "-c:v", "libx264", "-pix_fmt", "yuv420p", *x264_args, path)
+    return path
+
+@requires_ffmpeg
+def test_smart_cut_join_decodes_cleanly(tmp_path):
+    # Two encoder configurations -> different SPS/PPS in each file's avcC
+    a = _clip(str(tmp_path / "a.mp4"), 3, "-profile:v", "high", "-crf", "18")
+    b = _clip(str(tmp_path / "b.mp4"), 3, "-profile:v", "main", "-crf", "35", "-bf", "0", "-g", "15")
+    plan = [(a, 3.0, 3.0), (b, 3.0, 3.0), (a, 3.0, 1.5)]   # last clip is smart-cut
+
+    out = _concat_copy(plan, str(tmp_path / "joined.mp4"), str(tmp_path))
+
+    assert decode_errors(out) == ""
+    duration = float(ffprobe_value(out, "stream=duration"))
+    assert duration == pytest.approx(7.5, abs=0.1)
+    assert ffprobe_value(out, "stream=time_base") == ffprobe_value(a, "stream=time_base")
+
+@requires_ffmpeg
+def test_normalized_clip_joins_cleanly_with_majority(tmp_path):
+    a = _clip(str(tmp_path / "a.mp4"), 2, "-crf", "18")
+    b = _clip(str(tmp_path / "b.mp4"), 2, "-crf", "18")
+    odd = str(tmp_path / "odd.mp4")
+    ffmpeg("-f", "lavfi", "-i", "testsrc2=size=640x360:rate=25:duration=2",
+           "-c:v", "libx264", "-profile:v", "baseline", "-pix_fmt", "yuv420p", odd)
+
+    mapping = _normalize_clips([a, b, odd], max_workers=1)
+    assert mapping[a] == a and mapping[odd] != odd
+    plan = [(a, 2.0, 2.0), (mapping[odd], 2.0, 2.0), (b, 2.0, 2.0)]
+    out = _concat_copy(plan, str(tmp_path / "joined.mp4"), str(tmp_path))
+
+    assert decode_errors(out) == ""
+    assert float(ffprobe_value(out, "stream=duration")) == pytest.approx(6.0, abs=0.1)
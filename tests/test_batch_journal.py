@@ -0,0 +1,74 @@
+# tests/test_batch_journal.py
+import os
+
+import pytest
+
+import batch_journal
+from batch_journal import BatchJournal, run_journaled
+
+def _fake_probe(path):
+    # "good" files probe as a video, anything else as unreadable
+    with open(path, "rb") as f:
+        good = f.read() == b"good"
+    return {"codec_name": "h264", "width": 320, "duration": 2.0} if good else {}
+
+def _interrupted_batch(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_journal, "probe", _fake_probe)
+    src, out = tmp_path / "in", tmp_path / "out"
+    src.mkdir(); out.mkdir()
+    for name in ("a.mp4", "b.mp4", "c.mp4"):
+        (src / name).write_bytes(b"input")
+    journal = BatchJournal(str(out), "test", {})
+    journal.start(lambda folder: None)
+    journal.mark_done(str(src / "a.mp4"), str(out / "a.mp4"))
+    (out / "a.mp4").write_bytes(b"good")
+    # b was renamed into place but the run died before journaling it; c is truncated
+    (out / "b.mp4").write_bytes(b"good")
+    (out / "c.mp4").write_bytes(b"trunc")
+    (out / ".c.partial.mp4").write_bytes(b"half")
+    return src, out
+
+def test_resume_verifies_unjournaled_outputs(tmp_path, monkeypatch):
+    src, out = _interrupted_batch(tmp_path, monkeypatch)
+
+    journal = BatchJournal(str(out), "test", {})
+    assert journal.resumed
+    journal.start(lambda folder: None)
+
+    assert sorted(os.listdir(out)) == [".batch_journal.json", "a.mp4", "b.mp4"]
+
+def test_resume_redoes_journaled_output_that_went_bad(tmp_path, monkeypatch):
+    src, out = _interrupted_batch(tmp_path, monkeypatch)
+    (out / "a.mp4").write_bytes(b"")
+
+    journal = BatchJournal(str(out), "test", {})
+    journal.start(lambda folder: None)
+    rendered = []
+
+    def worker(input_path, output_path):
+        rendered.append(os.path.basename(input_path))
+        with open(output_path, "wb") as f:
+            f.write(b"good")
+        return output_path
+
+    jobs = [{"name": n, "kwargs": dict(input_path=str(src / n), output_path=str(out / n))}
+            for n in ("a.mp4", "c.mp4")]
+    results = run_journaled(jobs, worker, journal)
+    assert all(r["ok"] for r in results)
+    assert sorted(rendered) == ["a.mp4", "c.mp4"]
+
+def test_truncated_render_is_not_committed(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_journal, "probe", _fake_probe)   # every "good" file is 2.0s
+    src, out = tmp_path / "a.mp4", tmp_path / "out.mp4"
+    src.write_bytes(b"input")
+
+    def render(tmp):
+        with open(tmp, "wb") as f:
+            f.write(b"good")
+
+    with pytest.raises(RuntimeError, match="failed verification"):
+        batch_journal.render_and_commit(render, str(src), str(out), expected_duration=4.0, consume_input=True)
+    assert sorted(os.listdir(tmp_path)) == ["a.mp4"]
+
+    batch_journal.render_and_commit(render, str(src), str(out), expected_duration=2.05, consume_input=True)
+    assert sorted(os.listdir(tmp_path)) == ["out.mp4"]
@@ -0,0 +1,40 @@
+# tests/test_hls_packager.py
+import os
+
+import hls_packager
+
+def _setup(tmp_path, monkeypatch, on_run=None):
+    monkeypatch.setattr(hls_packager, "HLS_DIR", str(tmp_path))
+    monkeypatch.setattr(hls_packager, "hls_key", lambda path: "clip_abc")
+    monkeypatch.setattr(hls_packager, "_codec_args", lambda path: [])
+
+    def fake_run_ffmpeg(cmd, **kwargs):
+        with open(cmd[-1], "w") as f:
+            f.write("#EXTM3U\n")
+        if on_run:
+            on_run()
+
+    monkeypatch.setattr(hls_packager, "run_ffmpeg", fake_run_ffmpeg)
+
+def test_other_packagers_temp_folder_is_left_alone(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    other = tmp_path / "clip_abc.other.tmp"
+    other.mkdir()
+    (other / "seg_0000.ts").write_bytes(b"ts")
+
+    playlist = hls_packager.package_hls("clip.mp4")
+
+    assert playlist == str(tmp_path / "clip_abc" / hls_packager.PLAYLIST_NAME)
+    assert (other / "seg_0000.ts").exists()
+
+def test_package_published_by_another_process_wins(tmp_path, monkeypatch):
+    def publish_first():
+        os.makedirs(tmp_path / "clip_abc")
+        (tmp_path / "clip_abc" / hls_packager.PLAYLIST_NAME).write_text("#EXTM3U\n")
+        (tmp_path / "clip_abc" / "seg_0000.ts").write_bytes(b"ts")
+
+    _setup(tmp_path, monkeypatch, on_run=publish_first)
+    playlist = hls_packager.package_hls("clip.mp4")
+
+    assert os.path.exists(playlist)
+    assert sorted(os.listdir(tmp_path)) == ["clip_abc"]
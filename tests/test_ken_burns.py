@@ -0,0 +1,82 @@
+# tests/test_ken_burns.py
+import subprocess
+
+import pytest
+
+from conftest import requires_ffmpeg
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+pytest.importorskip("moviepy.editor")
+from make_kb_videos import ken_burns_clip, ken_burns_ffmpeg  # noqa: E402
+
+W, H, FPS, DURATION = 320, 180, 10, 2.0
+IMG_W, IMG_H = 1280, 960                    # 4:3 -> covers the 16:9 canvas at 320x240
+MARKERS = ((0.3, 0.4), (0.7, 0.6))          # marker centres as fractions of the image
+ZOOM_START, ZOOM_END, OVERSCAN = 1.05, 1.15, 1.01
+# Both backends must place each marker within POS_TOL px of where pos_at/scale_at
+# put it, and the marker spacing (i.e. the scale) must match within SCALE_TOL.
+POS_TOL = 1.5
+SCALE_TOL = 0.01
+
+def _synthetic_image(path):
+    img = np.full((IMG_H, IMG_W, 3), 40, np.uint8)
+    r = 24
+    for u, v in MARKERS:
+        cx, cy = int(u * IMG_W), int(v * IMG_H)
+        img[cy - r:cy + r, cx - r:cx + r] = 255
+    Image.fromarray(img).save(path)
+    return path
+
+def _expected(pan, t):
+    """Marker centres on the canvas at time t, from the same math as ken_burns_clip."""
+    bw, bh = W, W * IMG_H / IMG_W
+    z0, z1 = (ZOOM_END, ZOOM_START) if pan == "out" else (ZOOM_START, ZOOM_END)
+    p = t / DURATION
+    s = (z0 + (z1 - z0) * p) * OVERSCAN
+    ox, oy = max(0, bw * s - W), max(0, bh * s - H)
+    fx, fy = {"left": (p, 0), "right": (1 - p, 0), "up": (0, p), "down": (0, 1 - p),
+              "in": (0.6 * p, 0.6 * p), "out": (0.6 * (1 - p), 0.6 * (1 - p))}[pan]
+    return [(-ox * fx + u * bw * s, -oy * fy + v * bh * s) for u, v in MARKERS]
+
+def _centroids(frame):
+    """Centre of the bright marker in the left and in the right half of the frame."""
+    lum = frame.astype(float).mean(axis=2)
+    mask = np.where(lum > 150, lum - 40, 0.0)
+    ys, xs = np.mgrid[0:frame.shape[0], 0:frame.shape[1]]
+    out = []
+    for half in (xs < W / 2, xs >= W / 2):
+        m = mask * half
+        out.append(((m * xs).sum() / m.sum(), (m * ys).sum() / m.sum()))
+    return out
+
+def _decode(path):
+    raw = subprocess.check_output(["ffmpeg", "-v", "error", "-i", path,
+                                   "-f", "rawvideo", "-pix_fmt", "rgb24", "-"])
+    return np.frombuffer(raw, np.uint8).reshape(-1, H, W, 3)
+
+def _assert_close(found, expected, what):
+    for (fx, fy), (ex, ey) in zip(found, expected):
+        err = max(abs(fx - ex), abs(fy - ey))
+        assert err <= POS_TOL, f"{what}: marker off by {err:.2f}px ({fx:.1f},{fy:.1f}) vs ({ex:.1f},{ey:.1f})"
+    spacing = lambda a, b: ((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2) ** 0.5
+    ratio = spacing(*found) / spacing(*expected)
+    assert abs(ratio - 1) <= SCALE_TOL, f"{what}: scale off by {100 * (ratio - 1):.2f}%"
+
+@requires_ffmpeg
+@pytest.mark.parametrize("pan", ["left", "right", "up", "down", "in", "out"])
+def test_backends_follow_the_same_motion(tmp_path, pan):
+    img = _synthetic_image(str(tmp_path / "markers.png"))
+    clip = ken_burns_clip(img, DURATION, size=(W, H), zoom_start=ZOOM_START,
+                          zoom_end=ZOOM_END, pan=pan, overscan=OVERSCAN)
+    out = ken_burns_ffmpeg(img, str(tmp_path / "kb.mp4"), DURATION, size=(W, H),
+                           zoom_start=ZOOM_START, zoom_end=ZOOM_END, pan=pan,
+                           overscan=OVERSCAN, fps=FPS)
+    frames = _decode(out)
+    assert len(frames) == int(DURATION * FPS)
+
+    for n in (0, 5, 10, 15, len(frames) - 1):
+        t = n / FPS
+        expected = _expected(pan, t)
+        _assert_close(_centroids(clip.get_frame(t)), expected, f"moviepy {pan} t={t}")
+        _assert_close(_centroids(frames[n]), expected, f"ffmpeg {pan} t={t}")
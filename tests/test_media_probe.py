@@ -0,0 +1,50 @@
+# tests/test_media_probe.py
+import json, multiprocessing
+
+import media_probe
+
+def _digest_all(paths):
+    for p in paths:
+        media_probe.file_digest(p)
+
+def test_concurrent_processes_keep_every_entry(tmp_path, monkeypatch):
+    monkeypatch.setattr(media_probe, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(media_probe, "PROBE_CACHE_PATH", str(tmp_path / "probe_cache.json"))
+    monkeypatch.setattr(media_probe, "_cache", None)
+    groups = []
+    for g in range(4):
+        paths = []
+        for i in range(25):
+            p = tmp_path / f"f{g}_{i}.bin"
+            p.write_bytes(f"{g}-{i}".encode())
+            paths.append(str(p))
+        groups.append(paths)
+
+    procs = [multiprocessing.Process(target=_digest_all, args=(paths,)) for paths in groups]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0
+
+    with open(tmp_path / "probe_cache.json") as f:
+        cache = json.load(f)
+    assert all(cache.get(p, {}).get("sha256") for paths in groups for p in paths)
+
+def test_temp_paths_are_not_cached_and_missing_files_are_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr(media_probe, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(media_probe, "PROBE_CACHE_PATH", str(tmp_path / "probe_cache.json"))
+    monkeypatch.setattr(media_probe, "_cache", None)
+    kept, gone, partial = tmp_path / "kept.mp4", tmp_path / "gone.mp4", tmp_path / ".out.partial.mp4"
+    for p in (kept, gone, partial):
+        p.write_bytes(p.name.encode())
+        media_probe.file_digest(str(p))
+    gone.unlink()
+    media_probe.file_digest(str(kept))   # cached: no store, nothing pruned yet
+    new = tmp_path / "new.mp4"
+    new.write_bytes(b"new")
+    media_probe.file_digest(str(new))
+
+    with open(tmp_path / "probe_cache.json") as f:
+        cache = json.load(f)
+    assert sorted(cache) == [str(kept), str(new)]
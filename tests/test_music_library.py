@@ -0,0 +1,21 @@
+# tests/test_music_library.py
+import multiprocessing
+
+import music_library
+
+def _add_entries(first, count):
+    for i in range(first, first + count):
+        music_library._update_index(lambda index: index.__setitem__(f"digest{i}", {"loudnorm": i}))
+
+def test_concurrent_processes_keep_every_index_entry(tmp_path, monkeypatch):
+    monkeypatch.setattr(music_library, "MUSIC_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(music_library, "MUSIC_INDEX_PATH", str(tmp_path / "index.json"))
+    procs = [multiprocessing.Process(target=_add_entries, args=(g * 20, 20)) for g in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0
+
+    index = music_library._load()
+    assert sorted(index) == sorted(f"digest{i}" for i in range(80))
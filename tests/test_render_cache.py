@@ -0,0 +1,40 @@
+# tests/test_render_cache.py
+import os
+
+import render_cache
+
+def _cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(render_cache, "RENDER_CACHE_DIR", str(tmp_path / "renders"))
+    out = tmp_path / "out"
+    out.mkdir()
+    return out
+
+def test_fetch_leaves_output_mtime_alone(tmp_path, monkeypatch):
+    out = _cache(tmp_path, monkeypatch)
+    first = out / "a.mp4"
+    first.write_bytes(b"render")
+    os.utime(first, (1_000_000, 1_000_000))
+    render_cache.store("ab" * 32, str(first))
+    os.utime(first, (1_000_000, 1_000_000))   # store may hardlink, so reset once more
+
+    assert render_cache.fetch("ab" * 32, str(out / "b.mp4"))
+
+    assert os.stat(first).st_mtime == 1_000_000
+    assert os.stat(out / "b.mp4").st_mtime == 1_000_000
+
+def test_evict_drops_least_recently_fetched(tmp_path, monkeypatch):
+    out = _cache(tmp_path, monkeypatch)
+    keys = ["aa" * 32, "bb" * 32]
+    for key in keys:
+        src = out / f"{key[:2]}.mp4"
+        src.write_bytes(b"x" * 100)
+        render_cache.store(key, str(src))
+    for key, used in zip(keys, (2_000_000, 1_000_000)):
+        marker = render_cache._entry_path(key, ".mp4") + render_cache.USED_SUFFIX
+        os.utime(marker, (used, used))
+
+    render_cache.evict(max_bytes=150)
+
+    assert os.path.exists(render_cache._entry_path(keys[0], ".mp4"))
+    assert not os.path.exists(render_cache._entry_path(keys[1], ".mp4"))
+    assert not os.path.exists(render_cache._entry_path(keys[1], ".mp4") + render_cache.USED_SUFFIX)
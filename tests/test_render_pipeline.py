@@ -0,0 +1,32 @@
+# tests/test_render_pipeline.py
+import render_pipeline
+
+def _compile(monkeypatch, tmp_path, steps, size=(1920, 1080)):
+    petals, sparkles = tmp_path / "petals.gif", tmp_path / "sparkles.gif"
+    petals.write_bytes(b"GIF89a")
+    sparkles.write_bytes(b"GIF89a")
+    monkeypatch.setattr(render_pipeline, "PETAL_GIF_PATH", str(petals))
+    monkeypatch.setattr(render_pipeline, "SPARKLE_GIF_PATH", str(sparkles))
+    monkeypatch.setattr(render_pipeline, "probe", lambda path: {"width": size[0], "height": size[1]})
+    requested = []
+
+    def fake_overlay_input_args(path, width, height):
+        requested.append((width, height))
+        return ['-i', f"{path}_{width}x{height}.webm"]
+
+    monkeypatch.setattr(render_pipeline, "overlay_input_args", fake_overlay_input_args)
+    cmd = render_pipeline.compile_pipeline("in.mp4", str(tmp_path / "out.mp4"), steps)
+    return cmd, requested
+
+def test_overlays_after_crop_use_cropped_frame_size(monkeypatch, tmp_path):
+    steps = [
+        {"op": "crop", "remove_top": 60, "remove_bottom": 20, "orientation": "landscape"},
+        {"op": "overlays", "petals": True, "sparkles": True},
+    ]
+    cmd, requested = _compile(monkeypatch, tmp_path, steps)
+    assert requested == [(1920, 1000), (1920, 1000)]
+    assert "crop=1920:1000:0:60" in cmd[cmd.index('-filter_complex') + 1]
+
+def test_overlays_without_crop_use_input_size(monkeypatch, tmp_path):
+    _, requested = _compile(monkeypatch, tmp_path, [{"op": "overlays", "petals": True, "sparkles": False}])
+    assert requested == [(1920, 1080)]
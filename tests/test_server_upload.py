@@ -0,0 +1,21 @@
+# tests/test_server_upload.py
+import server
+
+def _submitted(monkeypatch, values):
+    calls = []
+    monkeypatch.setattr(server.jobs, "submit", lambda name, fn, kwargs: calls.append(kwargs) or "job1")
+    info = server.after_upload("edit_vid_input/a.mp4", dict(values, process="editvideos"))
+    assert info["job_id"] == "job1"
+    return calls[0]
+
+def test_preview_upload_renders_proxy_and_keeps_input(monkeypatch):
+    kwargs = _submitted(monkeypatch, {"preview": "yes"})
+    assert kwargs["preview"] is True
+    assert kwargs["consume_input"] is False
+    assert kwargs["output_folder"] == server.PREVIEW_FOLDER
+
+def test_final_upload_consumes_input(monkeypatch):
+    kwargs = _submitted(monkeypatch, {"preview": "no"})
+    assert kwargs["preview"] is False
+    assert kwargs["consume_input"] is True
+    assert kwargs["output_folder"] == "edit_vid_output"
@@ -0,0 +1,36 @@
+# tests/test_watermark_assets.py
+import os
+
+import pytest
+
+import watermark_assets
+
+def test_each_writer_gets_its_own_temp_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(watermark_assets, "WATERMARK_CACHE_DIR", str(tmp_path))
+    written = []
+
+    def fake_run_ffmpeg(cmd, **kwargs):
+        written.append(cmd[-1])
+        with open(cmd[-1], "wb") as f:
+            f.write(b"png")
+
+    monkeypatch.setattr(watermark_assets, "run_ffmpeg", fake_run_ffmpeg)
+    out = str(tmp_path / "logo_64x32.png")
+    watermark_assets._rasterize("logo.png", out, 64, 32, False)
+    watermark_assets._rasterize("logo.png", out, 64, 32, False)
+
+    assert written[0] != written[1]
+    assert os.listdir(tmp_path) == ["logo_64x32.png"]
+
+def test_failed_render_leaves_no_temp_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(watermark_assets, "WATERMARK_CACHE_DIR", str(tmp_path))
+
+    def failing_run_ffmpeg(cmd, **kwargs):
+        with open(cmd[-1], "wb") as f:
+            f.write(b"partial")
+        raise RuntimeError("ffmpeg failed")
+
+    monkeypatch.setattr(watermark_assets, "run_ffmpeg", failing_run_ffmpeg)
+    with pytest.raises(RuntimeError):
+        watermark_assets._rasterize("logo.png", str(tmp_path / "logo_64x32.png"), 64, 32, False)
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,47 @@
+# tests/test_work_queue.py
+import os, threading, time
+
+import work_queue
+
+def slow_job(marker, seconds=1.5):
+    time.sleep(seconds)
+    with open(marker, "w") as f:
+        f.write("done")
+    return marker
+
+def _claimed(tmp_path, monkeypatch, **kwargs):
+    monkeypatch.setitem(work_queue.JOB_TYPES, "slow", f"{__name__}:slow_job")
+    db = str(tmp_path / "queue.sqlite3")
+    job_id = work_queue.submit("slow", kwargs, db_path=db)
+    conn = work_queue.connect(db)
+    job = work_queue.claim(conn, "w1")
+    conn.close()
+    assert job["id"] == job_id
+    return db, job
+
+def test_job_records_result(tmp_path, monkeypatch):
+    marker = str(tmp_path / "marker")
+    db, job = _claimed(tmp_path, monkeypatch, marker=marker, seconds=0.2)
+    work_queue.run_job(job, "w1", db_path=db, interval=0.1)
+    done = work_queue.get(job["id"], db_path=db)
+    assert done["state"] == "done" and done["outputs"] == [marker]
+
+def test_lost_lease_stops_the_job(tmp_path, monkeypatch):
+    marker = str(tmp_path / "marker")
+    db, job = _claimed(tmp_path, monkeypatch, marker=marker)
+
+    def steal():
+        time.sleep(0.3)
+        conn = work_queue.connect(db)
+        conn.execute("UPDATE jobs SET worker = 'w2' WHERE id = ?", (job["id"],))
+        conn.close()
+
+    threading.Thread(target=steal).start()
+    started = time.time()
+    work_queue.run_job(job, "w1", db_path=db, interval=0.1)
+
+    assert time.time() - started < 1.2
+    time.sleep(2.0)
+    assert not os.path.exists(marker)           # the child never got to write its output
+    stolen = work_queue.get(job["id"], db_path=db)
+    assert stolen["state"] == "running" and stolen["worker"] == "w2"
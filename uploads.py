@@ -0,0 +1,92 @@
+# uploads.py
+import os, threading, uuid
+from typing import BinaryIO, Dict, Optional
+
+from werkzeug.utils import secure_filename
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024   # bytes read from the request and written per step
+PART_SUFFIX = ".part"              # batch functions only pick up .mp4/.jpg/... so partial files are ignored
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+class UploadError(Exception):
+    """Bad upload request (unsafe name, offset that doesn't match what's on disk, ...)."""
+
+class OffsetMismatch(UploadError):
+    def __init__(self, expected: int):
+        super().__init__(f"upload offset must be {expected}")
+        self.expected = expected
+
+def _lock_for(path: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(path, threading.Lock())
+
+def safe_name(filename: str) -> str:
+    name = secure_filename(filename or "")
+    if not name:
+        raise UploadError(f"invalid file name: {filename!r}")
+    return name
+
+# --------------------------
+# Resumable uploads (PUT <name> with offsets)
+# --------------------------
+def upload_status(folder: str, filename: str) -> Dict:
+    """How much of `filename` has arrived: {name, offset, complete}."""
+    name = safe_name(filename)
+    final = os.path.join(folder, name)
+    part = final + PART_SUFFIX
+    if os.path.exists(part):
+        return {"name": name, "offset": os.path.getsize(part), "complete": False}
+    if os.path.exists(final):
+        return {"name": name, "offset": os.path.getsize(final), "complete": True}
+    return {"name": name, "offset": 0, "complete": False}
+
+def write_chunk(stream: BinaryIO, folder: str, filename: str, offset: int,
+                total: Optional[int] = None, chunk_size: int = UPLOAD_CHUNK_SIZE) -> Dict:
+    """
+    Append the request body to `<name>.part` starting at `offset`, reading at most
+    `chunk_size` bytes at a time. `offset` must equal what's already on disk, so a
+    client that lost its connection asks upload_status() and resumes from there.
+    Once `total` bytes are in, the part file is renamed to its final name.
+    """
+    name = safe_name(filename)
+    os.makedirs(folder, exist_ok=True)
+    final = os.path.join(folder, name)
+    part = final + PART_SUFFIX
+    with _lock_for(part):
+        current = os.path.getsize(part) if os.path.exists(part) else 0
+        if offset != current:
+            raise OffsetMismatch(current)
+        with open(part, "ab") as f:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                f.write(chunk)
+                current += len(chunk)
+        complete = total is not None and current >= total
+        if complete:
+            os.replace(part, final)
+    return {"name": name, "offset": current, "complete": complete, "path": final if complete else None}
+
+# --------------------------
+# Multipart uploads
+# --------------------------
+def open_part_file(folder: str) -> BinaryIO:
+    """Destination for one multipart file field; the parser writes into it as data arrives."""
+    os.makedirs(folder, exist_ok=True)
+    return open(os.path.join(folder, f".{uuid.uuid4().hex}{PART_SUFFIX}"), "w+b")
+
+def finish_part_file(part_file: BinaryIO, folder: str, filename: str) -> str:
+    """Close a multipart part file and move it to its final name."""
+    name = safe_name(filename)
+    final = os.path.join(folder, name)
+    part_file.close()
+    os.replace(part_file.name, final)
+    return final
+
+def discard_part_file(part_file: BinaryIO):
+    part_file.close()
+    if os.path.exists(part_file.name):
+        os.remove(part_file.name)
@@ -1,13 +1,26 @@
 import os
-import subprocess
 import random
+import time
+import metrics
+import render_cache
+from music_library import MUSIC_EXTENSIONS, is_copyable_aac, pick_music
+from ffmpeg_progress import run_ffmpeg
+from media_probe import probe
+from parallel_runner import run_jobs, resolve_workers, threads_per_job
+from batch_journal import BatchJournal, partial_path, render_and_commit, run_journaled
+from watermark_assets import watermark_variant
+from proxy_preview import (PREVIEW_SECONDS, PREVIEW_AUDIO_ARGS, PREVIEW_VIDEO_ARGS,
+                           preview_duration, proxy_filter, trim_args)
 
-def get_random_music(bg_music_folder):
-    music_files = [
+def music_files_in(bg_music_folder):
+    return sorted(
         os.path.join(bg_music_folder, f)
         for f in os.listdir(bg_music_folder)
-        if f.lower().endswith(('.mp3', '.wav', '.aac'))
-    ]
+        if f.lower().endswith(MUSIC_EXTENSIONS)
+    )
+
+def get_random_music(bg_music_folder):
+    music_files = music_files_in(bg_music_folder)
     return random.choice(music_files) if music_files else None
 
 def clear_folder(folder_path, extensions=None):
@@ -19,6 +32,39 @@ def clear_folder(folder_path, extensions=None):
             if not extensions or file.lower().endswith(extensions):
                 os.remove(full_path)
 
+def crop_filters(width, height, orientation, remove_top=50, remove_bottom=0):
+    """Crop (and pad back for portrait) filters used by process_video."""
+    filter_parts = []
+    if orientation == "portrait":
+        cropped_height = height - remove_top - remove_bottom
+        pad_top = (height - cropped_height) // 2
+        filter_parts.append(f"crop={width}:{cropped_height}:0:{remove_top}")
+        filter_parts.append(f"pad={width}:{height}:0:{pad_top}")
+    elif orientation == "landscape":
+        if remove_top > 0 or remove_bottom > 0:
+            cropped_height = height - remove_top - remove_bottom
+            filter_parts.append(f"crop={width}:{cropped_height}:0:{remove_top}")
+        # Could scale or pad to vertical aspect if needed
+    return filter_parts
+
+def cropped_size(width, height, orientation, remove_top=50, remove_bottom=0):
+    """Frame size after crop_filters() (portrait is padded back to its original size)."""
+    if orientation == "landscape" and (remove_top > 0 or remove_bottom > 0):
+        return width, int(height - remove_top - remove_bottom)
+    return width, height
+
+def watermark_overlay_position(watermark_position):
+    return {
+        "top-left": "5:5",
+        "top-right": f"W-w-5:5",
+        "bottom-left": f"5:H-h-5",
+        "bottom-right": f"W-w-5:H-h-5"
+    }.get(watermark_position, "W-w-5:H-h-5")
+
+def watermark_scale_filter(watermark_scale):
+    return f"scale=-1:'if(gt(ih*{watermark_scale},80),80,ih*{watermark_scale})'"
+
+@metrics.in_pipeline("process_video")
 def process_video(
     input_path,
     output_path,
@@ -32,58 +78,63 @@ def process_video(
     add_watermark=False,
     watermark_path="logo.png",
     watermark_position="bottom-right",
-    watermark_scale=0.2
+    watermark_scale=0.2,
+    watermark_premultiplied=False,
+    threads=None,
+    preview=False,
+    preview_seconds=None
 ):
     # Get video size
-    probe_cmd = [
-        'ffprobe', '-v', 'error',
-        '-select_streams', 'v:0',
-        '-show_entries', 'stream=width,height',
-        '-of', 'csv=s=x:p=0', input_path
-    ]
-    result = subprocess.run(probe_cmd, capture_output=True, text=True)
-    width, height = map(int, result.stdout.strip().split('x'))
+    with metrics.stage("probe"):
+        info = probe(input_path)
+    if not info.get("width") or not info.get("height"):
+        raise RuntimeError(f"Could not read video size: {input_path}")
+    width, height = info["width"], info["height"]
+
+    build_started = time.perf_counter()
 
     # Detect orientation
     orientation = (
         "portrait" if height > width else "landscape"
     ) if target_orientation == "auto" else target_orientation
 
-    filter_parts = []
-
-    if orientation == "portrait":
-        cropped_height = height - remove_top - remove_bottom
-        pad_top = (height - cropped_height) // 2
-        filter_parts.append(f"crop={width}:{cropped_height}:0:{remove_top}")
-        filter_parts.append(f"pad={width}:{height}:0:{pad_top}")
-    elif orientation == "landscape":
-        if remove_top > 0 or remove_bottom > 0:
-            cropped_height = height - remove_top - remove_bottom
-            filter_parts.append(f"crop={width}:{cropped_height}:0:{remove_top}")
-        # Could scale or pad to vertical aspect if needed
+    filter_parts = crop_filters(width, height, orientation, remove_top, remove_bottom)
 
     if slow_down:
         filter_parts.append(f"setpts={slow_down_factor}*PTS")
 
     base_filter = ",".join(filter_parts)
+    # Proxy scaling goes last so crop values and watermark size look as in the final render
+    proxy = proxy_filter() if preview else None
+    source = ['-i', input_path]
+    if preview:
+        source = trim_args(preview_seconds) + source
 
     # Watermark logic
     if add_watermark and watermark_path and os.path.exists(watermark_path):
-        pos = {
-            "top-left": "5:5",
-            "top-right": f"W-w-5:5",
-            "bottom-left": f"5:H-h-5",
-            "bottom-right": f"W-w-5:H-h-5"
-        }.get(watermark_position, "W-w-5:H-h-5")
+        post = ',' + proxy if proxy else ''
+        # Logo pre-scaled once per frame size/scale/position (see watermark_assets)
+        wm = watermark_variant(watermark_path, *cropped_size(width, height, orientation, remove_top, remove_bottom),
+                               scale=watermark_scale, position=watermark_position,
+                               premultiplied=watermark_premultiplied)
+        if wm:
+            filter_str = (
+                f"[0:v]{base_filter or 'null'}[v1];"
+                f"[v1][1:v]{wm['overlay']}{post}[outv]"
+            )
+            watermark_input = wm["path"]
+        else:
+            pos = watermark_overlay_position(watermark_position)
 
-        filter_str = (
-            f"[0:v]{base_filter}[v1];"
-            f"[1:v]scale=-1:'if(gt(ih*{watermark_scale},80),80,ih*{watermark_scale})'[wm];"
-            f"[v1][wm]overlay={pos}[outv]"
-        )
+            filter_str = (
+                f"[0:v]{base_filter or 'null'}[v1];"
+                f"[1:v]{watermark_scale_filter(watermark_scale)}[wm];"
+                f"[v1][wm]overlay={pos}{post}[outv]"
+            )
+            watermark_input = watermark_path
 
 
-        ffmpeg_cmd = ['ffmpeg', '-y', '-i', input_path, '-i', watermark_path]
+        ffmpeg_cmd = ['ffmpeg', '-y'] + source + ['-i', watermark_input]
         if add_music and bg_music_path:
             ffmpeg_cmd += ['-i', bg_music_path]
 
@@ -95,8 +146,8 @@ def process_video(
         else:
             ffmpeg_cmd += ['-an']
     else:
-        filter_str = base_filter
-        ffmpeg_cmd = ['ffmpeg', '-y', '-i', input_path]
+        filter_str = ",".join(filter_parts + ([proxy] if proxy else []))
+        ffmpeg_cmd = ['ffmpeg', '-y'] + source
         if add_music and bg_music_path:
             ffmpeg_cmd += ['-i', bg_music_path]
         ffmpeg_cmd += ['-filter:v', filter_str]
@@ -106,21 +157,41 @@ def process_video(
         else:
             ffmpeg_cmd += ['-an']
 
-    ffmpeg_cmd += [
-        '-shortest',
-        '-c:v', 'libx264',
-        '-preset', 'fast',
-        '-c:a', 'aac',
-        '-b:a', '192k',
-        output_path
-    ]
+    # Library music is pre-encoded AAC (see music_library), so it is copied as is
+    audio_args = ['-c:a', 'aac', '-b:a', '192k']
+    if add_music and bg_music_path and is_copyable_aac(bg_music_path):
+        audio_args = ['-c:a', 'copy']
+    elif preview:
+        audio_args = PREVIEW_AUDIO_ARGS
+
+    if preview:
+        ffmpeg_cmd += ['-shortest'] + PREVIEW_VIDEO_ARGS + audio_args
+    else:
+        ffmpeg_cmd += [
+            '-shortest',
+            '-c:v', 'libx264',
+            '-preset', 'fast',
+        ] + audio_args
+    if threads:
+        ffmpeg_cmd += ['-threads', str(threads)]
+    ffmpeg_cmd += [output_path]
+
+    metrics.record_stage("filter_build", time.perf_counter() - build_started)
 
     #DND - Needed for additional logging
     # ffmpeg_cmd += ['-loglevel', 'debug']
 
-    subprocess.run(ffmpeg_cmd)
-    print(f"✅ {orientation.upper()} Processed: {os.path.basename(output_path)}")
+    duration = info.get("duration") or 0.0
+    if preview:
+        duration = preview_duration(duration, preview_seconds) or 0.0
+    if slow_down:
+        duration *= slow_down_factor
+    # Raises CalledProcessError when ffmpeg exits non-zero
+    run_ffmpeg(ffmpeg_cmd, duration=duration or None, label=os.path.basename(input_path))
+    print(f"✅ {orientation.upper()} Processed: {os.path.basename(input_path)}")
+    return output_path
 
+@metrics.in_pipeline("process_video")
 def batch_process(
     input_folder='input',
     output_folder='output',
@@ -134,32 +205,139 @@ def batch_process(
     add_watermark=False,
     watermark_path="logo.png",
     watermark_position="bottom-right",
-    watermark_scale=0.2
+    watermark_scale=0.2,
+    watermark_premultiplied=False,
+    max_workers=1,
+    ffmpeg_threads=None,
+    use_cache=True,
+    preview=False,
+    preview_seconds=PREVIEW_SECONDS,
+    consume_inputs=False
 ):
     print("Received batch_process Arguments:", locals())
-    clear_folder(output_folder)
-    for filename in os.listdir(input_folder):
+    settings = {k: v for k, v in locals().items()
+                if k not in ("max_workers", "ffmpeg_threads", "use_cache", "consume_inputs")}
+    journal = None if preview else BatchJournal(output_folder, "batch_process", settings)
+    with metrics.stage("cleanup"):
+        if journal:
+            journal.start(clear_folder)
+        else:
+            clear_folder(output_folder)
+
+    max_workers = resolve_workers(max_workers)
+    threads = threads_per_job(max_workers, ffmpeg_threads)
+
+    plan_started = time.perf_counter()
+    jobs = []
+    for filename in sorted(os.listdir(input_folder)):
         if filename.lower().endswith(".mp4"):
             input_path = os.path.join(input_folder, filename)
             output_path = os.path.join(output_folder, f"{filename}")
-            bg_music = get_random_music(bg_music_folder) if add_music else None
 
-            process_video(
+            jobs.append({"name": filename, "kwargs": dict(
                 input_path=input_path,
                 output_path=output_path,
+                bg_music_folder=bg_music_folder,
+                use_cache=use_cache,
                 remove_top=remove_top,
                 remove_bottom=remove_bottom,
                 add_music=add_music,
                 slow_down=slow_down,
                 slow_down_factor=slow_down_factor,
-                bg_music_path=bg_music,
                 target_orientation=target_orientation,
                 add_watermark=add_watermark,
                 watermark_path=watermark_path,
                 watermark_position=watermark_position,
-                watermark_scale=watermark_scale
-            )
-            os.remove(input_path)
+                watermark_scale=watermark_scale,
+                watermark_premultiplied=watermark_premultiplied,
+                threads=threads
+            )})
+            if preview:
+                jobs[-1]["kwargs"].update(preview=True, preview_seconds=preview_seconds)
+            else:
+                jobs[-1]["kwargs"].update(consume_input=consume_inputs)
+
+    metrics.record_stage("plan", time.perf_counter() - plan_started)
+
+    if preview:
+        return run_jobs(jobs, _preview, max_workers=max_workers)
+    return run_journaled(jobs, _process_and_consume, journal, max_workers=max_workers)
+
+@metrics.in_pipeline("process_video")
+def process_file(input_path, output_folder='output', bg_music_folder='god_bg', use_cache=True,
+                 consume_input=False, preview=False, preview_seconds=PREVIEW_SECONDS, **kwargs):
+    """
+    batch_process() for a single file, without clearing the output folder.
+    Used for uploads that get processed as soon as each file has arrived.
+    With preview a proxy is rendered and the input is always kept.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    output_path = os.path.join(output_folder, os.path.basename(input_path))
+    if preview:
+        return _preview(input_path, output_path, bg_music_folder=bg_music_folder,
+                        preview=True, preview_seconds=preview_seconds, **kwargs)
+    return _process_and_consume(input_path, output_path, bg_music_folder=bg_music_folder,
+                                use_cache=use_cache, consume_input=consume_input, **kwargs)
+
+def _process_and_consume(input_path, output_path, bg_music_folder=None, use_cache=True,
+                         consume_input=False, **kwargs):
+    """
+    Render one file to a temp name, verify it and rename it into place. The
+    input is removed afterwards only with consume_input.
+    An identical earlier render (same input, settings and assets) is reused from
+    the render cache instead of running ffmpeg again.
+    """
+    key = _render_key(input_path, bg_music_folder, kwargs) if use_cache else None
+    cached = bool(key) and render_cache.fetch(key, partial_path(output_path))
+    if cached:
+        # verified against its own expected length when it was first rendered
+        print(f"♻️ Reused cached render: {os.path.basename(output_path)}")
+        bg_music = expected = None
+    else:
+        bg_music = _pick_music(input_path, bg_music_folder, kwargs)
+        expected = _output_duration(input_path, kwargs)
+        if bg_music and expected:
+            # -shortest ends the output with the track if the library had none long enough
+            expected = min(expected, probe(bg_music).get("duration") or expected)
+
+    def render(tmp_path):
+        if not cached:
+            process_video(input_path=input_path, output_path=tmp_path, bg_music_path=bg_music, **kwargs)
+
+    render_and_commit(render, input_path, output_path, expected_duration=expected,
+                      consume_input=consume_input)
+    if key and not cached:
+        render_cache.store(key, output_path)
+    return output_path
+
+def _preview(input_path, output_path, bg_music_folder=None, use_cache=True, **kwargs):
+    """Proxy render: not cached and the input is kept for the final pass."""
+    bg_music = _pick_music(input_path, bg_music_folder, kwargs)
+    process_video(input_path=input_path, output_path=output_path, bg_music_path=bg_music, **kwargs)
+    return output_path
+
+def _pick_music(input_path, bg_music_folder, kwargs):
+    """Library track at least as long as the (slowed) output, as its pre-encoded AAC."""
+    if not kwargs.get("add_music") or not bg_music_folder:
+        return None
+    return pick_music(bg_music_folder, min_duration=_output_duration(input_path, kwargs))
+
+def _output_duration(input_path, kwargs):
+    """Length of the full render: the input, stretched when it is slowed down."""
+    length = probe(input_path).get("duration") or 0.0
+    if kwargs.get("slow_down"):
+        length *= kwargs.get("slow_down_factor", 2.0)
+    return length or None
+
+def _render_key(input_path, bg_music_folder, kwargs):
+    params = {k: v for k, v in kwargs.items() if k not in ("threads", "watermark_path")}
+    assets = []
+    if kwargs.get("add_watermark"):
+        assets.append(kwargs.get("watermark_path"))
+    if kwargs.get("add_music") and bg_music_folder and os.path.isdir(bg_music_folder):
+        # The track is picked at random, so any render made with this same library is a valid hit
+        assets += music_files_in(bg_music_folder)
+    return render_cache.cache_key("process_video", input_path, params, assets)
 
 # ✅ Example usage
 if __name__ == '__main__':
@@ -203,4 +381,19 @@ if __name__ == '__main__':
 # watermark_path          : Path to the watermark image file (e.g., "logo.png")
 # watermark_position      : "top-left", "top-right", "bottom-left", "bottom-right" (default: "bottom-right")
 # watermark_scale         : Float – relative width of watermark (e.g., 0.2 = 20% of video width) (default: 0.2)
+# watermark_premultiplied : True/False – pre-multiply the cached logo's alpha so the overlay blends cheaper (default: False)
+
+# max_workers             : Number of videos encoded at the same time (default: 1 = one after another, 0/None = one per core)
+# ffmpeg_threads          : -threads passed to each ffmpeg job (default: cores split evenly between workers)
+# use_cache               : True/False – reuse identical earlier renders from .cache/renders (default: True)
+# preview                 : True/False – fast 360p/15 fps proxy render; inputs are kept (default: False)
+#                           pass output_folder=proxy_preview.PREVIEW_FOLDER to keep proxies apart
+# preview_seconds         : Only render the first N seconds of each input in preview mode (default: 10, None = all)
+# consume_inputs          : True/False – delete each input once its output was verified (default: False)
+#
+# Outputs are written as .<name>.partial.mp4, probed and renamed into place. Finished files are
+# journaled in <output_folder>/.batch_journal.json: rerunning an interrupted batch with the same
+# settings keeps the output folder and only renders what is missing or failed.
+#
+# Returns a list with one entry per file: {name, ok, result (output path), error}
 
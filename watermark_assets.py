@@ -0,0 +1,86 @@
+# watermark_assets.py
+import os, tempfile, threading
+from typing import Dict, Optional
+
+from media_probe import CACHE_DIR, file_digest, probe
+from ffmpeg_progress import run_ffmpeg
+
+WATERMARK_CACHE_DIR = os.path.join(CACHE_DIR, "watermarks")
+WATERMARK_MAX_HEIGHT = 80     # same cap as video_editor.watermark_scale_filter
+WATERMARK_MARGIN = 5
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+# --------------------------
+# Pre-scaled watermark
+# --------------------------
+def watermark_size(logo_w: int, logo_h: int, scale: float):
+    """Size watermark_scale_filter() gives the logo: height min(80, ih*scale), width keeps aspect."""
+    h = max(1, int(min(WATERMARK_MAX_HEIGHT, logo_h * scale)))
+    w = max(1, int(round(logo_w * h / logo_h)))
+    return w, h
+
+def watermark_xy(frame_w: int, frame_h: int, w: int, h: int, position: str):
+    """Numeric version of video_editor.watermark_overlay_position()."""
+    m = WATERMARK_MARGIN
+    return {
+        "top-left": (m, m),
+        "top-right": (frame_w - w - m, m),
+        "bottom-left": (m, frame_h - h - m),
+        "bottom-right": (frame_w - w - m, frame_h - h - m),
+    }.get(position, (frame_w - w - m, frame_h - h - m))
+
+def watermark_variant(src: str, frame_w: int, frame_h: int, scale: float = 0.2,
+                      position: str = "bottom-right", premultiplied: bool = False) -> Optional[Dict]:
+    """
+    The logo rasterized once at its final size as an RGBA PNG, plus where it goes
+    on a frame_w x frame_h frame: {path, x, y, overlay}. `overlay` is the filter
+    to blend it with ("overlay=x:y" or with alpha=premultiplied).
+
+    Cached under .cache/watermarks keyed by logo hash, frame size, scale and
+    position, so a batch (and later requests) scale the logo once instead of
+    inside every filter graph. None if the logo can't be read or rasterized.
+    """
+    info = probe(src)
+    if not info.get("width") or not info.get("height"):
+        return None
+    w, h = watermark_size(info["width"], info["height"], scale)
+    x, y = watermark_xy(int(frame_w), int(frame_h), w, h, position)
+    name = os.path.splitext(os.path.basename(src))[0]
+    suffix = "_pm" if premultiplied else ""
+    out_path = os.path.join(
+        WATERMARK_CACHE_DIR,
+        f"{name}_{int(frame_w)}x{int(frame_h)}_{position}_{scale}_{file_digest(src)[:16]}{suffix}.png"
+    )
+    if not os.path.exists(out_path):
+        with _lock_for(out_path):
+            if not os.path.exists(out_path):
+                try:
+                    _rasterize(src, out_path, w, h, premultiplied)
+                except Exception as e:
+                    print(f"[Info] Scaling {src} in the filter graph, pre-scaled watermark failed: {e}")
+                    return None
+    overlay = f"overlay={x}:{y}" + (":alpha=premultiplied" if premultiplied else "")
+    return {"path": out_path, "x": x, "y": y, "overlay": overlay}
+
+def _rasterize(src: str, out_path: str, w: int, h: int, premultiplied: bool):
+    os.makedirs(WATERMARK_CACHE_DIR, exist_ok=True)
+    # _lock_for only covers threads, so every writer gets its own temp file (see overlay_assets)
+    fd, tmp = tempfile.mkstemp(dir=WATERMARK_CACHE_DIR, prefix=".variant_", suffix=".png")
+    os.close(fd)
+    vf = f"scale={w}:{h}:flags=lanczos,format=rgba"
+    if premultiplied:
+        vf += ",premultiply=inplace=1"
+    cmd = ['ffmpeg', '-y', '-i', src, '-vf', vf, '-frames:v', '1', tmp]
+    print(f"🖼️ Pre-scaling watermark: {os.path.basename(out_path)}")
+    try:
+        run_ffmpeg(cmd, label=os.path.basename(out_path), stage="watermark_variant")
+        os.replace(tmp, out_path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def _lock_for(key: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
@@ -0,0 +1,295 @@
+# work_queue.py
+import argparse, importlib, json, multiprocessing, os, signal, socket, sqlite3, time, traceback, uuid
+from typing import Dict, List, Optional
+
+from media_probe import CACHE_DIR
+from job_queue import collect_outputs
+
+WORK_DB_PATH = os.environ.get("VIDEO_WORK_DB", os.path.join(CACHE_DIR, "work_queue.sqlite3"))
+LEASE_SECONDS = 60          # a job whose worker stops heartbeating is reclaimed after this
+HEARTBEAT_SECONDS = 15
+POLL_SECONDS = 2
+MAX_ATTEMPTS = 3
+
+# Job kinds -> "module:function". Imported in the worker when first used, so a
+# worker only loads MoviePy/PIL if it actually runs a job that needs them.
+JOB_TYPES = {
+    "batch_process": "video_editor:batch_process",
+    "add_gif_overlays_to_videos": "add_overlays:add_gif_overlays_to_videos",
+    "multiply_videos": "multiply_video:multiply_videos",
+    "export_kb_videos": "make_kb_videos:export_kb_videos",
+    "assemble_videos": "assemble_from_videos:assemble_videos",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id            TEXT PRIMARY KEY,
+    kind          TEXT NOT NULL,
+    kwargs        TEXT NOT NULL,
+    state         TEXT NOT NULL DEFAULT 'queued',   -- queued | running | done | failed
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    max_attempts  INTEGER NOT NULL,
+    worker        TEXT,
+    lease_expires REAL,
+    submitted_at  REAL NOT NULL,
+    started_at    REAL,
+    heartbeat_at  REAL,
+    finished_at   REAL,
+    outputs       TEXT,
+    errors        TEXT,
+    error         TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (state, submitted_at);
+"""
+
+# --------------------------
+# Database
+# --------------------------
+def connect(db_path: str = WORK_DB_PATH) -> sqlite3.Connection:
+    """
+    Connection with autocommit (transactions are opened explicitly) and a long
+    busy timeout. The default rollback journal is kept on purpose: unlike WAL it
+    also works when the database sits on a filesystem shared between hosts.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+# --------------------------
+# Producer side
+# --------------------------
+def submit(kind: str, kwargs: Optional[Dict] = None, db_path: str = WORK_DB_PATH,
+           max_attempts: int = MAX_ATTEMPTS) -> str:
+    """
+    Queue one call of a JOB_TYPES entry point. kwargs must be JSON-serializable.
+    Jobs running at the same time should get their own input/output folders,
+    since the entry points clear and consume them.
+    """
+    if kind not in JOB_TYPES:
+        raise ValueError(f"Unknown job kind {kind!r}, expected one of {sorted(JOB_TYPES)}")
+    job_id = uuid.uuid4().hex[:12]
+    conn = connect(db_path)
+    try:
+        conn.execute(
+            "INSERT INTO jobs (id, kind, kwargs, max_attempts, submitted_at) VALUES (?, ?, ?, ?, ?)",
+            (job_id, kind, json.dumps(kwargs or {}), max_attempts, time.time())
+        )
+    finally:
+        conn.close()
+    print(f"📥 Queued {kind} job {job_id}")
+    return job_id
+
+def get(job_id: str, db_path: str = WORK_DB_PATH) -> Optional[Dict]:
+    conn = connect(db_path)
+    try:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_job(row) if row else None
+    finally:
+        conn.close()
+
+def list_jobs(db_path: str = WORK_DB_PATH, state: Optional[str] = None, limit: int = 100) -> List[Dict]:
+    conn = connect(db_path)
+    try:
+        if state:
+            rows = conn.execute("SELECT * FROM jobs WHERE state = ? ORDER BY submitted_at DESC LIMIT ?",
+                                (state, limit)).fetchall()
+        else:
+            rows = conn.execute("SELECT * FROM jobs ORDER BY submitted_at DESC LIMIT ?", (limit,)).fetchall()
+        return [_row_to_job(r) for r in rows]
+    finally:
+        conn.close()
+
+# --------------------------
+# Worker side
+# --------------------------
+def claim(conn: sqlite3.Connection, worker: str, lease: float = LEASE_SECONDS) -> Optional[Dict]:
+    """
+    Atomically take the oldest queued job, or a running one whose lease ran out
+    (its worker died). BEGIN IMMEDIATE holds the write lock from the SELECT to
+    the UPDATE, so two workers can never claim the same job. Expired jobs that
+    already used up their attempts are marked failed instead.
+    """
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "UPDATE jobs SET state = 'failed', finished_at = ?, worker = NULL, "
+            "error = 'lease expired after ' || attempts || ' attempt(s)' "
+            "WHERE state = 'running' AND lease_expires < ? AND attempts >= max_attempts",
+            (now, now)
+        )
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE state = 'queued' OR (state = 'running' AND lease_expires < ?) "
+            "ORDER BY submitted_at LIMIT 1",
+            (now,)
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        if row["state"] == "running":
+            print(f"♻️ Reclaiming job {row['id']} from {row['worker']} (lease expired)")
+        conn.execute(
+            "UPDATE jobs SET state = 'running', worker = ?, attempts = attempts + 1, "
+            "lease_expires = ?, heartbeat_at = ?, started_at = ? WHERE id = ?",
+            (worker, now + lease, now, now, row["id"])
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    job = _row_to_job(row)
+    job["attempts"] += 1
+    return job
+
+def heartbeat(conn: sqlite3.Connection, job_id: str, worker: str, lease: float = LEASE_SECONDS) -> bool:
+    """Extend the lease; False if the job was reclaimed by another worker meanwhile."""
+    now = time.time()
+    cur = conn.execute(
+        "UPDATE jobs SET lease_expires = ?, heartbeat_at = ? WHERE id = ? AND worker = ? AND state = 'running'",
+        (now + lease, now, job_id, worker)
+    )
+    return cur.rowcount == 1
+
+def finish(conn: sqlite3.Connection, job_id: str, worker: str, state: str,
+           outputs=None, errors=None, error: Optional[str] = None) -> bool:
+    """Record the result, only if this worker still holds the lease."""
+    cur = conn.execute(
+        "UPDATE jobs SET state = ?, finished_at = ?, lease_expires = NULL, outputs = ?, errors = ?, error = ? "
+        "WHERE id = ? AND worker = ? AND state = 'running'",
+        (state, time.time(), json.dumps(outputs or []), json.dumps(errors or []), error, job_id, worker)
+    )
+    return cur.rowcount == 1
+
+def run_job(job: Dict, worker: str, db_path: str = WORK_DB_PATH,
+            lease: float = LEASE_SECONDS, interval: float = HEARTBEAT_SECONDS):
+    """
+    Run one claimed job in a child process and keep its lease alive meanwhile.
+    If a heartbeat finds the lease taken over, the child (and the ffmpeg
+    processes it started) is killed and nothing is recorded: the worker that
+    reclaimed the job owns its inputs and outputs now.
+    """
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    proc = multiprocessing.Process(target=_job_child, args=(job["kind"], job["kwargs"], sender),
+                                   name=f"job-{job['id']}")
+    proc.start()
+    sender.close()
+    fields = None
+    conn = connect(db_path)
+    try:
+        while fields is None:
+            if receiver.poll(interval):
+                try:
+                    fields = receiver.recv()
+                except EOFError:   # child died without reporting
+                    proc.join()
+                    fields = dict(state="failed", error=f"job process exited with code {proc.exitcode}")
+            elif not heartbeat(conn, job["id"], worker, lease):
+                print(f"[Warn] Lost the lease on job {job['id']}, stopping it")
+                _kill_job(proc)
+                return
+        proc.join()
+        if not finish(conn, job["id"], worker, **fields):
+            print(f"[Warn] Result of job {job['id']} dropped, lease was taken over")
+    except BaseException:
+        _kill_job(proc)
+        raise
+    finally:
+        receiver.close()
+        conn.close()
+    print(f"{'✅' if fields.get('state') == 'done' else '❌'} {job['kind']} job {job['id']}: {fields.get('state')}")
+
+def _job_child(kind: str, kwargs: Dict, sender):
+    """Entry point of the job process; sends the fields for finish() back to run_job."""
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()   # own process group, so _kill_job also reaches ffmpeg
+    try:
+        module, func = JOB_TYPES[kind].split(":")
+        result = getattr(importlib.import_module(module), func)(**kwargs)
+        outputs, errors = collect_outputs(result)
+        fields = dict(state="failed" if errors and not outputs else "done", outputs=outputs, errors=errors)
+    except Exception as e:
+        traceback.print_exc()
+        fields = dict(state="failed", error=str(e))
+    sender.send(fields)
+    sender.close()
+
+def _kill_job(proc: multiprocessing.Process):
+    if proc.is_alive():
+        try:
+            if hasattr(os, "killpg"):
+                os.killpg(proc.pid, signal.SIGKILL)
+            else:
+                proc.kill()
+        except OSError:
+            proc.kill()
+    proc.join()
+
+def worker_loop(db_path: str = WORK_DB_PATH, worker: Optional[str] = None, poll: float = POLL_SECONDS,
+                lease: float = LEASE_SECONDS, interval: float = HEARTBEAT_SECONDS, once: bool = False):
+    """Claim and run jobs until interrupted (or, with once=True, until the queue is empty)."""
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    print(f"👷 Worker {worker} polling {db_path}")
+    conn = connect(db_path)
+    try:
+        while True:
+            job = claim(conn, worker, lease)
+            if job is None:
+                if once:
+                    return
+                time.sleep(poll)
+                continue
+            print(f"▶️ {worker} running {job['kind']} job {job['id']} (attempt {job['attempts']})")
+            run_job(job, worker, db_path, lease, interval)
+    finally:
+        conn.close()
+
+def run_workers(n: int = 2, db_path: str = WORK_DB_PATH, **kwargs):
+    """Start `n` worker processes and wait for them (Ctrl+C stops them all)."""
+    procs = []
+    for i in range(max(1, n)):
+        p = multiprocessing.Process(target=worker_loop, name=f"work-queue-{i}",
+                                    kwargs=dict(kwargs, db_path=db_path))
+        p.start()
+        procs.append(p)
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.join()
+
+# --------------------------
+# Helpers
+# --------------------------
+def _row_to_job(row: sqlite3.Row) -> Dict:
+    job = dict(row)
+    job["kwargs"] = json.loads(job["kwargs"] or "{}")
+    job["outputs"] = json.loads(job["outputs"] or "[]")
+    job["errors"] = json.loads(job["errors"] or "[]")
+    return job
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SQLite-backed work queue for the video pipelines.")
+    parser.add_argument("--db", default=WORK_DB_PATH, help="Queue database (can live on a shared filesystem).")
+    sub = parser.add_subparsers(dest="command", required=True)
+    w = sub.add_parser("worker", help="Run worker processes.")
+    w.add_argument("--workers", type=int, default=2, help="Worker processes to start.")
+    w.add_argument("--once", action="store_true", help="Exit when the queue is empty.")
+    s = sub.add_parser("submit", help="Queue a job.")
+    s.add_argument("kind", choices=sorted(JOB_TYPES))
+    s.add_argument("--kwargs", default="{}", help='Keyword arguments as JSON, e.g. \'{"input_folder": "in_1"}\'.')
+    st = sub.add_parser("status", help="List jobs.")
+    st.add_argument("--state", default=None)
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        run_workers(args.workers, db_path=args.db, once=args.once)
+    elif args.command == "submit":
+        print(submit(args.kind, json.loads(args.kwargs), db_path=args.db))
+    else:
+        for j in list_jobs(args.db, state=args.state):
+            print(f"{j['id']}  {j['kind']:<28} {j['state']:<8} attempts={j['attempts']} worker={j['worker'] or '-'}")